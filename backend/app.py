@@ -5,7 +5,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.core.config import settings
+from backend.routers.changes import main as changes_main
+from backend.routers.events import main as events_main
 from backend.routers.ingestion_leads import main as ingestion_leads_main
+from backend.routers.leads import main as leads_main
 from backend.routers.transformation import main as transformation_leads_main
 
 app = FastAPI()
@@ -23,3 +26,6 @@ app.add_middleware(
 
 app.include_router(ingestion_leads_main.router, prefix=settings.API_V1_STR)
 app.include_router(transformation_leads_main.router, prefix=settings.API_V1_STR)
+app.include_router(leads_main.router, prefix=settings.API_V1_STR)
+app.include_router(changes_main.router, prefix=settings.API_V1_STR)
+app.include_router(events_main.router, prefix=settings.API_V1_STR)
@@ -1,11 +1,49 @@
 from pathlib import Path
+from typing import Literal
 
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 ROOT_DIR = Path(__file__).parents[2]
 ENV_FILE = ROOT_DIR / ".env"
 
 
+class NotionPipeline(BaseModel):
+    """One Notion data source ingested into one Delta table.
+
+    Attributes:
+        database_id: ID of the Notion database holding the data source.
+        data_source_name: Name of the data source inside the database.
+        path_table_deltalake: URI or path of the target Delta table.
+        path_history_deltalake: URI or path of the state history table.
+            Defaults to the target table path suffixed with "_history".
+        path_assignee_stats_deltalake: URI or path of the per-assignee pre-aggregate.
+            Defaults to the target table path suffixed with "_assignee_stats".
+        path_raw_deltalake: URI or path of the raw landing table of Notion pages.
+            Defaults to the target table path suffixed with "_raw".
+        requests_per_second: Notion API budget of this pipeline.
+    """
+
+    database_id: str
+    data_source_name: str = "Leads"
+    path_table_deltalake: str
+    path_history_deltalake: str = ""
+    path_assignee_stats_deltalake: str = ""
+    path_raw_deltalake: str = ""
+    requests_per_second: float = 3.0
+
+    @model_validator(mode="after")
+    def default_derived_paths(self) -> "NotionPipeline":
+        """Derive the history, pre-aggregate and raw table paths from the target table path."""
+        if not self.path_history_deltalake:
+            self.path_history_deltalake = f"{self.path_table_deltalake}_history"
+        if not self.path_assignee_stats_deltalake:
+            self.path_assignee_stats_deltalake = f"{self.path_table_deltalake}_assignee_stats"
+        if not self.path_raw_deltalake:
+            self.path_raw_deltalake = f"{self.path_table_deltalake}_raw"
+        return self
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=ENV_FILE, env_file_encoding="utf-8")
 
@@ -13,6 +51,9 @@ class Settings(BaseSettings):
     DATABASE_ID: str
 
     GCS_URI: str
+    GCS_HISTORY_URI: str = ""
+    GCS_ASSIGNEE_STATS_URI: str = ""
+    GCS_RAW_URI: str = ""
     GOOGLE_APPLICATION_CREDENTIALS: str
 
     HMAC_KEY: str
@@ -23,5 +64,62 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     FRONTEND_HOST: list[str] = ["http://localhost:3000", "http://localhost:3001"]
 
+    # Removed files and commit logs are kept this long, so change data feed and older versions stay readable
+    DELTA_VACUUM_RETENTION_HOURS: int = 720
+    # Rows per Arrow record batch when streaming the normalised leads to Delta Lake, bounds the ingestion memory
+    DELTA_WRITE_BATCH_ROWS: int = 10_000
+    # Memory DuckDB may use during ingestion before spilling to disk
+    INGESTION_DUCKDB_MEMORY_LIMIT: str = "256MB"
+    # A checkpoint is written every N commits, so opening a table only replays the commits since the last one
+    DELTA_CHECKPOINT_INTERVAL: int = 10
+    # Loaded Delta tables kept per path and brought up to date incrementally instead of being reopened
+    DELTA_TABLE_CACHE_PER_TABLE: int = 4
+    # Table open latencies kept per path for the debug report
+    DELTA_OPEN_LATENCY_SAMPLES: int = 200
+
+    TRANSFORMATION_CACHE_SIZE: int = 256
+    # Capture the DuckDB profile (operators, bytes read) of every aggregation run, for debugging
+    TRANSFORMATION_PROFILING: bool = False
+    # Aggregations slower than this are kept in the slow query log, with their SQL and table version
+    TRANSFORMATION_SLOW_QUERY_SECONDS: float = 1.0
+    TRANSFORMATION_SLOW_QUERY_LOG_SIZE: int = 50
+
+    # Idle delay before a keep-alive comment is sent on the Server-Sent Events stream
+    EVENTS_KEEPALIVE_SECONDS: int = 15
+
+    LEADS_INDEX_PATH: str = str(ROOT_DIR / ".cache" / "leads_index.duckdb")
+    LEADS_INDEX_REFRESH_SECONDS: int = 30
+
+    # Materialise GCS_URI into a local file ("duckdb" or "arrow") shared by the workers of the host
+    LOCAL_REPLICA_FORMAT: Literal["duckdb", "arrow"] | None = None
+    LOCAL_REPLICA_DIR: str = str(ROOT_DIR / ".cache" / "replicas")
+    LOCAL_REPLICA_REFRESH_SECONDS: int = 30
+
+    # JSON list of pipelines, defaults to the "Leads" data source of DATABASE_ID written to GCS_URI
+    NOTION_PIPELINES: list[NotionPipeline] = []
+    INGESTION_MAX_WORKERS: int = 4
+    NOTION_MAX_RETRIES: int = 5
+
+    @model_validator(mode="after")
+    def default_notion_pipelines(self) -> "Settings":
+        """Fall back to the single Leads pipeline when none is configured."""
+        if not self.GCS_HISTORY_URI:
+            self.GCS_HISTORY_URI = f"{self.GCS_URI}_history"
+        if not self.GCS_ASSIGNEE_STATS_URI:
+            self.GCS_ASSIGNEE_STATS_URI = f"{self.GCS_URI}_assignee_stats"
+        if not self.GCS_RAW_URI:
+            self.GCS_RAW_URI = f"{self.GCS_URI}_raw"
+        if not self.NOTION_PIPELINES:
+            self.NOTION_PIPELINES = [
+                NotionPipeline(
+                    database_id=self.DATABASE_ID,
+                    path_table_deltalake=self.GCS_URI,
+                    path_history_deltalake=self.GCS_HISTORY_URI,
+                    path_assignee_stats_deltalake=self.GCS_ASSIGNEE_STATS_URI,
+                    path_raw_deltalake=self.GCS_RAW_URI,
+                )
+            ]
+        return self
+
 
 settings = Settings()
@@ -0,0 +1,246 @@
+"""Helpers shared by the routers to open and inspect Delta Lake tables.
+
+Opening a DeltaTable replays its transaction log from the last checkpoint,
+which gets slower as commits pile up. Loaded tables are kept in a
+process-wide cache instead, and only apply the commits made since they were
+last used. The latency of every open is recorded per table.
+"""
+
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+from deltalake import DeltaTable
+from loguru import logger
+
+from backend.core.config import settings
+
+
+class DeltaTableCache:
+    """Process-wide pool of loaded Delta tables, brought up to date incrementally.
+
+    A DeltaTable must not be updated while another thread reads it, so each
+    cached table is lent to one caller at a time: a concurrent caller of the
+    same path gets another cached table, or opens a new one which joins the
+    pool afterwards. A table is dropped if its caller failed.
+
+    Attributes:
+        max_tables_per_path: Maximum number of idle tables kept per path.
+        max_samples: Number of open latencies kept per path.
+    """
+
+    def __init__(
+        self,
+        max_tables_per_path: int = settings.DELTA_TABLE_CACHE_PER_TABLE,
+        max_samples: int = settings.DELTA_OPEN_LATENCY_SAMPLES,
+    ):
+        self.max_tables_per_path = max_tables_per_path
+        self.max_samples = max_samples
+        self._idle_tables: dict[str, list[DeltaTable]] = {}
+        self._latencies: dict[str, deque[dict]] = {}
+        self._lock = threading.Lock()
+
+    def exists(self, path_table_deltalake: str) -> bool:
+        """Tell whether a Delta table exists, without listing its log once it has been opened."""
+        with self._lock:
+            if path_table_deltalake in self._idle_tables:
+                return True
+
+        return DeltaTable.is_deltatable(path_table_deltalake)
+
+    @contextmanager
+    def open(self, path_table_deltalake: str, version: int | None = None) -> Iterator[DeltaTable]:
+        """Lend a table loaded at its latest version, or at the given one, for the duration of the context.
+
+        Args:
+            path_table_deltalake: URI or path to Delta table (supports GCS).
+            version: Table version to load. Defaults to the latest one.
+
+        Yields:
+            The loaded table, for the exclusive use of the caller.
+
+        Raises:
+            deltalake.exceptions.TableNotFoundError: If no Delta table exists at this path.
+        """
+        with self._lock:
+            idle_tables = self._idle_tables.get(path_table_deltalake)
+            dt = idle_tables.pop() if idle_tables else None
+
+        started_at = time.perf_counter()
+        mode = "warm"
+        if dt is None:
+            mode = "cold"
+            dt = DeltaTable(path_table_deltalake, version=version)
+        elif version is None:
+            dt.update_incremental()
+        elif version != dt.version():
+            mode = "cold"
+            dt.load_as_version(version)
+        self._record_latency(path_table_deltalake, mode, time.perf_counter() - started_at, dt.version())
+
+        yield dt
+
+        with self._lock:
+            idle_tables = self._idle_tables.setdefault(path_table_deltalake, [])
+            if len(idle_tables) < self.max_tables_per_path:
+                idle_tables.append(dt)
+
+    def _record_latency(self, path_table_deltalake: str, mode: str, seconds: float, version: int) -> None:
+        """Keep the duration of an open, "cold" when the log is replayed from a checkpoint, "warm" otherwise."""
+        if mode == "cold":
+            logger.info(f"📖 Opened {path_table_deltalake} at version {version} in {seconds:.3f}s")
+
+        with self._lock:
+            self._latencies.setdefault(path_table_deltalake, deque(maxlen=self.max_samples)).append({
+                "opened_at": datetime.now(timezone.utc),
+                "mode": mode,
+                "seconds": seconds,
+                "version": version,
+            })
+
+    def latency_report(self) -> list[dict]:
+        """Summarise the open latencies of every table opened by this process.
+
+        Returns:
+            One entry per table with the number of idle cached tables, the
+            count, median, 95th percentile and maximum of the cold and warm open
+            durations, and the latest samples in chronological order.
+        """
+        with self._lock:
+            tables = {
+                path: (len(self._idle_tables.get(path, [])), list(samples)) for path, samples in self._latencies.items()
+            }
+
+        report = []
+        for path_table_deltalake, (cached_tables, samples) in tables.items():
+            entry = {"path_table_deltalake": path_table_deltalake, "cached_tables": cached_tables}
+            for mode in ("cold", "warm"):
+                durations = sorted(sample["seconds"] for sample in samples if sample["mode"] == mode)
+                entry[mode] = (
+                    {
+                        "count": len(durations),
+                        "p50_seconds": durations[len(durations) // 2],
+                        "p95_seconds": durations[min(len(durations) - 1, len(durations) * 95 // 100)],
+                        "max_seconds": durations[-1],
+                    }
+                    if durations
+                    else None
+                )
+            entry["samples"] = samples
+            report.append(entry)
+
+        return report
+
+
+DELTA_TABLES = DeltaTableCache()
+
+
+def get_table_version(path_table_deltalake: str = settings.GCS_URI) -> int | None:
+    """Return the latest committed version of a Delta table.
+
+    Only the transaction log is read, no data file is opened, which makes it
+    cheap enough to be used as a freshness check before serving cached data.
+
+    Args:
+        path_table_deltalake: URI or path to Delta table (supports GCS).
+            Defaults to settings.GCS_URI.
+
+    Returns:
+        The latest table version, or None if no Delta table exists at this path.
+    """
+    if not DELTA_TABLES.exists(path_table_deltalake):
+        return None
+
+    with DELTA_TABLES.open(path_table_deltalake) as dt:
+        return dt.version()
+
+
+def get_table_columns(path_table_deltalake: str, version: int) -> list[str]:
+    """List the columns of a version of a Delta table, from its transaction log only.
+
+    Args:
+        path_table_deltalake: URI or path to Delta table (supports GCS).
+        version: Table version to inspect.
+
+    Returns:
+        Names of the top-level columns of that version.
+    """
+    with DELTA_TABLES.open(path_table_deltalake, version=version) as dt:
+        return [field.name for field in dt.schema().fields]
+
+
+def get_snapshot_dataset(path_table_deltalake: str, version: int) -> ds.Dataset:
+    """Open a version of a Delta table as an Arrow dataset that DuckDB can filter.
+
+    Files written from Polars store strings as `string_view` while files
+    rewritten by a merge store them as `string`. DuckDB pushes its filters down
+    to the dataset, which fails when a `string` literal is compared with a
+    `string_view` column, so string columns are read as `string_view`.
+
+    Args:
+        path_table_deltalake: URI or path to Delta table (supports GCS).
+        version: Table version to open.
+
+    Returns:
+        Arrow dataset of the table snapshot.
+    """
+    with DELTA_TABLES.open(path_table_deltalake, version=version) as dt:
+        schema = pa.schema(
+            field.with_type(pa.string_view()) if pa.types.is_string(field.type) else field
+            for field in dt.to_pyarrow_dataset().schema
+        )
+        return dt.to_pyarrow_dataset(schema=schema)
+
+
+def get_snapshot_files(
+    path_table_deltalake: str, version: int, partition_filters: list[tuple[str, str, str]] | None = None
+) -> list[str]:
+    """List the Parquet files of a version of a Delta table.
+
+    DuckDB reads them with its native Parquet reader, which spills within the
+    connection memory limit, whereas registered Arrow datasets and streams
+    keep their scanned batches alive outside of it. Tables written by
+    deltalake have no deletion vectors, so the files hold the whole snapshot.
+
+    Args:
+        path_table_deltalake: URI or path to Delta table (supports GCS).
+        version: Table version to list.
+        partition_filters: Partition filters selecting the files, like
+            [("ingestion_date", "=", "2025-10-01")]. Defaults to all files.
+
+    Returns:
+        Absolute URIs of the data files.
+    """
+    with DELTA_TABLES.open(path_table_deltalake, version=version) as dt:
+        return dt.file_uris(partition_filters)
+
+
+def get_missing_snapshot_files(path_table_deltalake: str, version: int) -> list[str]:
+    """List the data files of a version of a Delta table that no longer exist.
+
+    A vacuum deletes the files removed from the table for more than the
+    retention period, so older versions keep their transaction log but can no
+    longer be read. Each file is checked, which is only worth it after a read
+    of the snapshot failed.
+
+    Args:
+        path_table_deltalake: URI or path to Delta table (supports GCS).
+        version: Table version to check.
+
+    Returns:
+        Paths of the missing data files, relative to the table.
+    """
+    with DELTA_TABLES.open(path_table_deltalake, version=version) as dt:
+        dataset = dt.to_pyarrow_dataset()
+
+    return [
+        file_info.path
+        for file_info in dataset.filesystem.get_file_info(dataset.files)
+        if file_info.type == pafs.FileType.NotFound
+    ]
@@ -0,0 +1,190 @@
+"""Local replica of a Delta table shared by every worker of a host.
+
+Each worker scanning GCS on its own multiplies remote reads and memory.
+Instead, the first worker noticing a new Delta version materialises it into
+a local file, either a DuckDB database or an uncompressed Arrow IPC file, and
+every worker opens that file read-only: DuckDB reads it through the OS page
+cache and Arrow memory-maps it, so the pages are shared between processes.
+
+Files are named after the Delta version they hold and published with an
+atomic rename under an exclusive file lock, so a version is built once per
+host and readers never see a partial file. A replaced file is removed only
+once no worker can still be serving it.
+"""
+
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+import duckdb
+import pyarrow as pa
+from loguru import logger
+
+from backend.core.config import settings
+from backend.core.delta import get_snapshot_dataset, get_table_version
+
+ReplicaFormat = Literal["duckdb", "arrow"]
+
+
+@dataclass(frozen=True)
+class ReplicaSnapshot:
+    """One materialised version of a replica.
+
+    Attributes:
+        version: Delta version held by the file.
+        path: Path of the local file.
+        table: Memory-mapped Arrow table, None for the DuckDB format.
+    """
+
+    version: int
+    path: Path
+    table: pa.Table | None = None
+
+    def register(self, conn: duckdb.DuckDBPyConnection) -> str:
+        """Expose the snapshot in a DuckDB connection.
+
+        Args:
+            conn: DuckDB connection the query will run on.
+
+        Returns:
+            SQL expression to select from.
+        """
+        if self.table is not None:
+            conn.register("local_replica", self.table)
+            return "local_replica"
+
+        alias = f"local_replica_v{self.version}"
+        conn.execute(f"ATTACH IF NOT EXISTS '{self.path}' AS {alias} (READ_ONLY)")
+        return f"{alias}.replica"
+
+
+class LocalReplica:
+    """Local copy of a Delta table, refreshed when a new version is committed.
+
+    The freshness check only reads the Delta transaction log and is throttled
+    to once every `refresh_seconds`, so a worker may serve a replaced version
+    for up to that long. DuckDB files are attached again by every request, so
+    a replaced file is kept on disk until that delay has passed twice.
+
+    Attributes:
+        path_table_deltalake: URI or path to the source Delta table.
+        directory: Folder holding the files of this table.
+        replica_format: Format of the local files, "duckdb" or "arrow".
+        refresh_seconds: Minimum delay between two Delta version checks.
+    """
+
+    def __init__(
+        self,
+        path_table_deltalake: str = settings.GCS_URI,
+        replica_dir: str = settings.LOCAL_REPLICA_DIR,
+        replica_format: ReplicaFormat = "arrow",
+        refresh_seconds: int = settings.LOCAL_REPLICA_REFRESH_SECONDS,
+    ):
+        self.path_table_deltalake = path_table_deltalake
+        self.directory = Path(replica_dir) / hashlib.sha256(path_table_deltalake.encode("utf-8")).hexdigest()[:16]
+        self.replica_format = replica_format
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: ReplicaSnapshot | None = None
+        self._last_check = float("-inf")
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self) -> ReplicaSnapshot | None:
+        """Return a snapshot matching the latest Delta version, building it if needed.
+
+        Returns:
+            The current snapshot, or None if the Delta table does not exist.
+        """
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._last_check < self.refresh_seconds:
+                return self._snapshot
+
+            table_version = get_table_version(self.path_table_deltalake)
+            self._last_check = time.monotonic()
+
+            if table_version is None:
+                return None
+
+            if self._snapshot is None or self._snapshot.version != table_version:
+                self._snapshot = self._open(table_version)
+
+            return self._snapshot
+
+    def _open(self, table_version: int) -> ReplicaSnapshot:
+        """Open the file of a version, materialising it first if no worker did.
+
+        Args:
+            table_version: Delta version to open.
+
+        Returns:
+            Snapshot of this version.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"v{table_version:020d}.{self.replica_format}"
+
+        if not path.exists():
+            with (self.directory / ".lock").open("w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not path.exists():
+                    self._materialise(table_version, path)
+                    self._remove_old_versions(keep=path)
+
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all() if self.replica_format == "arrow" else None
+        logger.info(f"📂 Serving {self.path_table_deltalake} from local replica version {table_version}")
+        return ReplicaSnapshot(version=table_version, path=path, table=table)
+
+    def _materialise(self, table_version: int, path: Path) -> None:
+        """Write a Delta version into a temporary file and rename it into place.
+
+        Args:
+            table_version: Delta version to materialise.
+            path: Final path of the file.
+        """
+        logger.info(f"🔄 Materialising version {table_version} of {self.path_table_deltalake}...")
+        started_at = time.perf_counter()
+
+        path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        path_tmp.unlink(missing_ok=True)
+        delta_snapshot = get_snapshot_dataset(self.path_table_deltalake, table_version)
+
+        if self.replica_format == "arrow":
+            # Uncompressed so the file can be memory-mapped without copies
+            with pa.OSFile(str(path_tmp), "wb") as sink, pa.ipc.new_file(sink, delta_snapshot.schema) as writer:
+                for batch in delta_snapshot.to_batches():
+                    writer.write_batch(batch)
+        else:
+            build_conn = duckdb.connect(str(path_tmp))
+            try:
+                build_conn.register("delta_snapshot", delta_snapshot)
+                build_conn.execute("CREATE TABLE replica AS SELECT * FROM delta_snapshot")
+            finally:
+                build_conn.close()
+
+        os.replace(path_tmp, path)
+        logger.info(f"✅ Local replica materialised in {time.perf_counter() - started_at:.2f}s")
+
+    def _remove_old_versions(self, keep: Path) -> None:
+        """Remove the files replaced by a newer version for more than twice `refresh_seconds`.
+
+        The newer file is published by a rename, which keeps the modification
+        time of its build, so that time tells when the older file was replaced.
+
+        Args:
+            keep: File of the version just materialised.
+        """
+        replaced_before = time.time() - 2 * self.refresh_seconds
+        versions = sorted(self.directory.glob(f"v*.{self.replica_format}"))
+        for path, newer in zip(versions, versions[1:]):
+            if path != keep and newer.stat().st_mtime < replaced_before:
+                path.unlink(missing_ok=True)
+
+
+LOCAL_REPLICAS = (
+    {settings.GCS_URI: LocalReplica(settings.GCS_URI, replica_format=settings.LOCAL_REPLICA_FORMAT)}
+    if settings.LOCAL_REPLICA_FORMAT
+    else {}
+)
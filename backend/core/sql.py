@@ -0,0 +1,40 @@
+"""Helpers to render the Jinja SQL templates stored next to each router and to configure DuckDB."""
+
+from pathlib import Path
+
+import duckdb
+from jinja2 import Template
+
+from backend.core.config import settings
+
+
+def render_query(path_to_folder_request: Path, template_name: str, **kwargs) -> str:
+    """Render a SQL template from a router request folder.
+
+    Args:
+        path_to_folder_request: Folder holding the router SQL templates.
+        template_name: File name of the template in this folder.
+        **kwargs: Variables passed to the Jinja template.
+
+    Returns:
+        The rendered SQL query.
+    """
+    query_template = (path_to_folder_request / template_name).read_text(encoding="utf-8")
+    return Template(query_template).render(**kwargs)
+
+
+def configure_gcs_access(conn: duckdb.DuckDBPyConnection) -> None:
+    """Let a DuckDB connection read gs:// URIs with the HMAC credentials of the settings.
+
+    Args:
+        conn: DuckDB connection to configure.
+    """
+    conn.execute("INSTALL httpfs;")
+    conn.execute("LOAD httpfs;")
+    conn.execute(f"""
+    CREATE SECRET (
+        TYPE gcs,
+        KEY_ID '{settings.HMAC_KEY}',
+        SECRET '{settings.HMAC_SECRET}'
+    );
+    """)
@@ -0,0 +1,65 @@
+"""OpenAPI documentation for changes endpoints."""
+
+from backend.core.openapi_docs_model import OpenApiDocs
+
+changes_since_version = OpenApiDocs(
+    summary="Stream lead changes since a Delta Lake version",
+    description=(
+        "Incremental sync endpoint built on the Delta Lake change data feed of the Leads table. "
+        "The process includes:\n\n"
+        "1. **Resolve**: Pins the range to (`since_version`, `until_version`], `until_version` "
+        "defaulting to the latest version\n"
+        "2. **Read**: Loads the change data feed for these versions only\n"
+        "3. **Paginate**: Orders changes by commit version, id and change type and returns at most `limit`\n"
+        "4. **Stream**: Sends the page as NDJSON or as an Arrow IPC stream\n\n"
+        "Each row carries the lead columns plus `_change_type` (`insert`, `update_postimage`, `delete`, "
+        "and `update_preimage` when `include_preimage=true`), `_commit_version` and `_commit_timestamp`.\n\n"
+        "The last version covered is returned in the `X-Until-Version` header. While the "
+        "`X-Next-Cursor` header is present, call again with the same `since_version`, `until_version` "
+        "set to `X-Until-Version` and `cursor` set to `X-Next-Cursor`. Once synced, store "
+        "`X-Until-Version` as the next `since_version`."
+    ),
+    response_description="Changed rows, one per line (NDJSON) or as Arrow record batches",
+    responses={
+        200: {
+            "description": "Changes successfully streamed",
+            "headers": {
+                "X-Until-Version": {"description": "Last table version covered", "schema": {"type": "integer"}},
+                "X-Next-Cursor": {"description": "Cursor of the next page, absent on the last page"},
+            },
+            "content": {
+                "application/x-ndjson": {
+                    "example": (
+                        '{"id": "28a1c2d3-0000-4000-8000-000000000001", "etat": "Appel booké", '
+                        '"_change_type": "update_postimage", "_commit_version": 13, '
+                        '"_commit_timestamp": "2025-10-27 08:00:12.345000"}\n'
+                    )
+                },
+                "application/vnd.apache.arrow.stream": {},
+            },
+        },
+        400: {
+            "description": "Invalid pagination cursor",
+            "content": {"application/json": {"example": {"detail": "Malformed cursor"}}},
+        },
+        404: {
+            "description": "Delta Lake table not found",
+            "content": {"application/json": {"example": {"detail": "Delta table 'data_leads' does not exist"}}},
+        },
+        410: {
+            "description": "Change data feed disabled or already vacuumed for these versions",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Change data since version 0 is not available: Reading a table version: 0 "
+                        "that does not have change data enabled"
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Changes"],
+        "operationId": "changes_since_version",
+    },
+)
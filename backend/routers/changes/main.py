@@ -0,0 +1,90 @@
+"""Changes module for incremental synchronisation of the leads table.
+
+This module exposes the Delta Lake change data feed:
+- Returns the rows inserted, updated or deleted since a table version
+- Paginates changes with keyset cursors
+- Streams pages as NDJSON or Arrow IPC
+"""
+
+import os
+from typing import Annotated, Literal
+
+import logfire
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from backend.core.config import settings
+from backend.routers.changes import docs
+from backend.routers.changes.utils import (
+    ChangesUnavailableError,
+    InvalidCursorError,
+    TableNotFoundError,
+    read_changes,
+    stream_arrow,
+    stream_ndjson,
+)
+
+logfire.configure(token=os.environ["LOGFIRE_TOKEN"])
+logger.configure(handlers=[logfire.loguru_handler()])
+
+router = APIRouter(prefix="/changes", tags=["Changes"])
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "arrow": "application/vnd.apache.arrow.stream"}
+
+
+@router.get("", **docs.changes_since_version.model_dump())
+async def changes_since_version(
+    since_version: Annotated[int, Query(ge=-1, description="Return changes committed after this version")],
+    until_version: Annotated[int | None, Query(ge=0, description="Last version to include")] = None,
+    cursor: Annotated[str | None, Query(description="Next cursor returned by the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=100_000, description="Maximum number of changes per page")] = 1000,
+    include_preimage: Annotated[bool, Query(description="Also return rows as they were before update")] = False,
+    response_format: Annotated[
+        Literal["ndjson", "arrow"], Query(alias="format", description="Response format")
+    ] = "ndjson",
+    delta_table_path: Annotated[str, Query(description="Path to the Delta Lake table")] = settings.GCS_URI,
+):
+    """Stream the changes committed to the leads table since a version.
+
+    Args:
+        since_version: Return changes committed strictly after this version, -1 for all.
+        until_version: Last version to include, defaults to the latest one.
+        cursor: Next cursor returned by the previous page.
+        limit: Maximum number of changes per page.
+        include_preimage: Also return rows as they were before update.
+        response_format: Response format, NDJSON or Arrow IPC stream.
+        delta_table_path: Path to the Delta Lake table to read.
+
+    Returns:
+        Streaming response with one change per row, the next cursor and the
+        last version covered in the `X-Next-Cursor` and `X-Until-Version` headers.
+    """
+    logger.info(f"🔁 Reading changes since version {since_version} from {delta_table_path}")
+
+    try:
+        changes, next_cursor, until_version = await run_in_threadpool(
+            read_changes,
+            since_version=since_version,
+            until_version=until_version,
+            cursor_token=cursor,
+            limit=limit,
+            include_preimage=include_preimage,
+            path_table_deltalake=delta_table_path,
+        )
+    except InvalidCursorError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    except TableNotFoundError as error:
+        raise HTTPException(status_code=404, detail=str(error)) from error
+    except ChangesUnavailableError as error:
+        raise HTTPException(status_code=410, detail=str(error)) from error
+
+    logger.info(f"✅ Streaming {changes.num_rows} changes up to version {until_version}")
+
+    headers = {"X-Until-Version": str(until_version)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    stream = stream_arrow(changes) if response_format == "arrow" else stream_ndjson(changes)
+    return StreamingResponse(stream, media_type=MEDIA_TYPES[response_format], headers=headers)
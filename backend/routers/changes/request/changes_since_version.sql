@@ -0,0 +1,8 @@
+SELECT *
+FROM delta_changes
+WHERE _change_type IN ({% for change_type in change_types %}'{{ change_type }}'{% if not loop.last %}, {% endif %}{% endfor %})
+{%- if cursor is not none %}
+  AND (_commit_version, id, _change_type) > ($cursor_version, $cursor_id, $cursor_change_type)
+{%- endif %}
+ORDER BY _commit_version, id, _change_type
+LIMIT $limit;
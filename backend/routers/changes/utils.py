@@ -0,0 +1,183 @@
+"""Read the change data feed of the leads Delta table.
+
+Consumers keep the last version they synced and ask for what changed since.
+Pages are ordered by (commit version, id, change type) and resumed with a
+keyset cursor, and each page only loads the feed from the cursor version on.
+"""
+
+import base64
+import io
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+from deltalake.exceptions import DeltaError
+
+from backend.core.config import settings
+from backend.core.delta import DELTA_TABLES, get_table_version
+from backend.core.sql import render_query
+
+PATH_TO_FOLDER_REQUEST = Path(__file__).parent / "request"
+
+CHANGE_TYPES = ["insert", "update_postimage", "delete"]
+
+
+class TableNotFoundError(Exception):
+    """Raised when the Delta table does not exist."""
+
+    def __init__(self, path_table_deltalake: str):
+        super().__init__(f"Delta table '{path_table_deltalake}' does not exist")
+
+
+class ChangesUnavailableError(Exception):
+    """Raised when the change data feed cannot be read for the requested versions."""
+
+    def __init__(self, since_version: int, error: Exception):
+        super().__init__(f"Change data since version {since_version} is not available: {error}")
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+    def __init__(self):
+        super().__init__("Malformed cursor")
+
+
+def encode_cursor(row: dict) -> str:
+    """Encode the position of the last change of a page into an opaque token.
+
+    Args:
+        row: Last change returned in the page.
+
+    Returns:
+        Base64 URL-safe token to send back as the next cursor.
+    """
+    position = [row["_commit_version"], row["id"], row["_change_type"]]
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str) -> tuple[int, str, str]:
+    """Decode a cursor token.
+
+    Args:
+        token: Opaque token previously returned as next cursor.
+
+    Returns:
+        Commit version, lead id and change type of the last change already read.
+
+    Raises:
+        InvalidCursorError: If the token is malformed.
+    """
+    try:
+        commit_version, lead_id, change_type = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return int(commit_version), str(lead_id), str(change_type)
+    except (ValueError, TypeError) as error:
+        raise InvalidCursorError() from error
+
+
+def read_changes(
+    since_version: int,
+    until_version: int | None = None,
+    cursor_token: str | None = None,
+    limit: int = 1000,
+    include_preimage: bool = False,
+    path_table_deltalake: str = settings.GCS_URI,
+) -> tuple[pa.Table, str | None, int]:
+    """Read one page of the change data feed.
+
+    Args:
+        since_version: Only return changes committed strictly after this version.
+        until_version: Last version to include. Defaults to the latest version,
+            clients should pin it while paginating.
+        cursor_token: Next cursor returned by the previous page, if any.
+        limit: Maximum number of changes in the page.
+        include_preimage: Also return the value of updated rows before the update.
+        path_table_deltalake: URI or path to Delta table (supports GCS).
+            Defaults to settings.GCS_URI.
+
+    Returns:
+        The page of changes, the next cursor (None on the last page) and the
+        last version covered by the feed.
+
+    Raises:
+        TableNotFoundError: If the Delta table does not exist.
+        ChangesUnavailableError: If the feed was disabled or vacuumed for these versions.
+        InvalidCursorError: If the cursor is malformed.
+    """
+    cursor = decode_cursor(cursor_token) if cursor_token else None
+
+    latest_version = get_table_version(path_table_deltalake)
+    if latest_version is None:
+        raise TableNotFoundError(path_table_deltalake)
+
+    until_version = latest_version if until_version is None else min(until_version, latest_version)
+    starting_version = max(since_version + 1, cursor[0] if cursor else 0)
+    if starting_version > until_version:
+        return pa.table({}), None, until_version
+
+    change_types = [*CHANGE_TYPES, "update_preimage"] if include_preimage else CHANGE_TYPES
+    query = render_query(PATH_TO_FOLDER_REQUEST, "changes_since_version.sql", change_types=change_types, cursor=cursor)
+    parameters: dict = {"limit": limit + 1}
+    if cursor is not None:
+        parameters["cursor_version"], parameters["cursor_id"], parameters["cursor_change_type"] = cursor
+
+    conn = duckdb.connect()
+    try:
+        # Data files are only opened while DuckDB scans the feed, so a vacuumed
+        # version can fail here as well as in load_cdf
+        with DELTA_TABLES.open(path_table_deltalake) as dt:
+            delta_changes = pa.RecordBatchReader.from_stream(
+                dt.load_cdf(starting_version=starting_version, ending_version=until_version)
+            )
+            conn.register("delta_changes", delta_changes)
+            changes = conn.execute(query, parameters).fetch_arrow_table()
+    except (DeltaError, duckdb.InvalidInputException) as error:
+        raise ChangesUnavailableError(since_version, error) from error
+    finally:
+        conn.close()
+
+    if changes.num_rows <= limit:
+        return changes, None, until_version
+
+    changes = changes.slice(0, limit)
+    return changes, encode_cursor(changes.slice(limit - 1).to_pylist()[0]), until_version
+
+
+def stream_ndjson(changes: pa.Table) -> Iterator[bytes]:
+    """Serialise changes as newline-delimited JSON, one batch at a time.
+
+    Args:
+        changes: Page of changes.
+
+    Yields:
+        Chunks of NDJSON lines.
+    """
+    for batch in changes.to_batches():
+        yield "".join(json.dumps(row, default=str) + "\n" for row in batch.to_pylist()).encode("utf-8")
+
+
+def stream_arrow(changes: pa.Table) -> Iterator[bytes]:
+    """Serialise changes as an Arrow IPC stream, one record batch at a time.
+
+    Args:
+        changes: Page of changes.
+
+    Yields:
+        Chunks of the Arrow IPC stream.
+    """
+    buffer = io.BytesIO()
+
+    def drain() -> bytes:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    with pa.ipc.new_stream(buffer, changes.schema) as writer:
+        for batch in changes.to_batches():
+            writer.write_batch(batch)
+            yield drain()
+
+    yield drain()
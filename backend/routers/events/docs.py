@@ -0,0 +1,38 @@
+"""OpenAPI documentation for events endpoints."""
+
+from backend.core.openapi_docs_model import OpenApiDocs
+
+events = OpenApiDocs(
+    summary="Stream new data version events (Server-Sent Events)",
+    description=(
+        "Push endpoint replacing dashboard polling. The process includes:\n\n"
+        "1. **Ingest**: `ingestion_leads` commits a new version of the Leads Delta Lake table\n"
+        "2. **Warm up**: The standard aggregations (`count_date_by_week`, `count_date_by_month`) of the "
+        "new version are computed in the background and stored in the transformation cache\n"
+        "3. **Push**: A `new_version` event with the table, the version and these aggregations is sent "
+        "to every connected client\n\n"
+        "The latest event of each table is sent on connection. The `id` of each message is the table "
+        "version. Events are published by the process that ran the ingestion, so with several workers "
+        "clients only receive the events of the worker they are connected to."
+    ),
+    response_description="Server-Sent Events stream",
+    responses={
+        200: {
+            "description": "Event stream opened",
+            "content": {
+                "text/event-stream": {
+                    "example": (
+                        "event: new_version\n"
+                        "id: 13\n"
+                        'data: {"table": "gs://notion-dataascode/data_leads", "version": 13, '
+                        '"aggregates": {"count_date_by_week": [...], "count_date_by_month": [...]}}\n\n'
+                    )
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Events"],
+        "operationId": "version_events",
+    },
+)
@@ -0,0 +1,41 @@
+"""Events module pushing data updates to the dashboard.
+
+This module exposes a Server-Sent Events stream:
+- Announces each new Delta version written by an ingestion
+- Carries the standard aggregations of the version, already cached
+- Lets clients stop polling the transformation endpoints
+"""
+
+import os
+
+import logfire
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from backend.routers.events import docs
+from backend.routers.events.utils import stream_events
+
+logfire.configure(token=os.environ["LOGFIRE_TOKEN"])
+logger.configure(handlers=[logfire.loguru_handler()])
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+@router.get("", **docs.events.model_dump())
+async def events(request: Request):
+    """Stream new Delta version events as Server-Sent Events.
+
+    Args:
+        request: Request of the client, used to detect disconnection.
+
+    Returns:
+        Streaming response with one `new_version` event per committed version.
+    """
+    logger.info("📡 New dashboard subscribed to version events")
+
+    return StreamingResponse(
+        stream_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
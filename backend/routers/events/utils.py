@@ -0,0 +1,133 @@
+"""Notify dashboards when a new version of a Delta table is committed.
+
+After an ingestion, the standard aggregations of the new version are
+precomputed in the transformation cache, then pushed with the version number
+to every Server-Sent Events subscriber of this process.
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from backend.core.config import settings
+from backend.core.delta import get_table_version
+from backend.routers.transformation.utils import warm_up_cache
+
+
+class VersionBroadcaster:
+    """Fan out new version events to the subscribers of this process.
+
+    Each subscriber gets a bounded queue: a client too slow to read its
+    events loses the oldest ones rather than holding memory.
+
+    Attributes:
+        max_queued_events: Maximum number of events waiting per subscriber.
+        latest_events: Last event published for each table, sent to new subscribers.
+    """
+
+    def __init__(self, max_queued_events: int = 16):
+        self.max_queued_events = max_queued_events
+        self.latest_events: dict[str, dict] = {}
+        self._subscribers: set[asyncio.Queue] = set()
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Queue]:
+        """Register a subscriber queue for the duration of the context."""
+        queue = asyncio.Queue(maxsize=self.max_queued_events)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def publish(self, event: dict) -> None:
+        """Send an event to every subscriber. Must be called from the event loop.
+
+        Args:
+            event: Event with at least the `table` and `version` keys.
+        """
+        self.latest_events[event["table"]] = event
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+BROADCASTER = VersionBroadcaster()
+
+
+def format_sse(event: dict) -> str:
+    """Format a new version event as a Server-Sent Events message.
+
+    Args:
+        event: Event with the `table` and `version` keys.
+
+    Returns:
+        SSE message with the `new_version` event type, encoded like the REST responses.
+    """
+    return f"event: new_version\nid: {event['version']}\ndata: {json.dumps(jsonable_encoder(event))}\n\n"
+
+
+async def stream_events(
+    request: Request,
+    broadcaster: VersionBroadcaster = BROADCASTER,
+    keepalive_seconds: float = settings.EVENTS_KEEPALIVE_SECONDS,
+) -> AsyncIterator[str]:
+    """Stream new version events to one client until it disconnects.
+
+    The latest known event of each table is sent first, so a client that
+    connects after an ingestion does not miss it. A comment is sent when idle
+    to keep proxies from closing the connection.
+
+    Args:
+        request: Request of the client, used to detect disconnection.
+        broadcaster: Source of the events. Defaults to BROADCASTER.
+        keepalive_seconds: Idle delay before a keep-alive comment.
+            Defaults to settings.EVENTS_KEEPALIVE_SECONDS.
+
+    Yields:
+        SSE messages.
+    """
+    with broadcaster.subscribe() as queue:
+        for event in list(broadcaster.latest_events.values()):
+            yield format_sse(event)
+
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+
+
+async def publish_new_versions(paths_table_deltalake: list[str], broadcaster: VersionBroadcaster = BROADCASTER) -> None:
+    """Warm up the cache for the latest version of tables and notify subscribers.
+
+    Meant to run as a background task once an ingestion has committed. A
+    failure only skips the table concerned.
+
+    Args:
+        paths_table_deltalake: URI or path of the Delta tables just written.
+        broadcaster: Destination of the events. Defaults to BROADCASTER.
+    """
+    for path_table_deltalake in paths_table_deltalake:
+        try:
+            version = await run_in_threadpool(get_table_version, path_table_deltalake)
+            if version is None:
+                continue
+
+            logger.info(f"🔥 Warming up aggregations of version {version} of {path_table_deltalake}")
+            aggregates = await run_in_threadpool(warm_up_cache, path_table_deltalake, version)
+        except Exception:
+            logger.exception(f"❌ Warm-up failed for {path_table_deltalake}")
+            continue
+
+        broadcaster.publish({"table": path_table_deltalake, "version": version, "aggregates": aggregates})
+        logger.info(f"📣 Version {version} of {path_table_deltalake} published")
@@ -7,11 +7,18 @@ ingestion_leads = OpenApiDocs(
     description=(
         "ETL endpoint that extracts leads data from Notion, transforms it into a normalized format, "
         "and loads it into a Delta Lake table. The process includes:\n\n"
-        "1. **Extract**: Fetches data from the 'Leads' data source in Notion\n"
-        "2. **Transform**: Normalizes complex Notion properties into flat structures\n"
-        "3. **Load**: Performs an upsert operation into the Delta Lake table\n\n"
+        "1. **Extract**: Fetches every page of each configured Notion data source (`NOTION_PIPELINES`, "
+        "defaults to the 'Leads' data source)\n"
+        "2. **Land**: Appends the untouched page JSON to a raw Delta table partitioned by ingestion date\n"
+        "3. **Transform**: Normalizes the landed pages into flat structures with a single DuckDB query\n"
+        "4. **Deduplicate**: Groups leads sharing a normalised email, phone, LinkedIn profile or name and "
+        "company into a `duplicate_group_id`\n"
+        "5. **Load**: Performs an upsert operation into the Delta Lake table\n\n"
         "This endpoint is idempotent and can be called multiple times safely. "
-        "Existing records are updated based on their ID, and the Delta table is optimized after each run."
+        "Existing records are updated based on their ID, and the Delta table is optimized after each run.\n\n"
+        "Data sources run concurrently on a bounded worker pool (`INGESTION_MAX_WORKERS`), each with its own "
+        "Notion rate-limit budget. A failing data source does not stop the others: its error is reported in "
+        "its summary and the response status becomes `partial_success`."
     ),
     response_description="Confirmation message indicating successful data ingestion",
     responses={
@@ -23,6 +30,23 @@ ingestion_leads = OpenApiDocs(
                         "message": "Données notion leads mise à jour",
                         "status": "success",
                         "records_processed": 2,
+                        "pipelines": [
+                            {
+                                "data_source": "Leads",
+                                "database_id": "27a1c2d3e4f5",
+                                "path_table_deltalake": "gs://notion-dataascode/data_leads",
+                                "status": "success",
+                                "records_processed": 2,
+                                "extract_seconds": 0.412,
+                                "raw_pages_appended": 2,
+                                "duplicate_leads": 0,
+                                "dedup_seconds": 0.004,
+                                "dedup_seconds_per_100k": 200.0,
+                                "load_seconds": 1.203,
+                                "duration_seconds": 1.621,
+                                "records_per_second": 1.2,
+                            }
+                        ],
                     }
                 }
             },
@@ -33,25 +57,94 @@ ingestion_leads = OpenApiDocs(
                 "application/json": {"example": {"detail": "NOTION_TOKEN environment variable not set or invalid"}}
             },
         },
-        404: {
-            "description": "Notion data source not found",
+        500: {
+            "description": "Every ingestion pipeline failed",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": {
+                            "message": "Every ingestion pipeline failed",
+                            "pipelines": [
+                                {
+                                    "data_source": "Leads",
+                                    "status": "error",
+                                    "records_processed": 0,
+                                    "error": "DataSourceNotFoundError: No data source named 'Leads' found "
+                                    "in the specified database",
+                                }
+                            ],
+                        }
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Ingestion"],
+        "operationId": "ingest_notion_leads",
+    },
+)
+
+replay_leads = OpenApiDocs(
+    summary="Rebuild the Leads tables from the raw landing tables",
+    description=(
+        "Replay endpoint that rebuilds the normalised tables without calling the Notion API. "
+        "The process includes:\n\n"
+        "1. **Read**: Keeps the latest landed version of every page in each raw Delta table\n"
+        "2. **Transform**: Normalizes the pages with the same DuckDB query as the ingestion and groups "
+        "duplicate leads\n"
+        "3. **Load**: Overwrites the Leads Delta table and refreshes the per-assignee pre-aggregate\n\n"
+        "Use it after a change of the transformation. The state history table is not rewritten. "
+        "The previous content of the tables stays readable through time travel."
+    ),
+    response_description="Confirmation message and per-source replay summaries",
+    responses={
+        200: {
+            "description": "Tables successfully rebuilt",
             "content": {
                 "application/json": {
-                    "example": {"detail": "No data source named 'Leads' found in the specified database"}
+                    "example": {
+                        "message": "Données notion leads reconstruites depuis la table brute",
+                        "status": "success",
+                        "records_processed": 2,
+                        "pipelines": [
+                            {
+                                "data_source": "Leads",
+                                "path_table_deltalake": "gs://notion-dataascode/data_leads",
+                                "status": "success",
+                                "records_processed": 2,
+                                "assignee_stats_rows": 4,
+                                "duration_seconds": 0.731,
+                            }
+                        ],
+                    }
                 }
             },
         },
         500: {
-            "description": "Internal server error during ETL process",
+            "description": "Every replay failed",
             "content": {
                 "application/json": {
-                    "example": {"detail": "Failed to write to Delta Lake", "error": "IO Error: Cannot open file"}
+                    "example": {
+                        "detail": {
+                            "message": "Every replay failed",
+                            "pipelines": [
+                                {
+                                    "data_source": "Leads",
+                                    "status": "error",
+                                    "records_processed": 0,
+                                    "error": "RawTableNotFoundError: Raw Delta table "
+                                    "'gs://notion-dataascode/data_leads_raw' does not exist",
+                                }
+                            ],
+                        }
+                    }
                 }
             },
         },
     },
     openapi_extra={
         "tags": ["Ingestion"],
-        "operationId": "ingest_notion_leads",
+        "operationId": "replay_notion_leads",
     },
 )
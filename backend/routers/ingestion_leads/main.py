@@ -4,21 +4,26 @@ This module handles the complete ETL process for Notion leads data:
 - Extracts data from Notion data sources
 - Transforms properties into a normalized format
 - Loads data into Delta Lake with merge operations
+
+Each configured data source runs as an isolated pipeline on a bounded
+worker pool, with its own Notion rate-limit budget. Once loaded, the new
+versions are warmed up and announced to the dashboards in the background.
+
+Raw Notion pages are kept in an append-only landing table, so the
+normalised tables can be replayed from it without calling Notion.
 """
 
 import os
 
 import logfire
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from loguru import logger
 
+from backend.core.config import settings
+from backend.routers.events.utils import publish_new_versions
 from backend.routers.ingestion_leads import docs
-from backend.routers.ingestion_leads.utils import (
-    extract_property_values,
-    get_data_source_from_notion,
-    normalise_data,
-    write_to_deltalake,
-)
+from backend.routers.ingestion_leads.utils import replay_pipeline, run_pipelines
 
 logfire.configure(token=os.environ["LOGFIRE_TOKEN"])
 logger.configure(handlers=[logfire.loguru_handler()])
@@ -27,31 +32,92 @@ router = APIRouter(prefix="/ingestion", tags=["Ingestion"])
 
 
 @router.get("/ingestion_leads", **docs.ingestion_leads.model_dump())
-async def ingestion_leads() -> dict[str, str | int]:
+async def ingestion_leads(background_tasks: BackgroundTasks) -> dict[str, str | int | list[dict]]:
     """Ingest Notion Leads data into Delta Lake.
 
-    Extracts data from Notion, transforms it, and loads into Delta Lake.
+    Extracts data from every configured Notion data source, transforms it,
+    and loads it into its Delta Lake table. After the response, the standard
+    aggregations of the new versions are cached and pushed to the dashboards.
+
+    Args:
+        background_tasks: Tasks run once the response is sent.
 
     Returns:
-        Dictionary with success message and record count.
+        Dictionary with success message, total record count and per-source summaries.
+
+    Raises:
+        HTTPException: If every pipeline failed.
     """
 
-    logger.info("🚀 Starting Notion leads ingestion...")
+    logger.info(f"🚀 Starting Notion ingestion for {len(settings.NOTION_PIPELINES)} data source(s)...")
+
+    summaries = await run_in_threadpool(run_pipelines, settings.NOTION_PIPELINES, settings.INGESTION_MAX_WORKERS)
+
+    for summary in summaries:
+        logger.info(
+            f"📊 [{summary['data_source']}] {summary['status']}: {summary['records_processed']} records "
+            f"in {summary['duration_seconds']}s ({summary['records_per_second']} records/s)"
+        )
 
-    logger.info("📥 Extracting data from Notion...")
-    my_data_source = get_data_source_from_notion()
+    failed = [summary for summary in summaries if summary["status"] != "success"]
+    if len(failed) == len(summaries):
+        raise HTTPException(
+            status_code=500, detail={"message": "Every ingestion pipeline failed", "pipelines": summaries}
+        )
 
-    logger.info("🔄 Transforming Notion properties...")
-    values = extract_property_values(my_data_source)
-    values_normalise = normalise_data(values)
-    logger.info(f"✅ Transformed {len(values_normalise)} records")
+    background_tasks.add_task(
+        publish_new_versions,
+        [summary["path_table_deltalake"] for summary in summaries if summary["status"] == "success"],
+    )
 
-    logger.info("💾 Writing to Delta Lake...")
-    write_to_deltalake(values_normalise)
-    logger.info("✅ Ingestion completed successfully")
+    logger.info(
+        "✅ Ingestion completed successfully" if not failed else f"⚠️ Ingestion completed with {len(failed)} failure(s)"
+    )
 
     return {
         "message": "Données notion leads mise à jour",
-        "status": "success",
-        "records_processed": len(values_normalise),
+        "status": "success" if not failed else "partial_success",
+        "records_processed": sum(summary["records_processed"] for summary in summaries),
+        "pipelines": summaries,
+    }
+
+
+@router.get("/replay_leads", **docs.replay_leads.model_dump())
+async def replay_leads(background_tasks: BackgroundTasks) -> dict[str, str | int | list[dict]]:
+    """Rebuild the normalised Leads tables from the raw landing tables.
+
+    Transforms again the latest raw version of every page of each configured
+    pipeline, without calling the Notion API.
+
+    Args:
+        background_tasks: Tasks run once the response is sent.
+
+    Returns:
+        Dictionary with success message, total record count and per-source summaries.
+
+    Raises:
+        HTTPException: If every replay failed.
+    """
+    logger.info(f"⏪ Replaying raw pages for {len(settings.NOTION_PIPELINES)} data source(s)...")
+
+    summaries = await run_in_threadpool(lambda: [replay_pipeline(pipeline) for pipeline in settings.NOTION_PIPELINES])
+
+    failed = [summary for summary in summaries if summary["status"] != "success"]
+    if len(failed) == len(summaries):
+        raise HTTPException(status_code=500, detail={"message": "Every replay failed", "pipelines": summaries})
+
+    background_tasks.add_task(
+        publish_new_versions,
+        [summary["path_table_deltalake"] for summary in summaries if summary["status"] == "success"],
+    )
+
+    logger.info(
+        "✅ Replay completed successfully" if not failed else f"⚠️ Replay completed with {len(failed)} failure(s)"
+    )
+
+    return {
+        "message": "Données notion leads reconstruites depuis la table brute",
+        "status": "success" if not failed else "partial_success",
+        "records_processed": sum(summary["records_processed"] for summary in summaries),
+        "pipelines": summaries,
     }
@@ -7,7 +7,7 @@ This module defines the data models used for:
 """
 
 from datetime import date
-from typing import Optional
+from typing import Literal, Optional, get_args
 
 import polars as pl
 from dotenv import load_dotenv
@@ -175,9 +175,9 @@ class NotionPropertyValues(BaseModel):
             value: The raw date value from Notion API.
 
         Returns:
-            A DateValue instance, or empty DateValue if value is not already DateValue.
+            The raw value to be validated as DateValue, or empty DateValue if value is None.
         """
-        if not isinstance(value, DateValue):
+        if value is None:
             value = DateValue()
         return value
 
@@ -204,9 +204,9 @@ class NotionPropertyValues(BaseModel):
             value: The raw select value from Notion API.
 
         Returns:
-            A SelectValue instance, or empty SelectValue if value is not already SelectValue.
+            The raw value to be validated as SelectValue, or empty SelectValue if value is None.
         """
-        if not isinstance(value, SelectValue):
+        if value is None:
             value = SelectValue()
         return value
 
@@ -216,16 +216,6 @@ class NotionPropertyValues(BaseModel):
         populate_by_name = True
 
 
-class ListNotionPropertyValues(BaseModel):
-    """Container for multiple validated Notion property value objects.
-
-    Attributes:
-        list_notion_property_value: List of validated NotionPropertyValues instances.
-    """
-
-    list_notion_property_value: list[NotionPropertyValues]
-
-
 SCHEMA_POLARS = {
     "id": pl.Utf8,
     "activite_source_pharow": pl.Utf8,
@@ -259,4 +249,82 @@ SCHEMA_POLARS = {
     "url_site_internet": pl.Utf8,
     "url_linkedin": pl.Utf8,
     "personne_assignee": pl.List(pl.Utf8),
+    # Smallest id of the leads sharing a blocking key with this one, its own id when it has no duplicate
+    "duplicate_group_id": pl.Utf8,
+}
+
+# Notion type of each property, used to extract its value from the raw page JSON
+# ("select" also covers status properties)
+NOTION_PROPERTY_TYPES = {
+    "activite_source_pharow": "select",
+    "departement": "select",
+    "en_croissance": "select",
+    "genre": "select",
+    "niveau_hierachique": "select",
+    "priorite": "select",
+    "reponse_setting": "select",
+    "show": "select",
+    "sous_departement": "select",
+    "tranche_effectif_corrigee": "select",
+    "type_de_setting": "select",
+    "etat": "select",
+    "adresse_siege_complete": "rich_text",
+    "chiffre_affaires_simplifie": "rich_text",
+    "nom": "rich_text",
+    "nom_entreprise": "rich_text",
+    "poste_occupe": "rich_text",
+    "prenom": "rich_text",
+    "ville_residence": "rich_text",
+    "nom_du_projet": "title",
+    "date_appel_booke": "date",
+    "date_appel_propose": "date",
+    "date_prise_contact": "date",
+    "date_relance": "date",
+    "date_reponse_prospect": "date",
+    "budget": "number",
+    "email_pro": "email",
+    "telephone": "phone_number",
+    "url_site_internet": "url",
+    "url_linkedin": "url",
+    "personne_assignee": "people",
+}
+NOTION_PROPERTY_NAMES = {field: NotionPropertyValues.model_fields[field].alias for field in NOTION_PROPERTY_TYPES}
+
+# Columns the duplicate detection derives its blocking keys from
+DEDUP_FIELDS = ["email_pro", "telephone", "url_linkedin", "nom", "prenom", "nom_entreprise"]
+
+# Legal forms ignored when comparing company names
+COMPANY_LEGAL_FORMS = ["sa", "sas", "sasu", "sarl", "eurl", "sci", "snc", "inc", "ltd", "llc", "gmbh"]
+
+# Raw landing table: one row per Notion page and per ingestion, page JSON kept untouched
+SCHEMA_RAW_POLARS = {
+    "ingestion_date": pl.Date,
+    "ingested_at": pl.Datetime("us", "UTC"),
+    "data_source": pl.Utf8,
+    "page_id": pl.Utf8,
+    "last_edited_time": pl.Utf8,
+    "page": pl.Utf8,
+}
+
+# Status fields whose changes are recorded in the history table
+TrackedField = Literal["etat", "reponse_setting", "show", "type_de_setting", "priorite"]
+TRACKED_FIELDS = list(get_args(TrackedField))
+
+SCHEMA_HISTORY_POLARS = {
+    "id": pl.Utf8,
+    **{field: SCHEMA_POLARS[field] for field in TRACKED_FIELDS},
+    "valid_from": pl.Datetime("us", "UTC"),
+    "valid_to": pl.Datetime("us", "UTC"),
+    "is_current": pl.Boolean,
+}
+
+# Date milestones counted per assignee and period in the pre-aggregate
+DATE_FIELDS = [field for field, dtype in SCHEMA_POLARS.items() if dtype == pl.Date]
+Granularity = Literal["week", "month"]
+
+SCHEMA_ASSIGNEE_STATS_POLARS = {
+    "personne_assignee": pl.Utf8,
+    "granularite": pl.Utf8,
+    "periode": pl.Date,
+    **dict.fromkeys(DATE_FIELDS, pl.Int64),
 }
@@ -0,0 +1,7 @@
+SELECT incoming.*
+FROM incoming_leads AS incoming
+INNER JOIN current_leads AS current
+  ON incoming.id = current.id
+WHERE
+  {% for column in columns %}incoming."{{ column }}" IS DISTINCT FROM current."{{ column }}"{% if not loop.last %}
+  OR {% endif %}{% endfor %}
@@ -0,0 +1,48 @@
+WITH
+{% if not latest_ingestion_only %}
+-- Latest landing of every page, found on narrow columns so the page JSON is not carried through the aggregation
+latest_landings AS (
+  SELECT
+    page_id,
+    MAX(ingested_at) AS ingested_at
+  FROM raw_pages
+  GROUP BY page_id
+),
+
+{% endif %}
+pages AS (
+  SELECT
+    page_id,
+    -- Parse each page once, extracting every property in the same pass
+    JSON_EXTRACT(page, [
+      {% for field in property_types %}'$.properties."{{ property_names[field] | replace("'", "''") }}"'{% if not loop.last %},
+      {% endif %}{% endfor %}
+    ]) AS properties
+  FROM raw_pages
+  {% if latest_ingestion_only %}
+  WHERE ingested_at = $ingested_at
+  {% else %}
+  SEMI JOIN latest_landings USING (page_id, ingested_at)
+  {% endif %}
+)
+
+SELECT
+  page_id AS id,
+  {% for field, notion_type in property_types.items() %}
+  {% set property = "properties[" ~ loop.index ~ "]" %}
+  {% if notion_type == "select" %}
+  COALESCE({{ property }} -> 'select' ->> 'name', {{ property }} -> 'status' ->> 'name')
+  {% elif notion_type in ("rich_text", "title") %}
+  {{ property }} -> '{{ notion_type }}' -> 0 ->> 'plain_text'
+  {% elif notion_type == "date" %}
+  CAST(LEFT({{ property }} -> 'date' ->> 'start', 10) AS DATE)
+  {% elif notion_type == "number" %}
+  CAST({{ property }} -> 'number' AS DOUBLE)
+  {% elif notion_type == "people" %}
+  COALESCE(JSON_EXTRACT_STRING({{ property }} -> 'people', '$[*].id'), [])
+  {% else %}
+  {{ property }} ->> '{{ notion_type }}'
+  {% endif %}
+  AS "{{ field }}"{% if not loop.last %},{% endif %}
+  {% endfor %}
+FROM pages;
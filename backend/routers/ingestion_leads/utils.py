@@ -1,229 +1,733 @@
+import json
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
 from typing import Callable
 
+import duckdb
+import logfire
 import polars as pl
-from deltalake import DeltaTable, write_deltalake
-from notion_client import Client
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from deltalake import DeltaTable, WriterProperties, write_deltalake
+from loguru import logger
+from notion_client import APIErrorCode, APIResponseError, Client
 
-from backend.core.config import settings
+from backend.core.config import NotionPipeline, settings
+from backend.core.delta import DELTA_TABLES, get_snapshot_dataset, get_snapshot_files, get_table_version
+from backend.core.sql import configure_gcs_access, render_query
 from backend.routers.ingestion_leads import model
 
+PATH_TO_FOLDER_REQUEST = Path(__file__).parent / "request"
+
 NOTION_CLIENT = Client(auth=settings.NOTION_TOKEN)
 
+DELTA_TABLE_CONFIGURATION = {
+    "delta.enableChangeDataFeed": "true",
+    "delta.checkpointInterval": str(settings.DELTA_CHECKPOINT_INTERVAL),
+    "delta.deletedFileRetentionDuration": f"interval {settings.DELTA_VACUUM_RETENTION_HOURS} hours",
+    "delta.logRetentionDuration": f"interval {settings.DELTA_VACUUM_RETENTION_HOURS} hours",
+}
+
+# DuckDB spills to disk beyond this limit instead of growing with the data source
+INGESTION_DUCKDB_CONFIG = {"memory_limit": settings.INGESTION_DUCKDB_MEMORY_LIMIT}
+
+# Row groups no larger than the streamed batches, so neither the Delta writer nor the scans buffer more rows than a batch
+DELTA_WRITER_PROPERTIES = WriterProperties(max_row_group_size=settings.DELTA_WRITE_BATCH_ROWS)
+
+
+class RawTableNotFoundError(Exception):
+    """Raised when the raw landing table of a pipeline does not exist."""
+
+    def __init__(self, path_raw_deltalake: str):
+        super().__init__(f"Raw Delta table '{path_raw_deltalake}' does not exist")
+
+
+class DataSourceNotFoundError(Exception):
+    """Raised when a Notion database has no data source with the requested name."""
+
+    def __init__(self, data_source_name: str):
+        super().__init__(f"No data source named '{data_source_name}' found in the specified database")
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing out calls to respect a requests-per-second budget.
+
+    Attributes:
+        interval: Minimum delay in seconds between two calls.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the next call fits in the budget."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
 
-def simple_strategy(prop_data: dict, key: str) -> any:
-    """Extract a simple value from Notion property data.
+
+def call_notion(
+    rate_limiter: RateLimiter, endpoint: Callable[..., dict], max_retries: int = settings.NOTION_MAX_RETRIES, **kwargs
+) -> dict:
+    """Call a Notion endpoint within a rate-limit budget.
+
+    Requests rejected with `rate_limited` are retried after the delay given
+    by the `Retry-After` header, or an exponential backoff if missing.
 
     Args:
-        prop_data: The property data dictionary from Notion.
-        key: The key to extract from the property data.
+        rate_limiter: Budget shared by all the calls of a pipeline.
+        endpoint: Bound Notion client method to call.
+        max_retries: Maximum number of retries on rate limiting.
+            Defaults to settings.NOTION_MAX_RETRIES.
+        **kwargs: Arguments forwarded to the endpoint.
 
     Returns:
-        The extracted value or None if not found.
+        The Notion API response.
+
+    Raises:
+        APIResponseError: If the call fails, or is still rate limited after all retries.
     """
-    return prop_data.get(key)
+    for attempt in range(max_retries + 1):
+        rate_limiter.wait()
+        try:
+            return endpoint(**kwargs)
+        except APIResponseError as error:
+            if error.code != APIErrorCode.RateLimited or attempt == max_retries:
+                raise
+            retry_after = float(error.headers.get("Retry-After", 2**attempt))
+            logger.warning(f"⏳ Notion rate limit reached, retrying in {retry_after}s")
+            time.sleep(retry_after)
+
 
+def get_data_source_from_notion(
+    databases_id: str = settings.DATABASE_ID,
+    notion_client: Client = NOTION_CLIENT,
+    data_source_name: str = "Leads",
+    rate_limiter: RateLimiter | None = None,
+) -> dict:
+    """Retrieve a data source from a Notion database.
 
-def list_strategy(prop_data: dict, key: str) -> list:
-    """Extract a list value from Notion property data.
+    Fetches the database metadata, finds the data source by name,
+    and queries all records from that data source, following pagination.
 
     Args:
-        prop_data: The property data dictionary from Notion.
-        key: The key to extract from the property data.
+        databases_id: The ID of the Notion database to query.
+            Defaults to DATABASE_ID from environment.
+        notion_client: Authenticated Notion client instance.
+            Defaults to NOTION_CLIENT.
+        data_source_name: Name of the data source to query. Defaults to "Leads".
+        rate_limiter: Budget applied to every Notion call.
+            Defaults to a new 3 requests per second budget.
 
     Returns:
-        The extracted list or empty list if not found.
+        Dictionary containing query results with all pages from the data source.
+
+    Raises:
+        DataSourceNotFoundError: If no data source with this name is found in the database.
     """
-    return prop_data.get(key, [])
+    rate_limiter = rate_limiter or RateLimiter(requests_per_second=3)
 
+    my_page = call_notion(rate_limiter, notion_client.databases.retrieve, database_id=databases_id)
 
-StrategiesPatternPropertiesNotion = Callable[[dict, str], any]
-DictStrategiesPatternPropertiesNotion = Callable[[str], StrategiesPatternPropertiesNotion]
+    data_source = next(
+        (
+            model.DataSourceInfos(**data_sources)
+            for data_sources in my_page["data_sources"]
+            if data_sources["name"] == data_source_name
+        ),
+        None,
+    )
+    if data_source is None:
+        raise DataSourceNotFoundError(data_source_name)
 
+    results = []
+    start_cursor = None
+    while True:
+        query_kwargs = {"data_source_id": data_source.id_, "page_size": 100}
+        if start_cursor:
+            query_kwargs["start_cursor"] = start_cursor
+        my_data_source = call_notion(rate_limiter, notion_client.data_sources.query, **query_kwargs)
+        results.extend(my_data_source["results"])
 
-STRATEGIES_PROPERTIES: DictStrategiesPatternPropertiesNotion = {
-    "select": lambda data: simple_strategy(data, "select"),
-    "status": lambda data: simple_strategy(data, "status"),
-    "date": lambda data: simple_strategy(data, "date"),
-    "number": lambda data: simple_strategy(data, "number"),
-    "email": lambda data: simple_strategy(data, "email"),
-    "phone_number": lambda data: simple_strategy(data, "phone_number"),
-    "url": lambda data: simple_strategy(data, "url"),
-    "rich_text": lambda data: list_strategy(data, "rich_text"),
-    "title": lambda data: list_strategy(data, "title"),
-    "people": lambda data: list_strategy(data, "people"),
-}
+        if not my_data_source.get("has_more"):
+            break
+        start_cursor = my_data_source["next_cursor"]
 
+    return {**my_data_source, "results": results, "has_more": False, "next_cursor": None}
 
-def extract_property_values(
-    notion_properties: dict, strategy_properties: DictStrategiesPatternPropertiesNotion = STRATEGIES_PROPERTIES
-) -> list[model.NotionPropertyValues]:
-    """Extract property values from Notion data source results.
 
-    Iterates through all pages in the Notion data source and extracts
-    property values using the appropriate strategy for each property type.
+def run_pipeline(pipeline: NotionPipeline, notion_client: Client = NOTION_CLIENT) -> dict:
+    """Run the extract, transform and load steps of one pipeline.
+
+    Any error is caught and reported in the summary, so a failing data source
+    does not stop the other pipelines.
 
     Args:
-        notion_properties: Dictionary containing 'results' key with Notion pages.
-        strategy_properties: Dictionary mapping property types to extraction strategies.
-            Defaults to STRATEGIES_PROPERTIES.
+        pipeline: Data source and target table to ingest.
+        notion_client: Authenticated Notion client instance.
+            Defaults to NOTION_CLIENT.
 
     Returns:
-        ListNotionPropertyValues object containing validated property values for all pages.
+        Summary of the run with status, record count, durations and throughput.
     """
-    values = {}
-    list_notion_properties = []
+    summary = {
+        "data_source": pipeline.data_source_name,
+        "database_id": pipeline.database_id,
+        "path_table_deltalake": pipeline.path_table_deltalake,
+        "status": "success",
+        "records_processed": 0,
+    }
+    started_at = time.perf_counter()
+    ingested_at = datetime.now(timezone.utc)
+
+    with logfire.span("ingest {data_source}", data_source=pipeline.data_source_name):
+        try:
+            logger.info(f"📥 [{pipeline.data_source_name}] Extracting data from Notion...")
+            my_data_source = get_data_source_from_notion(
+                pipeline.database_id,
+                notion_client,
+                data_source_name=pipeline.data_source_name,
+                rate_limiter=RateLimiter(pipeline.requests_per_second),
+            )
+            summary["extract_seconds"] = round(time.perf_counter() - started_at, 3)
 
-    for propertie in notion_properties["results"]:
-        for prop_key, prop_data in propertie["properties"].items():
-            prop_type = prop_data.get("type")
-            values[prop_key] = strategy_properties[prop_type](prop_data)
+            logger.info(f"🗄️ [{pipeline.data_source_name}] Landing {len(my_data_source['results'])} raw pages...")
+            write_started_at = time.perf_counter()
+            summary["raw_pages_appended"] = write_raw_to_deltalake(
+                my_data_source["results"],
+                data_source_name=pipeline.data_source_name,
+                path_raw_deltalake=pipeline.path_raw_deltalake,
+                ingested_at=ingested_at,
+            )
 
-        values["id"] = propertie["id"]
+            if not my_data_source["results"]:
+                # On a first ingestion the raw table does not exist yet, so there is nothing to transform
+                logger.info(f"📭 [{pipeline.data_source_name}] No page returned by Notion, nothing to write")
+            else:
+                with tempfile.TemporaryDirectory(prefix="silver_") as staging_dir:
+                    logger.info(f"🔄 [{pipeline.data_source_name}] Transforming raw pages...")
+                    path_staging = Path(staging_dir) / "silver.parquet"
+                    summary["records_processed"] = stage_batches(
+                        stream_raw_to_silver(pipeline.path_raw_deltalake, ingested_at=ingested_at), path_staging
+                    )
+                    summary.update(add_duplicate_groups(path_staging))
 
-        list_notion_properties.append(model.NotionPropertyValues(**values))
+                    logger.info(
+                        f"💾 [{pipeline.data_source_name}] Writing {summary['records_processed']} records to Delta Lake..."
+                    )
+                    write_to_deltalake(
+                        read_staged_batches(path_staging), path_table_deltalake=pipeline.path_table_deltalake
+                    )
+                    summary["history_rows_appended"] = write_history_to_deltalake(
+                        pl.scan_parquet(path_staging),
+                        path_history_deltalake=pipeline.path_history_deltalake,
+                        ingested_at=ingested_at,
+                    )
+                    summary["assignee_stats_rows"] = write_assignee_stats_to_deltalake(
+                        scan_leads_table(pipeline.path_table_deltalake),
+                        path_assignee_stats_deltalake=pipeline.path_assignee_stats_deltalake,
+                    )
+            summary["load_seconds"] = round(time.perf_counter() - write_started_at, 3)
+        except Exception as error:
+            logger.exception(f"❌ [{pipeline.data_source_name}] Ingestion failed")
+            summary["status"] = "error"
+            summary["error"] = f"{type(error).__name__}: {error}"
 
-    list_notion_properties = model.ListNotionPropertyValues(list_notion_property_value=list_notion_properties)
+    duration = time.perf_counter() - started_at
+    summary["duration_seconds"] = round(duration, 3)
+    summary["records_per_second"] = round(summary["records_processed"] / duration, 1) if duration else 0.0
 
-    return list_notion_properties
+    return summary
 
 
-def normalise_data(list_notion_properties: model.ListNotionPropertyValues) -> list[dict]:
-    """Normalize Notion properties into a flat dictionary structure.
+def replay_pipeline(pipeline: NotionPipeline) -> dict:
+    """Rebuild the tables of one pipeline from its raw landing table, without calling Notion.
 
-    Transforms complex Notion property structures into simple key-value pairs
-    suitable for database storage. Handles nested structures like:
-    - Select/Status fields: extracts .name attribute
-    - Rich text fields: extracts plain_text from first element
-    - Date fields: extracts .start attribute
-    - People fields: extracts list of user IDs
+    The latest raw version of every page is transformed again and replaces the
+    content of the target table, then the per-assignee pre-aggregate is
+    refreshed. The state history is left as recorded.
 
     Args:
-        list_notion_properties: Validated list of Notion property values.
+        pipeline: Pipeline whose tables are rebuilt.
 
     Returns:
-        List of normalized dictionaries with flat structure ready for database insertion.
+        Summary of the replay with status, record count and duration.
     """
-    list_values = []
+    summary = {
+        "data_source": pipeline.data_source_name,
+        "path_table_deltalake": pipeline.path_table_deltalake,
+        "status": "success",
+        "records_processed": 0,
+    }
+    started_at = time.perf_counter()
 
-    for notion_properties in list_notion_properties.list_notion_property_value:
-        values = {}
+    with logfire.span("replay {data_source}", data_source=pipeline.data_source_name):
+        try:
+            logger.info(f"⏪ [{pipeline.data_source_name}] Replaying raw pages from {pipeline.path_raw_deltalake}...")
+            with tempfile.TemporaryDirectory(prefix="silver_") as staging_dir:
+                path_staging = Path(staging_dir) / "silver.parquet"
+                summary["records_processed"] = stage_batches(
+                    stream_raw_to_silver(pipeline.path_raw_deltalake), path_staging
+                )
+                summary.update(add_duplicate_groups(path_staging))
 
-        # Select/Status fields - extraire .name si existe
-        values["id"] = notion_properties.id_
-        values["activite_source_pharow"] = (
-            notion_properties.activite_source_pharow.name if notion_properties.activite_source_pharow else None
-        )
-        values["departement"] = notion_properties.departement.name if notion_properties.departement else None
-        values["en_croissance"] = notion_properties.en_croissance.name if notion_properties.en_croissance else None
-        values["genre"] = notion_properties.genre.name if notion_properties.genre else None
-        values["niveau_hierachique"] = (
-            notion_properties.niveau_hierachique.name if notion_properties.niveau_hierachique else None
-        )
-        values["priorite"] = notion_properties.priorite.name if notion_properties.priorite else None
-        values["reponse_setting"] = (
-            notion_properties.reponse_setting.name if notion_properties.reponse_setting else None
-        )
-        values["show"] = notion_properties.show.name if notion_properties.show else None
-        values["sous_departement"] = (
-            notion_properties.sous_departement.name if notion_properties.sous_departement else None
-        )
-        values["tranche_effectif_corrigee"] = (
-            notion_properties.tranche_effectif_corrigee.name if notion_properties.tranche_effectif_corrigee else None
-        )
-        values["type_de_setting"] = (
-            notion_properties.type_de_setting.name if notion_properties.type_de_setting else None
-        )
-        values["etat"] = notion_properties.etat.name if notion_properties.etat else None
+                write_to_deltalake(
+                    read_staged_batches(path_staging), path_table_deltalake=pipeline.path_table_deltalake, replace=True
+                )
+                summary["assignee_stats_rows"] = write_assignee_stats_to_deltalake(
+                    scan_leads_table(pipeline.path_table_deltalake),
+                    path_assignee_stats_deltalake=pipeline.path_assignee_stats_deltalake,
+                )
+        except Exception as error:
+            logger.exception(f"❌ [{pipeline.data_source_name}] Replay failed")
+            summary["status"] = "error"
+            summary["error"] = f"{type(error).__name__}: {error}"
 
-        # Rich text fields - extraire plain_text ou laisser liste vide
-        values["adresse_siege_complete"] = (
-            notion_properties.adresse_siege_complete[0].plain_text if notion_properties.adresse_siege_complete else None
-        )
-        values["chiffre_affaires_simplifie"] = (
-            notion_properties.chiffre_affaires_simplifie[0].plain_text
-            if notion_properties.chiffre_affaires_simplifie
-            else None
-        )
-        values["nom"] = notion_properties.nom[0].plain_text if notion_properties.nom else None
-        values["nom_entreprise"] = (
-            notion_properties.nom_entreprise[0].plain_text if notion_properties.nom_entreprise else None
-        )
-        values["poste_occupe"] = (
-            notion_properties.poste_occupe[0].plain_text if notion_properties.poste_occupe else None
-        )
-        values["prenom"] = notion_properties.prenom[0].plain_text if notion_properties.prenom else None
-        values["ville_residence"] = (
-            notion_properties.ville_residence[0].plain_text if notion_properties.ville_residence else None
-        )
-        values["nom_du_projet"] = (
-            notion_properties.nom_du_projet[0].plain_text if notion_properties.nom_du_projet else None
-        )
+    summary["duration_seconds"] = round(time.perf_counter() - started_at, 3)
+
+    return summary
 
-        # Date fields - extraire .start si existe
-        values["date_appel_booke"] = (
-            notion_properties.date_appel_booke.start if notion_properties.date_appel_booke else None
-        )
-        values["date_appel_propose"] = (
-            notion_properties.date_appel_propose.start if notion_properties.date_appel_propose else None
-        )
-        values["date_prise_contact"] = (
-            notion_properties.date_prise_contact.start if notion_properties.date_prise_contact else None
-        )
-        values["date_relance"] = notion_properties.date_relance.start if notion_properties.date_relance else None
-        values["date_reponse_prospect"] = (
-            notion_properties.date_reponse_prospect.start if notion_properties.date_reponse_prospect else None
-        )
 
-        # Simple fields
-        values["budget"] = notion_properties.budget
-        values["email_pro"] = notion_properties.email_pro
-        values["telephone"] = notion_properties.telephone
-        values["url_site_internet"] = notion_properties.url_site_internet
-        values["url_linkedin"] = notion_properties.url_linkedin
+def run_pipelines(
+    pipelines: list[NotionPipeline] = settings.NOTION_PIPELINES,
+    max_workers: int = settings.INGESTION_MAX_WORKERS,
+    notion_client: Client = NOTION_CLIENT,
+) -> list[dict]:
+    """Run several ingestion pipelines concurrently on a bounded worker pool.
 
-        # People field
-        values["personne_assignee"] = (
-            [p.get("id") for p in notion_properties.personne_assignee] if notion_properties.personne_assignee else []
+    Args:
+        pipelines: Pipelines to run. Defaults to settings.NOTION_PIPELINES.
+        max_workers: Maximum number of pipelines running at the same time.
+            Defaults to settings.INGESTION_MAX_WORKERS.
+        notion_client: Authenticated Notion client instance.
+            Defaults to NOTION_CLIENT.
+
+    Returns:
+        One summary per pipeline, in the order of the pipelines.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion") as executor:
+        return list(executor.map(lambda pipeline: run_pipeline(pipeline, notion_client), pipelines))
+
+
+def write_raw_to_deltalake(
+    pages: list[dict],
+    data_source_name: str,
+    path_raw_deltalake: str = settings.GCS_RAW_URI,
+    ingested_at: datetime | None = None,
+) -> int:
+    """Append the untouched Notion pages to the raw landing table.
+
+    The table is append-only and partitioned by ingestion date: every
+    ingestion adds one row per page with its JSON as returned by Notion, so the
+    normalised tables can be rebuilt later without calling the API.
+
+    Args:
+        pages: Notion pages returned by the data source query.
+        data_source_name: Name of the data source the pages come from.
+        path_raw_deltalake: URI or path to the raw Delta table.
+            Defaults to settings.GCS_RAW_URI.
+        ingested_at: Time of the ingestion. Defaults to now (UTC).
+
+    Returns:
+        Number of pages appended.
+    """
+    if not pages:
+        return 0
+
+    ingested_at = ingested_at or datetime.now(timezone.utc)
+    raw_pages = pl.DataFrame(
+        {
+            "ingestion_date": [ingested_at.date()] * len(pages),
+            "ingested_at": [ingested_at] * len(pages),
+            "data_source": [data_source_name] * len(pages),
+            "page_id": [page["id"] for page in pages],
+            "last_edited_time": [page.get("last_edited_time") for page in pages],
+            "page": [json.dumps(page, ensure_ascii=False) for page in pages],
+        },
+        schema=model.SCHEMA_RAW_POLARS,
+    )
+
+    if not DELTA_TABLES.exists(path_raw_deltalake):
+        write_deltalake(
+            path_raw_deltalake,
+            raw_pages,
+            mode="append",
+            partition_by=["ingestion_date"],
+            configuration=DELTA_TABLE_CONFIGURATION,
+            writer_properties=DELTA_WRITER_PROPERTIES,
         )
+        return raw_pages.height
+
+    with DELTA_TABLES.open(path_raw_deltalake) as dt:
+        sync_table_configuration(dt)
+        write_deltalake(dt, raw_pages, mode="append", writer_properties=DELTA_WRITER_PROPERTIES)
 
-        list_values.append(values)
+    return raw_pages.height
 
-    return list_values
 
+def connect_ingestion_duckdb(path_table_deltalake: str) -> duckdb.DuckDBPyConnection:
+    """Open a DuckDB connection bounded by settings.INGESTION_DUCKDB_MEMORY_LIMIT.
 
-def get_data_source_from_notion(databases_id: str = settings.DATABASE_ID, notion_client: Client = NOTION_CLIENT):
-    """Retrieve Leads data source from a Notion database.
+    Args:
+        path_table_deltalake: URI or path of the table read, GCS access is configured for remote URIs.
 
-    Fetches the database metadata, finds the "Leads" data source,
-    and queries all records from that data source.
+    Returns:
+        DuckDB connection.
+    """
+    conn = duckdb.connect(config=INGESTION_DUCKDB_CONFIG)
+    if "://" in path_table_deltalake:
+        configure_gcs_access(conn)
+    return conn
+
+
+def register_parquet_files(conn: duckdb.DuckDBPyConnection, view_name: str, files: list[str], schema: dict) -> None:
+    """Expose Parquet files as a view read by DuckDB's native Parquet reader.
 
     Args:
-        databases_id: The ID of the Notion database to query.
-            Defaults to DATABASE_ID from environment.
-        notion_client: Authenticated Notion client instance.
-            Defaults to NOTION_CLIENT.
+        conn: DuckDB connection the query will run on.
+        view_name: Name of the view.
+        files: URIs of the Parquet files.
+        schema: Polars schema of an empty view, used when there is no file.
+    """
+    if files:
+        conn.read_parquet(files, hive_partitioning=False).create_view(view_name)
+    else:
+        conn.register(view_name, pl.DataFrame(schema=schema).to_arrow())
+
+
+def stream_query(
+    conn: duckdb.DuckDBPyConnection,
+    query: str,
+    parameters: dict | None = None,
+    batch_rows: int = settings.DELTA_WRITE_BATCH_ROWS,
+) -> pa.RecordBatchReader:
+    """Run a DuckDB query and stream its result as Arrow record batches.
+
+    Args:
+        conn: Dedicated DuckDB connection, closed once the result is exhausted.
+        query: SQL query to execute.
+        parameters: Values of the query parameters. Defaults to None.
+        batch_rows: Maximum number of rows per record batch.
+            Defaults to settings.DELTA_WRITE_BATCH_ROWS.
+
+    Returns:
+        Reader of the query result.
+    """
+    reader = conn.execute(query, parameters or {}).fetch_record_batch(batch_rows)
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        try:
+            yield from reader
+        finally:
+            conn.close()
+
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+
+def select_changed_leads(path_staging: Path, path_table_deltalake: str = settings.GCS_URI) -> pa.RecordBatchReader:
+    """Keep the staged leads that exist in the table with at least one different column.
+
+    The comparison runs in DuckDB on the Parquet files of both sides, and
+    spills to disk beyond settings.INGESTION_DUCKDB_MEMORY_LIMIT, so the merge
+    that follows only holds the changed leads instead of the whole data source.
+
+    Args:
+        path_staging: Parquet file of the normalised leads, written by stage_batches.
+        path_table_deltalake: URI or path to the existing Delta table.
+            Defaults to settings.GCS_URI.
+
+    Returns:
+        Reader of the changed leads, with the columns of the staged file.
+    """
+    query = render_query(
+        PATH_TO_FOLDER_REQUEST,
+        "changed_leads.sql",
+        columns=[column for column in pq.read_schema(path_staging).names if column != "id"],
+    )
+
+    conn = connect_ingestion_duckdb(path_table_deltalake)
+    register_parquet_files(conn, "incoming_leads", [str(path_staging)], model.SCHEMA_POLARS)
+    register_parquet_files(
+        conn,
+        "current_leads",
+        get_snapshot_files(path_table_deltalake, get_table_version(path_table_deltalake)),
+        model.SCHEMA_POLARS,
+    )
+
+    return stream_query(conn, query)
+
+
+def stream_raw_to_silver(
+    path_raw_deltalake: str = settings.GCS_RAW_URI,
+    ingested_at: datetime | None = None,
+    batch_rows: int = settings.DELTA_WRITE_BATCH_ROWS,
+) -> pa.RecordBatchReader:
+    """Normalise raw Notion pages with a single DuckDB query, as a stream of Arrow record batches.
+
+    Property values are extracted from the page JSON according to
+    model.NOTION_PROPERTY_TYPES: the name of select and status options, the
+    first plain text of rich text and titles, the start of dates and the ids
+    of people. Rows are fetched from DuckDB one batch at a time as the reader is consumed, so
+    the normalised leads are never held in memory all at once.
+
+    Args:
+        path_raw_deltalake: URI or path to the raw Delta table.
+            Defaults to settings.GCS_RAW_URI.
+        ingested_at: Only transform the pages landed by this ingestion.
+            Defaults to the latest landed version of every page, to replay all history.
+        batch_rows: Maximum number of rows per record batch.
+            Defaults to settings.DELTA_WRITE_BATCH_ROWS.
 
     Returns:
-        Dictionary containing query results with all pages from the Leads data source.
+        Reader of the normalised leads, closing its DuckDB connection once exhausted.
 
     Raises:
-        UnboundLocalError: If no data source named "Leads" is found in the database.
+        RawTableNotFoundError: If the raw table does not exist.
+    """
+    raw_version = get_table_version(path_raw_deltalake)
+    if raw_version is None:
+        raise RawTableNotFoundError(path_raw_deltalake)
+
+    query = render_query(
+        PATH_TO_FOLDER_REQUEST,
+        "raw_pages_to_silver.sql",
+        latest_ingestion_only=ingested_at is not None,
+        property_types=model.NOTION_PROPERTY_TYPES,
+        property_names=model.NOTION_PROPERTY_NAMES,
+    )
+    partition_filters = [("ingestion_date", "=", ingested_at.date().isoformat())] if ingested_at else None
+
+    conn = connect_ingestion_duckdb(path_raw_deltalake)
+    register_parquet_files(
+        conn,
+        "raw_pages",
+        get_snapshot_files(path_raw_deltalake, raw_version, partition_filters),
+        model.SCHEMA_RAW_POLARS,
+    )
+
+    return stream_query(
+        conn, query, parameters={"ingested_at": ingested_at} if ingested_at else None, batch_rows=batch_rows
+    )
+
+
+def stage_batches(batches: pa.RecordBatchReader, path_staging: Path) -> int:
+    """Spill a stream of record batches to a local Parquet file, one batch at a time.
+
+    The staged file can then be read several times, by the merge and by the
+    history and pre-aggregate writers, without keeping the rows in memory.
+
+    Args:
+        batches: Record batches to stage.
+        path_staging: Path of the Parquet file to write.
+
+    Returns:
+        Number of rows staged.
+    """
+    rows_staged = 0
+    with pq.ParquetWriter(path_staging, batches.schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows_staged += batch.num_rows
+
+    return rows_staged
+
+
+def read_staged_batches(path_staging: Path, batch_rows: int = settings.DELTA_WRITE_BATCH_ROWS) -> pa.RecordBatchReader:
+    """Stream back the record batches of a file written by stage_batches.
+
+    Args:
+        path_staging: Path of the staged Parquet file.
+        batch_rows: Maximum number of rows per record batch.
+            Defaults to settings.DELTA_WRITE_BATCH_ROWS.
+
+    Returns:
+        Reader of the staged rows.
+    """
+    staged_file = pq.ParquetFile(path_staging)
+    return pa.RecordBatchReader.from_batches(staged_file.schema_arrow, staged_file.iter_batches(batch_size=batch_rows))
+
+
+class DisjointSet:
+    """Union-find over lead ids, each set being represented by its smallest id.
+
+    Only ids passed to union are stored, any other id is its own set.
+    """
+
+    def __init__(self):
+        self._parents: dict[str, str] = {}
+
+    def find(self, lead_id: str) -> str:
+        """Return the representative of the set of a lead, compressing the path to it."""
+        root = lead_id
+        while self._parents.get(root, root) != root:
+            root = self._parents[root]
+
+        while lead_id != root:
+            self._parents[lead_id], lead_id = root, self._parents[lead_id]
+
+        return root
+
+    def union(self, lead_id: str, other_id: str) -> None:
+        """Merge the sets of two leads, the smallest representative becoming the one of both."""
+        root, other_root = sorted((self.find(lead_id), self.find(other_id)))
+        if root != other_root:
+            self._parents[other_root] = root
+            self._parents.setdefault(root, root)
+
+    def representatives(self) -> dict[str, str]:
+        """Map every stored id to the representative of its set."""
+        return {lead_id: self.find(lead_id) for lead_id in self._parents}
+
+
+def normalise_text(column: str) -> pl.Expr:
+    """Lowercase a text column, strip its accents and collapse punctuation and spaces into single spaces.
+
+    Args:
+        column: Name of the column.
+
+    Returns:
+        Polars expression of the normalised text.
+    """
+    return (
+        pl.col(column)
+        .str.normalize("NFKD")
+        .str.replace_all(r"\p{M}", "")
+        .str.to_lowercase()
+        .str.replace_all(r"[^a-z0-9]+", " ")
+        .str.strip_chars()
+    )
+
+
+def compute_blocking_keys(leads: pl.LazyFrame) -> pl.LazyFrame:
+    """Derive the normalised keys two leads must share to be considered duplicates.
+
+    - email: trimmed and lowercased `email_pro`
+    - telephone: last 9 digits of `telephone`, so +33 6..., 06... and 0033 6... match
+    - linkedin: profile slug of `url_linkedin`, whatever the scheme, subdomain or query string
+    - identity: sorted name tokens of `nom` and `prenom` with `nom_entreprise`
+      stripped of its legal form, so case, accents, punctuation and swapped
+      first and last names do not matter
+
+    Args:
+        leads: Leads with an `id` column and the columns of model.DEDUP_FIELDS.
+
+    Returns:
+        Lazy frame with the `id` column and one column per blocking key, null
+        when the lead has no value for it.
     """
-    my_page = notion_client.databases.retrieve(database_id=databases_id)
+    email = pl.col("email_pro").str.strip_chars().str.to_lowercase()
+    phone_digits = pl.col("telephone").str.replace_all(r"\D", "")
+    person = (
+        pl.concat_str([normalise_text("nom"), normalise_text("prenom")], separator=" ", ignore_nulls=True)
+        .str.split(" ")
+        .list.sort()
+        .list.join(" ")
+    )
+    company = (
+        normalise_text("nom_entreprise")
+        .str.split(" ")
+        .list.eval(pl.element().filter(~pl.element().is_in(model.COMPANY_LEGAL_FORMS)))
+        .list.join(" ")
+    )
+
+    return leads.select(
+        "id",
+        pl.when(email.str.contains("@")).then(email).alias("email"),
+        pl.when(phone_digits.str.len_chars() >= 9).then(phone_digits.str.slice(-9)).alias("telephone"),
+        pl.col("url_linkedin").str.to_lowercase().str.extract(r"linkedin\.com/in/([^/?#]+)").alias("linkedin"),
+        pl.when(pl.col("nom").is_not_null() & (company != ""))
+        .then(pl.concat_str([person, company], separator="|"))
+        .alias("identity"),
+    )
+
 
-    for data_sources in my_page["data_sources"]:
-        if data_sources["name"] == "Leads":
-            data_source = model.DataSourceInfos(**data_sources)
+def find_duplicate_groups(leads: pl.DataFrame) -> pl.DataFrame:
+    """Group leads sharing a blocking key, directly or through other leads.
+
+    Leads are indexed by each normalised key with a hash group by, and the
+    leads of a same block are merged with a union-find, so the cost grows
+    with the number of leads instead of the number of pairs.
+
+    Args:
+        leads: Leads with an `id` column and the columns of model.DEDUP_FIELDS.
+
+    Returns:
+        DataFrame with the `id` and `duplicate_group_id` columns, one row per lead.
+    """
+    blocking_keys = compute_blocking_keys(leads.lazy()).collect()
+    duplicate_sets = DisjointSet()
+
+    for key in blocking_keys.columns[1:]:
+        blocks = (
+            blocking_keys.lazy()
+            .drop_nulls(key)
+            .group_by(key)
+            .agg(pl.col("id"))
+            .filter(pl.col("id").list.len() > 1)
+            .collect()
+        )
+        for lead_ids in blocks["id"]:
+            for other_id in lead_ids[1:]:
+                duplicate_sets.union(lead_ids[0], other_id)
 
-    my_data_source = notion_client.data_sources.query(data_source_id=data_source.id_)
+    return leads.select("id", pl.col("id").replace(duplicate_sets.representatives()).alias("duplicate_group_id"))
 
-    return my_data_source
+
+def add_duplicate_groups(path_staging: Path) -> dict:
+    """Add the `duplicate_group_id` column to the staged leads.
+
+    Only the columns of the blocking keys are loaded to find the groups, the
+    staged file is then rewritten in batches with the group of each lead.
+
+    Args:
+        path_staging: Parquet file of the normalised leads, written by stage_batches.
+
+    Returns:
+        Number of leads belonging to a group of several leads, duration of the
+        detection and duration per 100 000 leads.
+    """
+    started_at = time.perf_counter()
+    duplicate_groups = find_duplicate_groups(pl.read_parquet(path_staging, columns=["id", *model.DEDUP_FIELDS]))
+
+    path_grouped = path_staging.with_name(f"grouped_{path_staging.name}")
+    (
+        pl.scan_parquet(path_staging)
+        .drop("duplicate_group_id", strict=False)
+        .join(duplicate_groups.lazy(), on="id", how="left", maintain_order="left")
+        .sink_parquet(path_grouped, row_group_size=settings.DELTA_WRITE_BATCH_ROWS)
+    )
+    path_grouped.replace(path_staging)
+
+    duration = time.perf_counter() - started_at
+    duplicate_leads = duplicate_groups.filter(pl.col("duplicate_group_id").is_duplicated()).height
+    logger.info(f"🧬 {duplicate_leads} of {duplicate_groups.height} leads have duplicates ({duration:.2f}s)")
+
+    return {
+        "duplicate_leads": duplicate_leads,
+        "dedup_seconds": round(duration, 3),
+        "dedup_seconds_per_100k": round(duration * 100_000 / duplicate_groups.height, 3)
+        if duplicate_groups.height
+        else 0.0,
+    }
 
 
 def write_to_deltalake(
-    values_normalise: list[dict],
+    values_normalise: list[dict] | pa.RecordBatchReader,
     schema: dict = model.SCHEMA_POLARS,
     path_table_deltalake: str = settings.GCS_URI,
+    replace: bool = False,
 ) -> None:
     """Write normalized data to Delta Lake with upsert logic.
 
@@ -233,43 +737,344 @@ def write_to_deltalake(
 
     The merge operation:
     - Matches on 'id' field
-    - Updates all columns except 'id' when matched
+    - Updates all columns except 'id' when matched and at least one of them changed
     - No insert operation for new records (update-only mode)
+    - Adds the columns missing from the table (e.g. `duplicate_group_id`) and
+      then updates every matched lead
+
+    The table is created with the change data feed enabled and a retention of
+    settings.DELTA_VACUUM_RETENTION_HOURS for removed files and commit logs
+    (existing tables are updated), so only rows that actually changed show up
+    in the feed and older versions stay readable for time travel. A checkpoint
+    is written every settings.DELTA_CHECKPOINT_INTERVAL commits, and the table
+    is taken from DELTA_TABLES, so opening it only replays the latest commits.
+
+    Given a record batch reader, the rows are streamed instead of being loaded
+    in a DataFrame: a create or overwrite writes the batches as they come in a
+    single transaction, and a merge stages them to a local Parquet file, keeps
+    the changed leads with select_changed_leads and scans those as a streamed
+    source, so peak memory does not depend on the number of leads.
 
     Args:
-        values_normalise: List of normalized dictionaries to write.
-        schema: Polars schema definition for type enforcement.
+        values_normalise: List of normalized dictionaries to write, or a reader
+            of record batches with the columns of the schema.
+        schema: Polars schema definition for type enforcement of the dictionaries.
             Defaults to model.SCHEMA_POLARS.
         path_table_deltalake: URI or path to Delta table (supports GCS).
             Defaults to settings.GCS_URI.
+        replace: Overwrite the table content and schema instead of merging,
+            used when replaying the raw table. Defaults to False.
 
     Returns:
         None
 
     Note:
-        Vacuum operation uses retention_hours=0 which immediately removes
-        old files. This is suitable for development but should be adjusted
-        for production use.
+        Vacuum only removes files unreferenced for more than
+        settings.DELTA_VACUUM_RETENTION_HOURS, so the change data feed and
+        snapshots of recent versions stay readable.
     """
+    if isinstance(values_normalise, pa.RecordBatchReader):
+        data_to_put_un_duckdb = values_normalise
+    else:
+        data_to_put_un_duckdb = pl.from_dicts(values_normalise, schema_overrides=schema)
 
-    data_to_put_un_duckdb = pl.from_dicts(values_normalise, schema_overrides=schema)
-
-    if not DeltaTable.is_deltatable(path_table_deltalake):
-        write_deltalake(path_table_deltalake, data_to_put_un_duckdb)
+    if not DELTA_TABLES.exists(path_table_deltalake):
+        write_deltalake(
+            path_table_deltalake,
+            data_to_put_un_duckdb,
+            configuration=DELTA_TABLE_CONFIGURATION,
+            writer_properties=DELTA_WRITER_PROPERTIES,
+        )
         return
 
-    dt = DeltaTable(path_table_deltalake)
+    with DELTA_TABLES.open(path_table_deltalake) as dt:
+        sync_table_configuration(dt)
 
-    (
-        dt.merge(
-            source=data_to_put_un_duckdb,
-            predicate="target.id = source.id",
-            source_alias="source",
-            target_alias="target",
+        if replace:
+            write_deltalake(
+                dt,
+                data_to_put_un_duckdb,
+                mode="overwrite",
+                schema_mode="overwrite",
+                writer_properties=DELTA_WRITER_PROPERTIES,
+            )
+            return
+
+        merge_leads(dt, data_to_put_un_duckdb, path_table_deltalake)
+
+        dt.optimize.compact()
+        dt.vacuum(
+            retention_hours=settings.DELTA_VACUUM_RETENTION_HOURS, enforce_retention_duration=False, dry_run=False
+        )
+
+
+def sync_table_configuration(dt: DeltaTable) -> None:
+    """Apply DELTA_TABLE_CONFIGURATION to a table created before one of its properties was set.
+
+    Args:
+        dt: Delta table to update.
+    """
+    table_configuration = dt.metadata().configuration
+    if any(table_configuration.get(key) != value for key, value in DELTA_TABLE_CONFIGURATION.items()):
+        dt.alter.set_table_properties(DELTA_TABLE_CONFIGURATION)
+
+
+def merge_leads(
+    dt: DeltaTable, data_to_put_un_duckdb: pl.DataFrame | pa.RecordBatchReader, path_table_deltalake: str
+) -> None:
+    """Update the leads of the table that changed, as described in write_to_deltalake.
+
+    Args:
+        dt: Leads Delta table.
+        data_to_put_un_duckdb: Normalised leads, as a DataFrame or a reader of record batches.
+        path_table_deltalake: URI or path to the Delta table, read by select_changed_leads.
+    """
+    source_columns = [
+        column
+        for column in (
+            data_to_put_un_duckdb.schema.names
+            if isinstance(data_to_put_un_duckdb, pa.RecordBatchReader)
+            else data_to_put_un_duckdb.columns
         )
-        .when_matched_update_all(except_cols=["id"])
-        .execute()
+        if column != "id"
+    ]
+    new_columns = set(source_columns) - {field.name for field in dt.schema().fields}
+    # Leads are all updated when columns are added, so that none keeps a null value for them
+    changed_predicate = (
+        None
+        if new_columns
+        else " OR ".join(f'(target."{column}" IS DISTINCT FROM source."{column}")' for column in source_columns)
     )
 
-    dt.optimize.compact()
-    dt.vacuum(retention_hours=0, enforce_retention_duration=False, dry_run=False)
+    with tempfile.TemporaryDirectory(prefix="merge_") as staging_dir:
+        if isinstance(data_to_put_un_duckdb, pa.RecordBatchReader) and not new_columns:
+            path_staging = Path(staging_dir) / "incoming.parquet"
+            stage_batches(data_to_put_un_duckdb, path_staging)
+            data_to_put_un_duckdb = select_changed_leads(path_staging, path_table_deltalake)
+
+        (
+            dt.merge(
+                source=data_to_put_un_duckdb,
+                predicate="target.id = source.id",
+                source_alias="source",
+                target_alias="target",
+                merge_schema=bool(new_columns),
+                writer_properties=DELTA_WRITER_PROPERTIES,
+                streamed_exec=True,
+            )
+            .when_matched_update_all(predicate=changed_predicate, except_cols=["id"])
+            .execute()
+        )
+
+
+def to_lazy_frame(values_normalise: list[dict] | pl.LazyFrame) -> pl.LazyFrame:
+    """Accept normalized leads either as dictionaries or as a lazy scan of staged batches.
+
+    Args:
+        values_normalise: List of normalized dictionaries, or a lazy scan of the staged leads.
+
+    Returns:
+        Lazy frame of the leads, typed with model.SCHEMA_POLARS when built from dictionaries.
+    """
+    if isinstance(values_normalise, pl.LazyFrame):
+        return values_normalise
+
+    return pl.from_dicts(values_normalise, schema_overrides=model.SCHEMA_POLARS).lazy()
+
+
+def scan_leads_table(path_table_deltalake: str) -> pl.LazyFrame:
+    """Lazily scan the latest version of a leads table.
+
+    The merge of an ingestion only updates the leads already in the table, so
+    the table can hold fewer leads than the data source. Aggregates served
+    alongside the leads are computed from this scan rather than from the
+    staged data source.
+
+    Args:
+        path_table_deltalake: URI or path to the leads Delta table (supports GCS).
+
+    Returns:
+        Lazy frame of the leads of the latest table version.
+    """
+    version = get_table_version(path_table_deltalake)
+    return pl.scan_pyarrow_dataset(get_snapshot_dataset(path_table_deltalake, version))
+
+
+def write_history_to_deltalake(
+    values_normalise: list[dict] | pl.LazyFrame,
+    path_history_deltalake: str = settings.GCS_HISTORY_URI,
+    tracked_fields: list[str] = model.TRACKED_FIELDS,
+    ingested_at: datetime | None = None,
+) -> int:
+    """Record changes of the tracked status fields as SCD2 rows.
+
+    A new row is appended for a lead only when one of its tracked fields
+    differs from its current row (or when the lead is new). The previous
+    current row is closed in the same merge, so each lead always has exactly
+    one current row and its successive states cover contiguous
+    [valid_from, valid_to) intervals.
+
+    The merge source holds each changed lead with a NULL key, so it never
+    matches and is inserted as the new current row. Leads that already have a
+    current row are also keyed by their id, to close it. New leads are not
+    keyed, as that copy would not match either and be inserted a second time.
+
+    Args:
+        values_normalise: List of normalized dictionaries just ingested, or a
+            lazy scan of the staged leads.
+        path_history_deltalake: URI or path to the history Delta table.
+            Defaults to settings.GCS_HISTORY_URI.
+        tracked_fields: Fields whose changes open a new history row.
+            Defaults to model.TRACKED_FIELDS.
+        ingested_at: Start of validity of the new rows. Defaults to now (UTC).
+
+    Returns:
+        Number of history rows appended.
+    """
+    ingested_at = ingested_at or datetime.now(timezone.utc)
+    schema = {column: model.SCHEMA_HISTORY_POLARS[column] for column in ["id", *tracked_fields]}
+
+    incoming = (
+        to_lazy_frame(values_normalise)
+        .select(list(schema))
+        .cast(schema)
+        .unique(subset="id", keep="last", maintain_order=True)
+        .with_columns(
+            valid_from=pl.lit(ingested_at, dtype=model.SCHEMA_HISTORY_POLARS["valid_from"]),
+            valid_to=pl.lit(None, dtype=model.SCHEMA_HISTORY_POLARS["valid_to"]),
+            is_current=pl.lit(True),
+        )
+        .collect()
+    )
+
+    if not DELTA_TABLES.exists(path_history_deltalake):
+        write_deltalake(path_history_deltalake, incoming, configuration=DELTA_TABLE_CONFIGURATION)
+        return incoming.height
+
+    with DELTA_TABLES.open(path_history_deltalake) as dt:
+        current = pl.from_arrow(
+            dt.to_pyarrow_dataset().to_table(columns=["id", *tracked_fields], filter=pc.field("is_current"))
+        )
+
+        changed = incoming.join(current, on="id", how="left", suffix="_current").filter(
+            pl.col("id").is_in(current["id"]).not_()
+            | pl.any_horizontal(pl.col(field).ne_missing(pl.col(f"{field}_current")) for field in tracked_fields)
+        )
+        changed = changed.select(incoming.columns)
+        if changed.is_empty():
+            return 0
+
+        source = pl.concat([
+            changed.filter(pl.col("id").is_in(current["id"])).with_columns(merge_key=pl.col("id")),
+            changed.with_columns(merge_key=pl.lit(None, dtype=pl.Utf8)),
+        ])
+
+        sync_table_configuration(dt)
+        (
+            dt.merge(
+                source=source,
+                predicate="target.id = source.merge_key AND target.is_current",
+                source_alias="source",
+                target_alias="target",
+            )
+            .when_matched_update(updates={"valid_to": "source.valid_from", "is_current": "false"})
+            .when_not_matched_insert(updates={column: f'source."{column}"' for column in incoming.columns})
+            .execute()
+        )
+
+    return changed.height
+
+
+def aggregate_by_assignee(
+    values_normalise: list[dict] | pl.LazyFrame, date_fields: list[str] = model.DATE_FIELDS
+) -> pl.DataFrame:
+    """Count date milestones per assignee and per week and month.
+
+    Leads are exploded on `personne_assignee`, so a lead assigned to several
+    people counts for each of them, and leads without assignee are ignored.
+
+    Args:
+        values_normalise: List of normalized dictionaries of all the leads,
+            or a lazy scan of the leads table.
+        date_fields: Date milestones to count. Defaults to model.DATE_FIELDS.
+
+    Returns:
+        One row per assignee, granularity and period with one count per milestone.
+    """
+    events = (
+        to_lazy_frame(values_normalise)
+        .select("id", "personne_assignee", *date_fields)
+        .explode("personne_assignee")
+        .drop_nulls("personne_assignee")
+        .unpivot(index=["id", "personne_assignee"], on=date_fields, variable_name="milestone", value_name="date")
+        .drop_nulls("date")
+    )
+
+    periods = pl.concat([
+        events.with_columns(granularite=pl.lit("week"), periode=pl.col("date").dt.truncate("1w")),
+        events.with_columns(granularite=pl.lit("month"), periode=pl.col("date").dt.truncate("1mo")),
+    ])
+
+    return (
+        periods.group_by("personne_assignee", "granularite", "periode")
+        .agg(pl.col("milestone").eq(field).sum().alias(field) for field in date_fields)
+        .cast({field: model.SCHEMA_ASSIGNEE_STATS_POLARS[field] for field in date_fields})
+        .sort("personne_assignee", "granularite", "periode")
+        .collect()
+    )
+
+
+def write_assignee_stats_to_deltalake(
+    values_normalise: list[dict] | pl.LazyFrame,
+    path_assignee_stats_deltalake: str = settings.GCS_ASSIGNEE_STATS_URI,
+) -> int:
+    """Refresh the per-assignee pre-aggregate from the leads table.
+
+    The aggregate is recomputed from all the leads of the table, as returned
+    by scan_leads_table, and merged into the pre-aggregate: changed periods are
+    updated, new ones inserted and periods that no longer have any event
+    deleted. Unchanged rows are left untouched.
+
+    Args:
+        values_normalise: List of normalized dictionaries of all the leads,
+            or a lazy scan of the leads table.
+        path_assignee_stats_deltalake: URI or path to the pre-aggregate Delta table.
+            Defaults to settings.GCS_ASSIGNEE_STATS_URI.
+
+    Returns:
+        Number of rows in the pre-aggregate.
+    """
+    assignee_stats = aggregate_by_assignee(values_normalise)
+
+    if not DELTA_TABLES.exists(path_assignee_stats_deltalake):
+        write_deltalake(path_assignee_stats_deltalake, assignee_stats, configuration=DELTA_TABLE_CONFIGURATION)
+        return assignee_stats.height
+
+    with DELTA_TABLES.open(path_assignee_stats_deltalake) as dt:
+        sync_table_configuration(dt)
+        changed_predicate = " OR ".join(
+            f'(target."{field}" IS DISTINCT FROM source."{field}")' for field in model.DATE_FIELDS
+        )
+
+        (
+            dt.merge(
+                source=assignee_stats,
+                predicate=(
+                    "target.personne_assignee = source.personne_assignee "
+                    "AND target.granularite = source.granularite AND target.periode = source.periode"
+                ),
+                source_alias="source",
+                target_alias="target",
+            )
+            .when_matched_update_all(predicate=changed_predicate)
+            .when_not_matched_insert_all()
+            .when_not_matched_by_source_delete()
+            .execute()
+        )
+
+        dt.optimize.compact()
+        dt.vacuum(
+            retention_hours=settings.DELTA_VACUUM_RETENTION_HOURS, enforce_retention_duration=False, dry_run=False
+        )
+
+    return assignee_stats.height
@@ -0,0 +1,59 @@
+"""OpenAPI documentation for leads endpoints."""
+
+from backend.core.openapi_docs_model import OpenApiDocs
+
+list_leads = OpenApiDocs(
+    summary="List and search leads with keyset pagination",
+    description=(
+        "Listing endpoint that serves individual leads from a local index of the Leads Delta Lake table. "
+        "The process includes:\n\n"
+        "1. **Refresh**: Rebuilds the local DuckDB index if a new Delta version was committed\n"
+        "2. **Filter**: Keeps leads matching `etat`, `priorite`, `departement`, `reponse_setting`, "
+        "`type_de_setting` and `personne_assignee`\n"
+        "3. **Search**: Matches every term of `q` as a prefix of the words of `nom`, `prenom`, "
+        "`nom_entreprise` or `email_pro` (case and accent insensitive)\n"
+        "4. **Paginate**: Returns at most `limit` leads after the given cursor\n\n"
+        "Leads are sorted on `sort` then `id`. NULL values come last in ascending order and first "
+        "in descending order. Pass `next_cursor` back as `cursor` to fetch the following page; "
+        "it is `null` on the last page. A cursor is only valid with the sort it was produced with."
+    ),
+    response_description="One page of leads and the cursor of the next page",
+    responses={
+        200: {
+            "description": "Page of leads successfully retrieved",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "items": [
+                            {
+                                "id": "28a1c2d3-0000-4000-8000-000000000001",
+                                "nom": "Martin",
+                                "prenom": "Claire",
+                                "nom_entreprise": "Acme",
+                                "email_pro": "claire.martin@acme.fr",
+                                "etat": "Contacté",
+                                "priorite": "Haute",
+                                "date_prise_contact": "2025-10-06",
+                                "personne_assignee": ["5f3e1b2a-0000-4000-8000-000000000002"],
+                            }
+                        ],
+                        "next_cursor": "eyJzb3J0IjoiaWQiLCJvcmRlciI6ImFzYyIsInZhbHVlIjpudWxsLCJpZCI6IjI4YTEifQ==",
+                        "table_version": 12,
+                    }
+                }
+            },
+        },
+        400: {
+            "description": "Invalid pagination cursor",
+            "content": {"application/json": {"example": {"detail": "Cursor was produced for sort=nom order=asc"}}},
+        },
+        404: {
+            "description": "Delta Lake table not found",
+            "content": {"application/json": {"example": {"detail": "Delta table 'data_leads' does not exist"}}},
+        },
+    },
+    openapi_extra={
+        "tags": ["Leads"],
+        "operationId": "list_leads",
+    },
+)
@@ -0,0 +1,87 @@
+"""Leads module for listing and searching individual leads.
+
+This module serves per-lead views without scanning the Delta table:
+- Keeps a local DuckDB index in sync with the latest Delta version
+- Filters, sorts and searches leads against the index
+- Paginates results with keyset cursors
+"""
+
+import os
+from typing import Annotated
+
+import logfire
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from backend.routers.leads import docs, model
+from backend.routers.leads.utils import InvalidCursorError, LeadsTableNotFoundError, list_leads
+
+logfire.configure(token=os.environ["LOGFIRE_TOKEN"])
+logger.configure(handlers=[logfire.loguru_handler()])
+
+router = APIRouter(prefix="/leads", tags=["Leads"])
+
+
+@router.get("", **docs.list_leads.model_dump())
+async def get_leads(
+    etat: Annotated[list[str] | None, Query(description="Keep leads in one of these states")] = None,
+    priorite: Annotated[list[str] | None, Query(description="Keep leads with one of these priorities")] = None,
+    departement: Annotated[list[str] | None, Query(description="Keep leads from one of these departments")] = None,
+    reponse_setting: Annotated[list[str] | None, Query(description="Keep leads with one of these answers")] = None,
+    type_de_setting: Annotated[list[str] | None, Query(description="Keep leads with one of these types")] = None,
+    personne_assignee: Annotated[
+        list[str] | None, Query(description="Keep leads assigned to one of these people")
+    ] = None,
+    q: Annotated[str | None, Query(description="Prefix search on nom, prenom, nom_entreprise and email_pro")] = None,
+    sort: Annotated[model.SortField, Query(description="Field to sort on")] = "id",
+    order: Annotated[model.SortOrder, Query(description="Sort direction")] = "asc",
+    limit: Annotated[int, Query(ge=1, le=500, description="Maximum number of leads per page")] = 50,
+    cursor: Annotated[str | None, Query(description="Next cursor returned by the previous page")] = None,
+):
+    """List leads with filters, search and keyset pagination.
+
+    Args:
+        etat: Accepted states.
+        priorite: Accepted priorities.
+        departement: Accepted departments.
+        reponse_setting: Accepted setting answers.
+        type_de_setting: Accepted setting types.
+        personne_assignee: Accepted assignee IDs.
+        q: Free text search.
+        sort: Field to sort on.
+        order: Sort direction.
+        limit: Maximum number of leads per page.
+        cursor: Next cursor returned by the previous page.
+
+    Returns:
+        Dictionary with the page items, next cursor and index table version.
+    """
+    filters = {
+        "etat": etat,
+        "priorite": priorite,
+        "departement": departement,
+        "reponse_setting": reponse_setting,
+        "type_de_setting": type_de_setting,
+    }
+    logger.info(f"🔎 Listing leads sort={sort} order={order} limit={limit} q={q!r}")
+
+    try:
+        page = await run_in_threadpool(
+            list_leads,
+            filters=filters,
+            assignees=personne_assignee,
+            search=q,
+            sort=sort,
+            order=order,
+            limit=limit,
+            cursor_token=cursor,
+        )
+    except InvalidCursorError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    except LeadsTableNotFoundError as error:
+        raise HTTPException(status_code=404, detail=str(error)) from error
+
+    logger.info(f"✅ Returned {len(page['items'])} leads from index version {page['table_version']}")
+
+    return page
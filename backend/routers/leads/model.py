@@ -0,0 +1,68 @@
+"""Field definitions and models for the leads listing endpoint.
+
+This module defines:
+- Which columns of the leads table can be filtered, sorted and searched
+- The DuckDB type of each sortable column, used to cast keyset cursors
+- The cursor model exchanged with clients for keyset pagination
+"""
+
+from datetime import date
+from typing import Literal
+
+from pydantic import BaseModel
+
+SEARCH_FIELDS = ["nom", "prenom", "nom_entreprise", "email_pro"]
+
+FILTER_FIELDS = ["etat", "priorite", "departement", "reponse_setting", "type_de_setting"]
+
+SORT_FIELDS = {
+    "id": "VARCHAR",
+    "nom": "VARCHAR",
+    "prenom": "VARCHAR",
+    "nom_entreprise": "VARCHAR",
+    "etat": "VARCHAR",
+    "priorite": "VARCHAR",
+    "departement": "VARCHAR",
+    "budget": "DOUBLE",
+    "date_appel_booke": "DATE",
+    "date_appel_propose": "DATE",
+    "date_prise_contact": "DATE",
+    "date_relance": "DATE",
+    "date_reponse_prospect": "DATE",
+}
+
+SortField = Literal[
+    "id",
+    "nom",
+    "prenom",
+    "nom_entreprise",
+    "etat",
+    "priorite",
+    "departement",
+    "budget",
+    "date_appel_booke",
+    "date_appel_propose",
+    "date_prise_contact",
+    "date_relance",
+    "date_reponse_prospect",
+]
+SortOrder = Literal["asc", "desc"]
+
+
+class LeadsCursor(BaseModel):
+    """Position of the last lead returned by a page.
+
+    The cursor is bound to the sort it was produced with: resuming a listing
+    with another sort field or order is rejected.
+
+    Attributes:
+        sort: Field the listing is sorted on.
+        order: Sort direction of the listing.
+        value: Value of the sort field for the last lead, None if it was NULL.
+        id: Identifier of the last lead, used as tie-breaker.
+    """
+
+    sort: SortField
+    order: SortOrder
+    value: str | float | date | None = None
+    id: str
@@ -0,0 +1,19 @@
+CREATE TABLE leads AS
+SELECT
+  *,
+  LIST_DISTINCT(
+    LIST_FILTER(
+      REGEXP_SPLIT_TO_ARRAY(
+        LOWER(STRIP_ACCENTS(CONCAT_WS(' ', {{ search_fields | join(', ') }}))),
+        '[^a-z0-9]+'
+      ),
+      term -> term <> ''
+    )
+  ) AS search_terms
+FROM delta_snapshot
+ORDER BY id;
+
+CREATE TABLE index_metadata AS
+SELECT
+  {{ table_version }} AS table_version,
+  NOW() AS built_at;
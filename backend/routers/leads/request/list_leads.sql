@@ -0,0 +1,34 @@
+SELECT * EXCLUDE (search_terms)
+FROM leads
+WHERE TRUE
+{%- for field in filters %}
+  AND LIST_CONTAINS(${{ field }}, {{ field }})
+{%- endfor %}
+{%- if filter_assignee %}
+  AND LIST_HAS_ANY(personne_assignee, $personne_assignee)
+{%- endif %}
+{%- for token in search_tokens %}
+  AND LIST_BOOL_OR(LIST_TRANSFORM(search_terms, term -> STARTS_WITH(term, $search_token_{{ loop.index0 }})))
+{%- endfor %}
+{%- if cursor is not none %}
+  {%- if order == "asc" and cursor.value is not none %}
+  AND (
+    {{ sort }} > CAST($cursor_value AS {{ sort_type }})
+    OR ({{ sort }} = CAST($cursor_value AS {{ sort_type }}) AND id > $cursor_id)
+    OR {{ sort }} IS NULL
+  )
+  {%- elif order == "asc" %}
+  AND {{ sort }} IS NULL AND id > $cursor_id
+  {%- elif cursor.value is not none %}
+  AND (
+    {{ sort }} < CAST($cursor_value AS {{ sort_type }})
+    OR ({{ sort }} = CAST($cursor_value AS {{ sort_type }}) AND id < $cursor_id)
+  )
+  {%- else %}
+  AND (({{ sort }} IS NULL AND id < $cursor_id) OR {{ sort }} IS NOT NULL)
+  {%- endif %}
+{%- endif %}
+ORDER BY
+  {{ sort }} {{ order | upper }} NULLS {{ "LAST" if order == "asc" else "FIRST" }},
+  id {{ order | upper }}
+LIMIT $limit;
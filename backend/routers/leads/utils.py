@@ -0,0 +1,328 @@
+"""Local search index over the leads Delta table.
+
+The leads table lives on GCS, so serving per-lead pages straight from
+DELTA_SCAN would mean a full remote scan per request. Instead, the latest
+table version is materialised into a local DuckDB file, rebuilt only when
+a new Delta version appears, and every listing query runs against it.
+"""
+
+import base64
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import duckdb
+from loguru import logger
+
+from backend.core.config import settings
+from backend.core.delta import DELTA_TABLES, get_table_version
+from backend.core.sql import render_query
+from backend.routers.leads import model
+
+PATH_TO_FOLDER_REQUEST = Path(__file__).parent / "request"
+
+
+class LeadsTableNotFoundError(Exception):
+    """Raised when the leads Delta table does not exist yet."""
+
+    def __init__(self, path_table_deltalake: str):
+        super().__init__(f"Delta table '{path_table_deltalake}' does not exist")
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+    def __init__(self, detail: str = "Malformed cursor"):
+        super().__init__(detail)
+
+
+class CursorSortMismatchError(InvalidCursorError):
+    """Raised when a pagination cursor was produced for another sort."""
+
+    def __init__(self, sort: str, order: str):
+        super().__init__(f"Cursor was produced for sort={sort} order={order}")
+
+
+def normalise_search_text(text: str) -> list[str]:
+    """Split a search string into the same terms as the index.
+
+    Mirrors the normalisation applied in build_leads_index.sql: accents are
+    stripped, text is lowercased and split on any non alphanumeric character.
+
+    Args:
+        text: Raw search string typed by the user.
+
+    Returns:
+        List of normalised search terms, without empty strings.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return [term for term in re.split(r"[^a-z0-9]+", without_accents.lower()) if term]
+
+
+def encode_cursor(cursor: model.LeadsCursor) -> str:
+    """Encode a cursor into an opaque URL-safe token.
+
+    Args:
+        cursor: Position of the last lead of a page.
+
+    Returns:
+        Base64 URL-safe token to send back as the next cursor.
+    """
+    return base64.urlsafe_b64encode(cursor.model_dump_json().encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str, sort: model.SortField, order: model.SortOrder) -> model.LeadsCursor:
+    """Decode a cursor token and check it matches the requested sort.
+
+    Args:
+        token: Opaque token previously returned as next cursor.
+        sort: Field the listing is sorted on.
+        order: Sort direction of the listing.
+
+    Returns:
+        The decoded cursor.
+
+    Raises:
+        InvalidCursorError: If the token is malformed or was produced for another sort.
+    """
+    try:
+        cursor = model.LeadsCursor(**json.loads(base64.urlsafe_b64decode(token.encode("ascii"))))
+    except (ValueError, TypeError) as error:
+        raise InvalidCursorError() from error
+
+    if cursor.sort != sort or cursor.order != order:
+        raise CursorSortMismatchError(cursor.sort, cursor.order)
+
+    return cursor
+
+
+class LeadsIndex:
+    """Local DuckDB copy of the leads table, refreshed on new Delta versions.
+
+    The freshness check only reads the Delta transaction log and is throttled
+    to once every `refresh_seconds`, so most requests go straight to the local
+    file. Each Delta version gets its own index file, named after the version
+    and published with an atomic rename, so readers never observe a
+    half-built index. DuckDB caches its databases by path within a process,
+    which is why a rebuild never reconnects to the path of a previous version.
+
+    Attributes:
+        path_table_deltalake: URI or path to the source Delta table.
+        path_index: Base path of the local DuckDB index files, suffixed with their version.
+        refresh_seconds: Minimum delay between two Delta version checks.
+        version: Delta version the current index was built from.
+    """
+
+    def __init__(
+        self,
+        path_table_deltalake: str = settings.GCS_URI,
+        path_index: str = settings.LEADS_INDEX_PATH,
+        refresh_seconds: int = settings.LEADS_INDEX_REFRESH_SECONDS,
+    ):
+        self.path_table_deltalake = path_table_deltalake
+        self.path_index = Path(path_index)
+        self.refresh_seconds = refresh_seconds
+        self.version: int | None = None
+        self._conn: duckdb.DuckDBPyConnection | None = None
+        self._last_check = float("-inf")
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self) -> int:
+        """Make sure the index matches the latest Delta version.
+
+        Returns:
+            Delta version the index currently reflects.
+
+        Raises:
+            LeadsTableNotFoundError: If the Delta table does not exist.
+        """
+        with self._lock:
+            if self._conn is None:
+                self._open_existing()
+
+            if self._conn is not None and time.monotonic() - self._last_check < self.refresh_seconds:
+                return self.version
+
+            table_version = get_table_version(self.path_table_deltalake)
+            self._last_check = time.monotonic()
+
+            if table_version is None:
+                raise LeadsTableNotFoundError(self.path_table_deltalake)
+
+            if table_version != self.version:
+                path_version = self._path_for_version(table_version)
+                if not path_version.exists():
+                    self._rebuild(table_version, path_version)
+                self._connect(path_version)
+
+            return self.version
+
+    def _path_for_version(self, table_version: int) -> Path:
+        """Return the index file of a Delta version, sorting in version order."""
+        return self.path_index.with_name(f"{self.path_index.stem}.v{table_version:020d}{self.path_index.suffix}")
+
+    def _open_existing(self) -> None:
+        """Reuse the latest index file left on disk by a previous process, if any."""
+        versions = sorted(self.path_index.parent.glob(f"{self.path_index.stem}.v*{self.path_index.suffix}"))
+        if versions:
+            self._connect(versions[-1])
+            logger.info(f"📂 Reusing leads index at version {self.version}")
+
+    def _connect(self, path_version: Path) -> None:
+        """Serve the index from a version file.
+
+        Queries still running on the previous connection keep their own
+        cursor, the previous database is released once they are done.
+
+        Args:
+            path_version: Index file to open.
+        """
+        conn = duckdb.connect(str(path_version), read_only=True)
+        self.version = conn.execute("SELECT table_version FROM index_metadata").fetchone()[0]
+        self._conn = conn
+
+    def _rebuild(self, table_version: int, path_version: Path) -> None:
+        """Materialise a Delta version into its index file.
+
+        Args:
+            table_version: Delta version to materialise.
+            path_version: Final path of the index file.
+        """
+        logger.info(f"🔄 Rebuilding leads index for Delta version {table_version}...")
+        started_at = time.perf_counter()
+
+        self.path_index.parent.mkdir(parents=True, exist_ok=True)
+        # One temporary file per process, so workers rebuilding at the same time do not collide
+        path_tmp = path_version.with_suffix(f".{os.getpid()}.tmp")
+        path_tmp.unlink(missing_ok=True)
+
+        with DELTA_TABLES.open(self.path_table_deltalake, version=table_version) as dt:
+            delta_snapshot = dt.to_pyarrow_dataset()
+        build_conn = duckdb.connect(str(path_tmp))
+        try:
+            build_conn.register("delta_snapshot", delta_snapshot)
+            build_conn.execute(
+                render_query(
+                    PATH_TO_FOLDER_REQUEST,
+                    "build_leads_index.sql",
+                    search_fields=model.SEARCH_FIELDS,
+                    table_version=table_version,
+                )
+            )
+        finally:
+            build_conn.close()
+
+        os.replace(path_tmp, path_version)
+        self._remove_old_versions(keep=path_version)
+        logger.info(f"✅ Leads index rebuilt in {time.perf_counter() - started_at:.2f}s")
+
+    def _remove_old_versions(self, keep: Path) -> None:
+        """Remove the index files older than the previous version.
+
+        Workers still reading a removed file keep their open handle.
+
+        Args:
+            keep: Index file just built.
+        """
+        versions = sorted(self.path_index.parent.glob(f"{self.path_index.stem}.v*{self.path_index.suffix}"))
+        for path in versions[: max(versions.index(keep) - 1, 0)]:
+            path.unlink(missing_ok=True)
+
+    def query(self, query: str, parameters: dict) -> list[dict]:
+        """Run a read query against the index.
+
+        Args:
+            query: SQL query referencing the `leads` table.
+            parameters: Named parameters bound to the query.
+
+        Returns:
+            List of rows as dictionaries.
+        """
+        cursor = self._conn.cursor()
+        try:
+            result = cursor.execute(query, parameters)
+            columns = [column[0] for column in result.description]
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+        finally:
+            cursor.close()
+
+
+LEADS_INDEX = LeadsIndex()
+
+
+def list_leads(
+    filters: dict[str, list[str]],
+    assignees: list[str] | None,
+    search: str | None,
+    sort: model.SortField,
+    order: model.SortOrder,
+    limit: int,
+    cursor_token: str | None,
+    leads_index: LeadsIndex = LEADS_INDEX,
+) -> dict:
+    """Return one page of leads using keyset pagination.
+
+    Rows are ordered by (sort field, id), NULLs last in ascending order and
+    first in descending order. The next page starts strictly after the last
+    returned (value, id) pair, so pages stay stable under deep pagination and
+    cost the same whatever their position.
+
+    Args:
+        filters: Mapping of filterable field to accepted values.
+        assignees: Keep leads assigned to at least one of these people.
+        search: Free text matched as prefixes of name, company and email terms.
+        sort: Field to sort on.
+        order: Sort direction.
+        limit: Maximum number of leads in the page.
+        cursor_token: Next cursor returned by the previous page, if any.
+        leads_index: Local index to query. Defaults to LEADS_INDEX.
+
+    Returns:
+        Dictionary with the page items, next cursor and index table version.
+
+    Raises:
+        LeadsTableNotFoundError: If the Delta table does not exist.
+        InvalidCursorError: If the cursor is malformed or does not match the sort.
+    """
+    cursor = decode_cursor(cursor_token, sort, order) if cursor_token else None
+    table_version = leads_index.ensure_fresh()
+
+    active_filters = {field: values for field, values in filters.items() if values}
+    search_tokens = normalise_search_text(search) if search else []
+
+    query = render_query(
+        PATH_TO_FOLDER_REQUEST,
+        "list_leads.sql",
+        filters=list(active_filters),
+        filter_assignee=bool(assignees),
+        search_tokens=search_tokens,
+        cursor=cursor,
+        sort=sort,
+        sort_type=model.SORT_FIELDS[sort],
+        order=order,
+    )
+
+    parameters: dict = {**active_filters, "limit": limit + 1}
+    if assignees:
+        parameters["personne_assignee"] = assignees
+    for index, token in enumerate(search_tokens):
+        parameters[f"search_token_{index}"] = token
+    if cursor is not None:
+        parameters["cursor_id"] = cursor.id
+        if cursor.value is not None:
+            parameters["cursor_value"] = str(cursor.value)
+
+    rows = leads_index.query(query, parameters)
+    items = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(model.LeadsCursor(sort=sort, order=order, value=last[sort], id=last["id"]))
+
+    return {"items": items, "next_cursor": next_cursor, "table_version": table_version}
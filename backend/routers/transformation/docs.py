@@ -15,7 +15,11 @@ count_date_by_week = OpenApiDocs(
         "- UNPIVOT: Transforms date columns into rows (melt operation)\n"
         "- DATE_TRUNC: Groups dates by week (Monday as week start)\n"
         "- PIVOT: Transforms event types back into columns with counts\n\n"
-        "This endpoint is useful for weekly activity dashboards and time-series analysis."
+        "This endpoint is useful for weekly activity dashboards and time-series analysis.\n\n"
+        "Pass `as_of_version` or `as_of_timestamp` to aggregate a historical snapshot of the table "
+        "(time travel). Historical results never change and are cached in memory.\n\n"
+        "Pass `deduplicate=true` to count each group of duplicate leads (same email, phone, LinkedIn "
+        "profile or name and company, detected during ingestion) once."
     ),
     response_description="List of weekly aggregated date event counts",
     responses={
@@ -44,10 +48,31 @@ count_date_by_week = OpenApiDocs(
                 }
             },
         },
+        400: {
+            "description": "Deduplication not available on this table version",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 has no duplicate_group_id column, ingest or replay the table "
+                        "to deduplicate it"
+                    }
+                }
+            },
+        },
         404: {
             "description": "Delta Lake table not found",
             "content": {"application/json": {"example": {"detail": "Delta table 'data_leads' does not exist"}}},
         },
+        410: {
+            "description": "Table version removed by the log cleanup or the vacuum",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 is no longer available: 12 data files were removed by the vacuum"
+                    }
+                }
+            },
+        },
         500: {
             "description": "Internal server error during transformation",
             "content": {
@@ -108,7 +133,11 @@ count_date_by_month = OpenApiDocs(
         "- UNPIVOT: Transforms date columns into rows (melt operation)\n"
         "- DATE_TRUNC: Groups dates by week (Monday as week start)\n"
         "- PIVOT: Transforms event types back into columns with counts\n\n"
-        "This endpoint is useful for weekly activity dashboards and time-series analysis."
+        "This endpoint is useful for weekly activity dashboards and time-series analysis.\n\n"
+        "Pass `as_of_version` or `as_of_timestamp` to aggregate a historical snapshot of the table "
+        "(time travel). Historical results never change and are cached in memory.\n\n"
+        "Pass `deduplicate=true` to count each group of duplicate leads (same email, phone, LinkedIn "
+        "profile or name and company, detected during ingestion) once."
     ),
     response_description="List of weekly aggregated date event counts",
     responses={
@@ -137,10 +166,31 @@ count_date_by_month = OpenApiDocs(
                 }
             },
         },
+        400: {
+            "description": "Deduplication not available on this table version",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 has no duplicate_group_id column, ingest or replay the table "
+                        "to deduplicate it"
+                    }
+                }
+            },
+        },
         404: {
             "description": "Delta Lake table not found",
             "content": {"application/json": {"example": {"detail": "Delta table 'data_leads' does not exist"}}},
         },
+        410: {
+            "description": "Table version removed by the log cleanup or the vacuum",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 is no longer available: 12 data files were removed by the vacuum"
+                    }
+                }
+            },
+        },
         500: {
             "description": "Internal server error during transformation",
             "content": {
@@ -186,3 +236,387 @@ count_date_by_month = OpenApiDocs(
         ],
     },
 )
+
+
+stage_durations = OpenApiDocs(
+    summary="Stage durations and transition matrix from the lead state history",
+    description=(
+        "Analytics endpoint that reads the SCD2 history table written during ingestion (one row per lead "
+        "and per change of a tracked status field, with `valid_from` / `valid_to`). The process includes:\n\n"
+        "1. **Load**: Reads the history Delta Lake table (optionally as of a version or timestamp)\n"
+        "2. **Sessionise**: Merges consecutive rows with the same value of `field` into stays\n"
+        "3. **Pair**: Links each stay to the next stay of the same lead with a window function\n"
+        "4. **Aggregate**: Computes counts and durations per stage and per transition with GROUPING SETS, "
+        "in a single DuckDB query\n\n"
+        "`stage_durations` only uses completed stays for durations; leads still in a stage are counted in "
+        "`in_stage`. The first stay of a lead starts at its first ingestion, not at its creation in Notion."
+    ),
+    response_description="Per-stage duration statistics and stage-to-stage transition matrix",
+    responses={
+        200: {
+            "description": "Successfully computed stage durations",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "field": "etat",
+                        "stage_durations": [
+                            {
+                                "from_stage": "Contacté",
+                                "transitions": 42,
+                                "in_stage": 17,
+                                "avg_days": 6.4,
+                                "median_days": 4.9,
+                                "p90_days": 14.2,
+                            }
+                        ],
+                        "transitions": [
+                            {
+                                "from_stage": "Contacté",
+                                "to_stage": "Appel booké",
+                                "transitions": 30,
+                                "avg_days": 5.1,
+                                "median_days": 4.0,
+                                "p90_days": 11.8,
+                            }
+                        ],
+                    }
+                }
+            },
+        },
+        404: {
+            "description": "History table or version not found",
+            "content": {"application/json": {"example": {"detail": "Delta table 'data_leads_history' does not exist"}}},
+        },
+        410: {
+            "description": "Table version removed by the log cleanup or the vacuum",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 is no longer available: 12 data files were removed by the vacuum"
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Transformation"],
+        "operationId": "stage_durations_from_history",
+    },
+)
+
+funnel_latency = OpenApiDocs(
+    summary="Latency percentiles between funnel date milestones",
+    description=(
+        "Analytics endpoint that measures how long leads take to go from one date milestone to the next "
+        "in the Leads Delta Lake table. The process includes:\n\n"
+        "1. **Load**: Reads the Delta Lake table (optionally as of a version or timestamp)\n"
+        "2. **Steps**: Builds one step per pair of consecutive `milestones`, plus an end-to-end step from "
+        "the first to the last milestone\n"
+        "3. **Aggregate**: Counts leads that reached each step, how many converted, and the p50/p90 latency "
+        "in days with DuckDB approximate quantiles, in a single query\n\n"
+        "Latencies can be broken down by `priorite`, `departement` and `cohort_month` (month of the first "
+        "milestone) with `group_by`. Milestones must be date columns of the table. A lead whose next "
+        "milestone is dated before the previous one is not counted as converted on that step.\n\n"
+        "Pass `deduplicate=true` to count each group of duplicate leads (same email, phone, LinkedIn "
+        "profile or name and company, detected during ingestion) once."
+    ),
+    response_description="Lead counts, conversion rate and latency percentiles per funnel step",
+    responses={
+        200: {
+            "description": "Successfully computed funnel latencies",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "step": 1,
+                            "from_milestone": "date_prise_contact",
+                            "to_milestone": "date_reponse_prospect",
+                            "priorite": "Haute",
+                            "leads": 120,
+                            "converted": 64,
+                            "conversion_rate": 0.533,
+                            "p50_days": 3,
+                            "p90_days": 11,
+                        }
+                    ]
+                }
+            },
+        },
+        400: {
+            "description": "Invalid milestones, or deduplication not available on this table version",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "At least two milestones among [...] are required, got ['nom']"}
+                }
+            },
+        },
+        404: {
+            "description": "Delta Lake table or version not found",
+            "content": {"application/json": {"example": {"detail": "Delta table 'data_leads' does not exist"}}},
+        },
+        410: {
+            "description": "Table version removed by the log cleanup or the vacuum",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 is no longer available: 12 data files were removed by the vacuum"
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Transformation"],
+        "operationId": "funnel_latency_percentiles",
+    },
+)
+
+assignee_performance = OpenApiDocs(
+    summary="Per-assignee milestone counts and conversion ratios",
+    description=(
+        "Leaderboard endpoint that reads the per-assignee pre-aggregate refreshed at each ingestion "
+        "(leads exploded on `personne_assignee`, date milestones counted per week and per month). "
+        "The process includes:\n\n"
+        "1. **Load**: Reads the pre-aggregate Delta Lake table (optionally as of a version or timestamp)\n"
+        "2. **Filter**: Keeps the rows of the requested `granularity`\n"
+        "3. **Ratios**: Divides the response, proposed call and booked call counts by the first "
+        "contact count of the same period\n\n"
+        "A lead assigned to several people counts for each of them. Ratios compare events of the same "
+        "period, not of the same leads, and are `null` when there was no first contact in the period."
+    ),
+    response_description="Milestone counts and conversion ratios per assignee and period",
+    responses={
+        200: {
+            "description": "Successfully computed assignee performance",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "personne_assignee": "5f3e1b2a-0000-4000-8000-000000000002",
+                            "periode": "2025-10-06",
+                            "date_prise_contact": 12,
+                            "date_reponse_prospect": 7,
+                            "date_appel_propose": 4,
+                            "date_appel_booke": 3,
+                            "date_relance": 2,
+                            "taux_reponse": 0.583,
+                            "taux_appel_propose": 0.333,
+                            "taux_appel_booke": 0.25,
+                        }
+                    ]
+                }
+            },
+        },
+        404: {
+            "description": "Pre-aggregate table or version not found",
+            "content": {
+                "application/json": {"example": {"detail": "Delta table 'data_leads_assignee_stats' does not exist"}}
+            },
+        },
+        410: {
+            "description": "Table version removed by the log cleanup or the vacuum",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 is no longer available: 12 data files were removed by the vacuum"
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Transformation"],
+        "operationId": "assignee_performance",
+    },
+)
+
+batch_aggregations = OpenApiDocs(
+    summary="Evaluate several date event aggregations in one table scan",
+    description=(
+        "Batch endpoint that computes every aggregation of a dashboard in one DuckDB pass and one HTTP "
+        "round trip. The process includes:\n\n"
+        "1. **Load**: Reads the Delta Lake table once (optionally as of a version or timestamp)\n"
+        "2. **Unpivot**: Turns the date columns used by any aggregation into event rows, truncated to "
+        "week and month\n"
+        "3. **Aggregate**: Computes each aggregation as one grouping set of a single GROUP BY GROUPING SETS\n"
+        "4. **Pivot**: Returns each aggregation under its `name`, with one count column per date column, "
+        "like `count_date_by_week` and `count_date_by_month`\n\n"
+        "Each aggregation chooses its `granularity` (`week` or `month`), its `date_cols` and optional "
+        "`group_by` dimensions. Names must be unique within a batch.\n\n"
+        "Pass `deduplicate=true` to count each group of duplicate leads (same email, phone, LinkedIn "
+        "profile or name and company, detected during ingestion) once."
+    ),
+    response_description="Rows of each aggregation, keyed by aggregation name",
+    responses={
+        200: {
+            "description": "Successfully evaluated the batch",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "aggregations": {
+                            "weekly": [
+                                {
+                                    "semaine": "2025-10-06T00:00:00",
+                                    "date_prise_contact": 1,
+                                    "date_appel_booke": 2,
+                                }
+                            ],
+                            "monthly_by_priority": [
+                                {
+                                    "mois": "2025-10-01T00:00:00",
+                                    "priorite": "Haute",
+                                    "date_prise_contact": 4,
+                                    "date_appel_booke": 1,
+                                }
+                            ],
+                        }
+                    }
+                }
+            },
+        },
+        400: {
+            "description": "Deduplication not available on this table version",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 has no duplicate_group_id column, ingest or replay the table "
+                        "to deduplicate it"
+                    }
+                }
+            },
+        },
+        404: {
+            "description": "Delta Lake table or version not found",
+            "content": {"application/json": {"example": {"detail": "Delta table 'data_leads' does not exist"}}},
+        },
+        410: {
+            "description": "Table version removed by the log cleanup or the vacuum",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": "Table version 3 is no longer available: 12 data files were removed by the vacuum"
+                    }
+                }
+            },
+        },
+        422: {
+            "description": "Invalid aggregation specification",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "detail": [{"msg": "Value error, Aggregation names must be unique, duplicated: ['weekly']"}]
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Transformation"],
+        "operationId": "batch_aggregations",
+    },
+)
+
+slow_queries = OpenApiDocs(
+    summary="Latest slow aggregations with their timings and DuckDB profile",
+    description=(
+        "Debug endpoint listing the latest aggregations of this worker that took longer than "
+        "`TRANSFORMATION_SLOW_QUERY_SECONDS`, or that were requested with `profile=true`, most recent first. "
+        "Each entry holds:\n\n"
+        "- **SQL**: The rendered query and the table version it read\n"
+        "- **Timings**: Seconds spent resolving the version (`resolve_seconds`, Delta log), exposing the "
+        "source (`source_seconds`), running the query in DuckDB (`query_seconds`, including GCS reads) and "
+        "converting its rows (`serialization_seconds`)\n"
+        "- **I/O**: The bytes of Parquet files and Delta logs read by DuckDB (`bytes_read`), always measured. "
+        "Historical snapshots and Arrow replicas are read by Arrow and report 0\n"
+        "- **Profile**: With `TRANSFORMATION_PROFILING` or `profile=true` on the aggregation, the CPU time and "
+        "the slowest operators, plus the full DuckDB JSON profile when `include_profile` is set. Timing every "
+        "operator slows the query down, which is why it is opt-in\n\n"
+        "Cached results are not executed, so they never show up unless `profile=true` forces the run. Every "
+        "execution is also traced in Logfire with the same figures."
+    ),
+    response_description="Profiling settings and slow aggregations",
+    responses={
+        200: {
+            "description": "Slow query log of the worker",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "profiling": True,
+                        "threshold_seconds": 1.0,
+                        "slow_queries": [
+                            {
+                                "recorded_at": "2025-10-20T08:14:02.512Z",
+                                "template_name": "count_by_week_form_deltalake.sql",
+                                "delta_table_path": "gs://notion-dataascode/data_leads",
+                                "table_version": 42,
+                                "profile_requested": False,
+                                "sql": "WITH unpivoted_and_weekly AS (...) PIVOT unpivoted_and_weekly ...",
+                                "resolve_seconds": 0.184,
+                                "source_seconds": 0.0,
+                                "query_seconds": 1.342,
+                                "cpu_seconds": 0.612,
+                                "slowest_operators": [
+                                    {"operator": "TABLE_SCAN", "seconds": 0.947, "rows": 120000},
+                                    {"operator": "UNPIVOT", "seconds": 0.201, "rows": 600000},
+                                ],
+                                "serialization_seconds": 0.003,
+                                "bytes_read": 18874368,
+                                "total_seconds": 1.529,
+                            }
+                        ],
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Transformation"],
+        "operationId": "slow_queries",
+    },
+)
+
+delta_tables = OpenApiDocs(
+    summary="Open latencies of the Delta tables cached by this worker",
+    description=(
+        "Debug endpoint reporting how long this worker takes to open each Delta table. Loaded tables are "
+        "kept in a process-wide cache:\n\n"
+        "- **Cold**: The table is loaded from its last checkpoint, written every `DELTA_CHECKPOINT_INTERVAL` "
+        "commits, on first use or to read an older version\n"
+        "- **Warm**: A cached table only applies the commits made since it was last used\n\n"
+        "Each table reports the count, median, 95th percentile and maximum of both kinds of opens, and its "
+        "latest `DELTA_OPEN_LATENCY_SAMPLES` opens with the version loaded, to follow the latency over time."
+    ),
+    response_description="Open latencies per Delta table",
+    responses={
+        200: {
+            "description": "Open latency report of the worker",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "checkpoint_interval": 10,
+                        "tables": [
+                            {
+                                "path_table_deltalake": "gs://notion-dataascode/data_leads",
+                                "cached_tables": 1,
+                                "cold": {"count": 1, "p50_seconds": 0.412, "p95_seconds": 0.412, "max_seconds": 0.412},
+                                "warm": {"count": 57, "p50_seconds": 0.031, "p95_seconds": 0.058, "max_seconds": 0.094},
+                                "samples": [
+                                    {
+                                        "opened_at": "2025-10-20T08:14:02.512Z",
+                                        "mode": "warm",
+                                        "seconds": 0.029,
+                                        "version": 42,
+                                    }
+                                ],
+                            }
+                        ],
+                    }
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "tags": ["Transformation"],
+        "operationId": "delta_table_open_latencies",
+    },
+)
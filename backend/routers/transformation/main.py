@@ -1,22 +1,38 @@
 import os
+from datetime import datetime
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Literal
 
 import duckdb
 import logfire
-from fastapi import APIRouter, Depends, Query
-from jinja2 import Template
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from loguru import logger
 
 from backend.core.config import settings
+from backend.core.delta import DELTA_TABLES
+from backend.core.sql import configure_gcs_access
+from backend.routers.ingestion_leads.model import Granularity, TrackedField
 from backend.routers.transformation import docs
+from backend.routers.transformation.model import DATE_COLS, BatchAggregationRequest
+from backend.routers.transformation.utils import (
+    SLOW_QUERY_LOG,
+    DeduplicationNotAvailableError,
+    TableNotFoundError,
+    TableTimestampNotFoundError,
+    TableVersionExpiredError,
+    TableVersionNotFoundError,
+    run_aggregation,
+    split_batch_result,
+)
 
 logfire.configure(token=os.environ["LOGFIRE_TOKEN"])
 logger.configure(handlers=[logfire.loguru_handler()])
 
 router = APIRouter(prefix="/transformation", tags=["Transformation"])
 
-DATE_COLS = ["date_appel_booke", "date_appel_propose", "date_prise_contact", "date_relance", "date_reponse_prospect"]
+FUNNEL_MILESTONES = ["date_prise_contact", "date_reponse_prospect", "date_appel_propose", "date_appel_booke"]
+FunnelDimension = Literal["priorite", "departement", "cohort_month"]
 
 
 def get_duckdb_connection():
@@ -31,16 +47,7 @@ def get_duckdb_connection():
     conn = duckdb.connect()
 
     try:
-        # Install and load httpfs extension for GCS support
-        conn.execute("INSTALL httpfs;")
-        conn.execute("LOAD httpfs;")
-        conn.execute(f"""
-        CREATE SECRET (
-            TYPE gcs,
-            KEY_ID '{settings.HMAC_KEY}',
-            SECRET '{settings.HMAC_SECRET}'
-        );
-        """)
+        configure_gcs_access(conn)
 
         logger.info("✅ DuckDB connection configured for GCS access")
         yield conn
@@ -51,6 +58,40 @@ def get_duckdb_connection():
 
 
 ConnectionDuckDb = Annotated[duckdb.DuckDBPyConnection, Depends(get_duckdb_connection)]
+AsOfVersion = Annotated[int | None, Query(ge=0, description="Aggregate the table as of this Delta version")]
+AsOfTimestamp = Annotated[
+    datetime | None, Query(description="Aggregate the table as of the last version committed before this time")
+]
+Deduplicate = Annotated[bool, Query(description="Count each group of duplicate leads once")]
+Profile = Annotated[
+    bool, Query(description="Run the query even if cached and keep its DuckDB profile in the slow query log")
+]
+
+
+async def aggregate_or_raise(conn: duckdb.DuckDBPyConnection, template_name: str, **kwargs) -> list[dict]:
+    """Run an aggregation off the event loop and turn table resolution errors into HTTP errors.
+
+    Args:
+        conn: DuckDB connection configured for GCS access.
+        template_name: File name of the SQL template in the request folder.
+        **kwargs: Arguments forwarded to run_aggregation.
+
+    Returns:
+        List of dictionaries, one per row of the aggregation.
+
+    Raises:
+        HTTPException: 404 if the table or version does not exist, 410 if the
+            version was removed by the log cleanup or the vacuum, 400 if
+            deduplication is requested on a version without duplicate groups.
+    """
+    try:
+        return await run_in_threadpool(run_aggregation, conn, template_name, **kwargs)
+    except (TableNotFoundError, TableVersionNotFoundError, TableTimestampNotFoundError) as error:
+        raise HTTPException(status_code=404, detail=str(error)) from error
+    except TableVersionExpiredError as error:
+        raise HTTPException(status_code=410, detail=str(error)) from error
+    except DeduplicationNotAvailableError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
 
 
 @router.get("/count_date_by_week", **docs.count_date_by_week.model_dump())
@@ -59,6 +100,10 @@ async def count_date_by_week(
     delta_table_path: Annotated[
         str | Path, Query(description="Path to the Delta Lake table", example="data_leads")
     ] = settings.GCS_URI,
+    as_of_version: AsOfVersion = None,
+    as_of_timestamp: AsOfTimestamp = None,
+    deduplicate: Deduplicate = False,
+    profile: Profile = False,
     conn: ConnectionDuckDb = None,
 ):
     """Count date events by week from Delta Lake.
@@ -69,6 +114,10 @@ async def count_date_by_week(
     Args:
         date_cols: List of date column names to include in aggregation.
         delta_table_path: Path to the Delta Lake table to query.
+        as_of_version: Delta version to aggregate, defaults to the latest one.
+        as_of_timestamp: Aggregate the last version committed at or before this time.
+        deduplicate: Count each group of duplicate leads once, defaults to False.
+        profile: Run the query even if cached and keep its DuckDB profile in the slow query log, defaults to False.
 
     Returns:
         List of dictionaries with weekly counts per event type.
@@ -76,16 +125,17 @@ async def count_date_by_week(
     logger.info(f"📊 Starting weekly aggregation for columns: {date_cols}")
     logger.info(f"📂 Reading from: {delta_table_path}")
 
-    path_to_folder_request = Path(__file__).parent / "request"
-    path_to_count_by_date = path_to_folder_request / "count_by_week_form_deltalake.sql"
-
-    query_template = path_to_count_by_date.read_text(encoding="utf-8")
-
-    template = Template(query_template)
-    query = template.render(delta_table_path=delta_table_path, date_cols=date_cols)
-
     logger.info("🔍 Executing weekly aggregation query...")
-    weekly_counts_dict = conn.query(query).df().to_dict(orient="records")
+    weekly_counts_dict = await aggregate_or_raise(
+        conn,
+        "count_by_week_form_deltalake.sql",
+        date_cols=date_cols,
+        delta_table_path=delta_table_path,
+        as_of_version=as_of_version,
+        as_of_timestamp=as_of_timestamp,
+        deduplicate=deduplicate,
+        profile=profile,
+    )
     logger.info(f"✅ Weekly aggregation completed: {len(weekly_counts_dict)} weeks returned")
 
     return weekly_counts_dict
@@ -97,6 +147,10 @@ async def count_date_by_month(
     delta_table_path: Annotated[
         str | Path, Query(description="Path to the Delta Lake table", example="data_leads")
     ] = settings.GCS_URI,
+    as_of_version: AsOfVersion = None,
+    as_of_timestamp: AsOfTimestamp = None,
+    deduplicate: Deduplicate = False,
+    profile: Profile = False,
     conn: ConnectionDuckDb = None,
 ):
     """Count date events by month from Delta Lake.
@@ -107,6 +161,10 @@ async def count_date_by_month(
     Args:
         date_cols: List of date column names to include in aggregation.
         delta_table_path: Path to the Delta Lake table to query.
+        as_of_version: Delta version to aggregate, defaults to the latest one.
+        as_of_timestamp: Aggregate the last version committed at or before this time.
+        deduplicate: Count each group of duplicate leads once, defaults to False.
+        profile: Run the query even if cached and keep its DuckDB profile in the slow query log, defaults to False.
 
     Returns:
         List of dictionaries with monthly counts per event type.
@@ -114,16 +172,274 @@ async def count_date_by_month(
     logger.info(f"📊 Starting monthly aggregation for columns: {date_cols}")
     logger.info(f"📂 Reading from: {delta_table_path}")
 
-    path_to_folder_request = Path(__file__).parent / "request"
-    path_to_count_by_date = path_to_folder_request / "count_by_month_form_deltalake.sql"
-
-    query_template = path_to_count_by_date.read_text(encoding="utf-8")
-
-    template = Template(query_template)
-    query = template.render(delta_table_path=delta_table_path, date_cols=DATE_COLS)
-
     logger.info("🔍 Executing monthly aggregation query...")
-    monthly_counts_dict = conn.query(query).df().to_dict(orient="records")
+    monthly_counts_dict = await aggregate_or_raise(
+        conn,
+        "count_by_month_form_deltalake.sql",
+        date_cols=date_cols,
+        delta_table_path=delta_table_path,
+        as_of_version=as_of_version,
+        as_of_timestamp=as_of_timestamp,
+        deduplicate=deduplicate,
+        profile=profile,
+    )
     logger.info(f"✅ Monthly aggregation completed: {len(monthly_counts_dict)} months returned")
 
     return monthly_counts_dict
+
+
+@router.get("/stage_durations", **docs.stage_durations.model_dump())
+async def stage_durations(
+    field: Annotated[TrackedField, Query(description="Tracked status field to analyse")] = "etat",
+    history_table_path: Annotated[
+        str, Query(description="Path to the lead state history Delta Lake table")
+    ] = settings.GCS_HISTORY_URI,
+    as_of_version: AsOfVersion = None,
+    as_of_timestamp: AsOfTimestamp = None,
+    profile: Profile = False,
+    conn: ConnectionDuckDb = None,
+):
+    """Compute time spent in each stage and stage transitions from the history table.
+
+    Consecutive history rows with the same value of `field` are merged into one
+    stay. Each stay is paired with the next one to build the transition matrix,
+    and stays without successor are counted as leads still in the stage.
+
+    Args:
+        field: Tracked status field to analyse.
+        history_table_path: Path to the lead state history Delta Lake table.
+        as_of_version: History table version to read, defaults to the latest one.
+        as_of_timestamp: Read the last history version committed at or before this time.
+        profile: Run the query even if cached and keep its DuckDB profile in the slow query log, defaults to False.
+
+    Returns:
+        Dictionary with per-stage duration statistics and the transition matrix.
+    """
+    logger.info(f"⏱️ Computing stage durations for field: {field}")
+    logger.info(f"📂 Reading from: {history_table_path}")
+
+    rows = await aggregate_or_raise(
+        conn,
+        "stage_durations_from_history.sql",
+        field=field,
+        delta_table_path=history_table_path,
+        as_of_version=as_of_version,
+        as_of_timestamp=as_of_timestamp,
+        profile=profile,
+    )
+
+    stage_stats = [
+        {key: value for key, value in row.items() if key not in ("to_stage", "is_stage_total")}
+        for row in rows
+        if row["is_stage_total"]
+    ]
+    transitions = [
+        {key: row[key] for key in ("from_stage", "to_stage", "transitions", "avg_days", "median_days", "p90_days")}
+        for row in rows
+        if not row["is_stage_total"] and row["transitions"]
+    ]
+    logger.info(f"✅ Stage durations completed: {len(stage_stats)} stages, {len(transitions)} transitions")
+
+    return {"field": field, "stage_durations": stage_stats, "transitions": transitions}
+
+
+@router.get("/funnel_latency", **docs.funnel_latency.model_dump())
+async def funnel_latency(
+    milestones: Annotated[list[str], Query(description="Ordered date milestones of the funnel")] = FUNNEL_MILESTONES,
+    group_by: Annotated[
+        list[FunnelDimension] | None, Query(description="Dimensions to break latencies down by")
+    ] = None,
+    delta_table_path: Annotated[
+        str | Path, Query(description="Path to the Delta Lake table", example="data_leads")
+    ] = settings.GCS_URI,
+    as_of_version: AsOfVersion = None,
+    as_of_timestamp: AsOfTimestamp = None,
+    deduplicate: Deduplicate = False,
+    profile: Profile = False,
+    conn: ConnectionDuckDb = None,
+):
+    """Compute latency percentiles between consecutive funnel milestones.
+
+    Each step goes from one milestone to the next one, plus an end-to-end step
+    from the first to the last milestone. Leads are assigned to the cohort
+    month of their first milestone. A lead converts on a step only if its
+    second milestone is not dated before the first one.
+
+    Args:
+        milestones: Ordered date columns of the funnel, all in DATE_COLS.
+        group_by: Dimensions to break latencies down by, none by default.
+        delta_table_path: Path to the Delta Lake table to query.
+        as_of_version: Delta version to aggregate, defaults to the latest one.
+        as_of_timestamp: Aggregate the last version committed at or before this time.
+        deduplicate: Count each group of duplicate leads once, defaults to False.
+        profile: Run the query even if cached and keep its DuckDB profile in the slow query log, defaults to False.
+
+    Returns:
+        List of dictionaries with lead counts, conversion rate and approximate
+        p50/p90 latencies in days per step and group.
+
+    Raises:
+        HTTPException: 400 if a milestone is not a date column or fewer than two are given.
+    """
+    unknown_milestones = [milestone for milestone in milestones if milestone not in DATE_COLS]
+    if unknown_milestones or len(milestones) < 2:
+        raise HTTPException(
+            status_code=400, detail=f"At least two milestones among {DATE_COLS} are required, got {milestones}"
+        )
+
+    steps = list(zip(milestones, milestones[1:], strict=False))
+    if len(milestones) > 2:
+        steps.append((milestones[0], milestones[-1]))
+
+    logger.info(f"⏳ Computing funnel latencies for {len(steps)} steps grouped by {group_by}")
+    logger.info(f"📂 Reading from: {delta_table_path}")
+
+    latencies = await aggregate_or_raise(
+        conn,
+        "funnel_latency_from_deltalake.sql",
+        milestones=milestones,
+        steps=steps,
+        group_by=list(dict.fromkeys(group_by or [])),
+        delta_table_path=delta_table_path,
+        as_of_version=as_of_version,
+        as_of_timestamp=as_of_timestamp,
+        deduplicate=deduplicate,
+        profile=profile,
+    )
+    logger.info(f"✅ Funnel latencies completed: {len(latencies)} rows returned")
+
+    return latencies
+
+
+@router.get("/assignee_performance", **docs.assignee_performance.model_dump())
+async def assignee_performance(
+    granularity: Annotated[Granularity, Query(description="Period of the counts")] = "week",
+    assignee_stats_table_path: Annotated[
+        str, Query(description="Path to the per-assignee pre-aggregate Delta Lake table")
+    ] = settings.GCS_ASSIGNEE_STATS_URI,
+    as_of_version: AsOfVersion = None,
+    as_of_timestamp: AsOfTimestamp = None,
+    profile: Profile = False,
+    conn: ConnectionDuckDb = None,
+):
+    """Return per-assignee milestone counts and conversion ratios by period.
+
+    Reads the pre-aggregate maintained during ingestion, so the leads table is
+    not exploded on `personne_assignee` at query time.
+
+    Args:
+        granularity: Period of the counts, week or month.
+        assignee_stats_table_path: Path to the per-assignee pre-aggregate Delta Lake table.
+        as_of_version: Pre-aggregate version to read, defaults to the latest one.
+        as_of_timestamp: Read the last pre-aggregate version committed at or before this time.
+        profile: Run the query even if cached and keep its DuckDB profile in the slow query log, defaults to False.
+
+    Returns:
+        List of dictionaries with milestone counts and conversion ratios per assignee and period.
+    """
+    logger.info(f"🏆 Computing {granularity} performance per assignee")
+    logger.info(f"📂 Reading from: {assignee_stats_table_path}")
+
+    performance = await aggregate_or_raise(
+        conn,
+        "assignee_performance_from_deltalake.sql",
+        granularity=granularity,
+        delta_table_path=assignee_stats_table_path,
+        as_of_version=as_of_version,
+        as_of_timestamp=as_of_timestamp,
+        profile=profile,
+    )
+    logger.info(f"✅ Assignee performance completed: {len(performance)} rows returned")
+
+    return performance
+
+
+@router.post("/batch", **docs.batch_aggregations.model_dump())
+async def batch_aggregations(
+    batch: BatchAggregationRequest,
+    delta_table_path: Annotated[
+        str | Path, Query(description="Path to the Delta Lake table", example="data_leads")
+    ] = settings.GCS_URI,
+    as_of_version: AsOfVersion = None,
+    as_of_timestamp: AsOfTimestamp = None,
+    deduplicate: Deduplicate = False,
+    profile: Profile = False,
+    conn: ConnectionDuckDb = None,
+):
+    """Evaluate several date event aggregations in one pass over the table.
+
+    The date columns used by any aggregation are unpivoted once, then every
+    aggregation is computed as one grouping set of a single GROUP BY.
+
+    Args:
+        batch: Aggregations to compute.
+        delta_table_path: Path to the Delta Lake table to query.
+        as_of_version: Delta version to aggregate, defaults to the latest one.
+        as_of_timestamp: Aggregate the last version committed at or before this time.
+        deduplicate: Count each group of duplicate leads once, defaults to False.
+        profile: Run the query even if cached and keep its DuckDB profile in the slow query log, defaults to False.
+
+    Returns:
+        Dictionary mapping each aggregation name to its rows.
+    """
+    aggregations = batch.aggregations
+    date_cols = [col for col in DATE_COLS if any(col in aggregation.date_cols for aggregation in aggregations)]
+    dimensions = list(dict.fromkeys(dimension for aggregation in aggregations for dimension in aggregation.group_by))
+    grouping_columns = ["semaine", "mois", *dimensions, "type_evenement"]
+    grouping_sets = list(dict.fromkeys(aggregation.grouping_set for aggregation in aggregations))
+
+    logger.info(f"📦 Evaluating {len(aggregations)} aggregations in {len(grouping_sets)} grouping sets")
+    logger.info(f"📂 Reading from: {delta_table_path}")
+
+    rows = await aggregate_or_raise(
+        conn,
+        "batch_aggregations_from_deltalake.sql",
+        date_cols=date_cols,
+        dimensions=dimensions,
+        grouping_columns=grouping_columns,
+        grouping_sets=grouping_sets,
+        delta_table_path=delta_table_path,
+        as_of_version=as_of_version,
+        as_of_timestamp=as_of_timestamp,
+        deduplicate=deduplicate,
+        profile=profile,
+    )
+    results = split_batch_result(rows, aggregations, grouping_columns)
+    logger.info(f"✅ Batch aggregation completed: {sum(len(result) for result in results.values())} rows returned")
+
+    return {"aggregations": results}
+
+
+@router.get("/debug/slow_queries", **docs.slow_queries.model_dump())
+async def slow_queries(
+    include_profile: Annotated[bool, Query(description="Include the full DuckDB JSON profile of each query")] = False,
+):
+    """List the latest aggregations of this worker slower than the slow query threshold or profiled on request.
+
+    Args:
+        include_profile: Include the full DuckDB JSON profile, captured with
+            TRANSFORMATION_PROFILING or `profile=true`, of each query.
+
+    Returns:
+        Dictionary with the profiling settings and the slow aggregations, most recent first.
+    """
+    entries = SLOW_QUERY_LOG.entries()
+    if not include_profile:
+        entries = [{key: value for key, value in entry.items() if key != "duckdb_profile"} for entry in entries]
+
+    return {
+        "profiling": settings.TRANSFORMATION_PROFILING,
+        "threshold_seconds": SLOW_QUERY_LOG.threshold_seconds,
+        "slow_queries": entries,
+    }
+
+
+@router.get("/debug/delta_tables", **docs.delta_tables.model_dump())
+async def delta_tables():
+    """Report the open latencies of the Delta tables cached by this worker.
+
+    Returns:
+        Dictionary with the checkpoint interval and, per table, the statistics
+        and latest samples of its cold and warm opens.
+    """
+    return {"checkpoint_interval": settings.DELTA_CHECKPOINT_INTERVAL, "tables": DELTA_TABLES.latency_report()}
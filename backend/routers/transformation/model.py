@@ -0,0 +1,67 @@
+"""Models of the batch aggregation endpoint.
+
+This module defines:
+- The date columns and dimensions an aggregation can use
+- The specification of one aggregation of a batch
+- The batch request, whose aggregations share a single table scan
+"""
+
+from typing import Literal, get_args
+
+from pydantic import BaseModel, Field, model_validator
+
+DateColumn = Literal[
+    "date_appel_booke", "date_appel_propose", "date_prise_contact", "date_relance", "date_reponse_prospect"
+]
+DATE_COLS = list(get_args(DateColumn))
+Dimension = Literal["etat", "priorite", "departement", "reponse_setting", "type_de_setting"]
+
+# Name of the period column for each granularity, as returned by the count endpoints
+PERIOD_COLUMNS = {"week": "semaine", "month": "mois"}
+
+
+class DuplicateAggregationNameError(ValueError):
+    """Raised when two aggregations of a batch share a name."""
+
+    def __init__(self, duplicates: list[str]):
+        super().__init__(f"Aggregation names must be unique, duplicated: {duplicates}")
+
+
+class AggregationSpec(BaseModel):
+    """One aggregation of a batch: date events counted per period.
+
+    Attributes:
+        name: Key of the aggregation in the response.
+        granularity: Period the dates are truncated to.
+        date_cols: Date columns counted, one count column each.
+        group_by: Dimensions the counts are broken down by.
+    """
+
+    name: str = Field(min_length=1, max_length=64)
+    granularity: Literal["week", "month"] = "week"
+    date_cols: list[DateColumn] = Field(default=DATE_COLS, min_length=1)
+    group_by: list[Dimension] = []
+
+    @property
+    def grouping_set(self) -> tuple[str, ...]:
+        """Columns the aggregation groups the unpivoted events by."""
+        return (PERIOD_COLUMNS[self.granularity], *dict.fromkeys(self.group_by), "type_evenement")
+
+
+class BatchAggregationRequest(BaseModel):
+    """Aggregations evaluated together in one pass over the table.
+
+    Attributes:
+        aggregations: Aggregations to compute, with unique names.
+    """
+
+    aggregations: list[AggregationSpec] = Field(min_length=1, max_length=20)
+
+    @model_validator(mode="after")
+    def unique_names(self) -> "BatchAggregationRequest":
+        """Reject batches where two aggregations share a name."""
+        names = [aggregation.name for aggregation in self.aggregations]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise DuplicateAggregationNameError(duplicates)
+        return self
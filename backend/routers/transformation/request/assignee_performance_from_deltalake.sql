@@ -0,0 +1,14 @@
+SELECT
+  personne_assignee,
+  periode,
+  date_prise_contact,
+  date_reponse_prospect,
+  date_appel_propose,
+  date_appel_booke,
+  date_relance,
+  date_reponse_prospect / NULLIF(date_prise_contact, 0) AS taux_reponse,
+  date_appel_propose / NULLIF(date_prise_contact, 0) AS taux_appel_propose,
+  date_appel_booke / NULLIF(date_prise_contact, 0) AS taux_appel_booke
+FROM {{ source }}
+WHERE granularite = '{{ granularity }}'
+ORDER BY periode DESC, date_appel_booke DESC, personne_assignee;
@@ -0,0 +1,27 @@
+WITH events AS (
+  SELECT
+    {% for dimension in dimensions %}{{ dimension }},
+    {% endfor %}type_evenement,
+    DATE_TRUNC('week', date) AS semaine,
+    DATE_TRUNC('month', date) AS mois
+  FROM (
+    UNPIVOT {{ source }}
+    ON {% for col in date_cols %}{{ col }}{% if not loop.last %},
+           {% endif %}{% endfor %}
+    INTO
+    NAME type_evenement
+    VALUE date
+  )
+  WHERE date IS NOT NULL
+)
+
+SELECT
+  GROUPING({{ grouping_columns | join(', ') }}) AS grouping_id,
+  {% for column in grouping_columns %}{{ column }},
+  {% endfor %}COUNT(*) AS total
+FROM events
+GROUP BY GROUPING SETS (
+  {% for grouping_set in grouping_sets %}({{ grouping_set | join(', ') }}){% if not loop.last %},
+  {% endif %}{% endfor %}
+)
+ORDER BY ALL;
@@ -4,7 +4,7 @@ WITH unpivoted_and_weekly AS (
     type_evenement,
     date
   FROM (
-    UNPIVOT DELTA_SCAN('{{ delta_table_path }}')
+    UNPIVOT {{ source }}
     ON {% for col in date_cols %}{{ col }}{% if not loop.last %},
            {% endif %}{% endfor %}
     INTO
@@ -0,0 +1,5 @@
+(
+  SELECT *
+  FROM {{ source }}
+  QUALIFY ROW_NUMBER() OVER (PARTITION BY COALESCE(duplicate_group_id, id) ORDER BY id) = 1
+)
@@ -0,0 +1,39 @@
+WITH leads AS (
+  SELECT
+    priorite,
+    departement,
+    DATE_TRUNC('month', {{ milestones[0] }}) AS cohort_month,
+    {{ milestones | join(', ') }}
+  FROM {{ source }}
+  WHERE {{ milestones[0] }} IS NOT NULL
+),
+
+steps AS (
+  {% for from_milestone, to_milestone in steps %}
+  SELECT
+    {{ loop.index }} AS step,
+    '{{ from_milestone }}' AS from_milestone,
+    '{{ to_milestone }}' AS to_milestone,
+    {% for dimension in group_by %}{{ dimension }},
+    {% endfor %}{{ from_milestone }} IS NOT NULL AS reached,
+    CASE
+      WHEN {{ to_milestone }} >= {{ from_milestone }} THEN DATE_DIFF('day', {{ from_milestone }}, {{ to_milestone }})
+    END AS latency_days
+  FROM leads
+  {% if not loop.last %}UNION ALL{% endif %}
+  {% endfor %}
+)
+
+SELECT
+  step,
+  from_milestone,
+  to_milestone,
+  {% for dimension in group_by %}{{ dimension }},
+  {% endfor %}COUNT(*) FILTER (WHERE reached) AS leads,
+  COUNT(latency_days) AS converted,
+  COUNT(latency_days) / NULLIF(COUNT(*) FILTER (WHERE reached), 0) AS conversion_rate,
+  APPROX_QUANTILE(latency_days, 0.5) AS p50_days,
+  APPROX_QUANTILE(latency_days, 0.9) AS p90_days
+FROM steps
+GROUP BY ALL
+ORDER BY step{% for dimension in group_by %}, {{ dimension }} NULLS LAST{% endfor %};
@@ -0,0 +1,55 @@
+WITH field_history AS (
+  SELECT
+    id,
+    {{ field }} AS stage,
+    valid_from,
+    COALESCE(valid_to, NOW()) AS valid_to,
+    is_current,
+    LAG({{ field }}) OVER (PARTITION BY id ORDER BY valid_from) IS DISTINCT FROM {{ field }}
+    OR ROW_NUMBER() OVER (PARTITION BY id ORDER BY valid_from) = 1 AS is_new_stage
+  FROM {{ source }}
+),
+
+stage_stays AS (
+  SELECT
+    id,
+    stage,
+    valid_from,
+    valid_to,
+    is_current,
+    SUM(CAST(is_new_stage AS INTEGER)) OVER (PARTITION BY id ORDER BY valid_from) AS stay_number
+  FROM field_history
+),
+
+stays AS (
+  SELECT
+    id,
+    stay_number,
+    ANY_VALUE(stage) AS stage,
+    MIN(valid_from) AS entered_at,
+    MAX(valid_to) AS left_at
+  FROM stage_stays
+  GROUP BY id, stay_number
+),
+
+transitions AS (
+  SELECT
+    stage AS from_stage,
+    LEAD(stage) OVER (PARTITION BY id ORDER BY stay_number) AS to_stage,
+    LEAD(stay_number) OVER (PARTITION BY id ORDER BY stay_number) IS NULL AS is_open,
+    EPOCH(left_at - entered_at) / 86400 AS duration_days
+  FROM stays
+)
+
+SELECT
+  from_stage,
+  to_stage,
+  GROUPING(to_stage) = 1 AS is_stage_total,
+  COUNT(*) FILTER (WHERE NOT is_open) AS transitions,
+  COUNT(*) FILTER (WHERE is_open) AS in_stage,
+  AVG(duration_days) FILTER (WHERE NOT is_open) AS avg_days,
+  MEDIAN(duration_days) FILTER (WHERE NOT is_open) AS median_days,
+  QUANTILE_CONT(duration_days, 0.9) FILTER (WHERE NOT is_open) AS p90_days
+FROM transitions
+GROUP BY GROUPING SETS ((from_stage), (from_stage, to_stage))
+ORDER BY from_stage NULLS FIRST, is_stage_total DESC, to_stage NULLS FIRST;
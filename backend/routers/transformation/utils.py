@@ -0,0 +1,603 @@
+"""Query helpers shared by the transformation endpoints.
+
+Aggregations read either the latest state of the Delta table through
+DELTA_SCAN (or its local replica when enabled), or a historical snapshot
+resolved from a version or a timestamp.
+A table version never changes once committed, so results are kept in a
+process-wide LRU cache keyed by query and table version, which can be warmed
+up right after an ingestion. Identical queries running at the same time share
+a single execution.
+Every execution is traced in Logfire with the time spent resolving the table
+version, exposing the source, running the query and serialising its rows, and
+the slowest ones are kept in a slow query log. With TRANSFORMATION_PROFILING,
+the DuckDB profile of the query (operators, bytes read) is captured as well.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+import logfire
+from deltalake.exceptions import DeltaError
+from loguru import logger
+
+from backend.core.config import settings
+from backend.core.delta import (
+    DELTA_TABLES,
+    get_missing_snapshot_files,
+    get_snapshot_dataset,
+    get_table_columns,
+    get_table_version,
+)
+from backend.core.replica import LOCAL_REPLICAS, LocalReplica
+from backend.core.sql import render_query
+from backend.routers.transformation.model import DATE_COLS
+
+PATH_TO_FOLDER_REQUEST = Path(__file__).parent / "request"
+
+# Aggregations loaded by the dashboard, with the parameters the endpoints use by default
+STANDARD_AGGREGATIONS = {
+    "count_date_by_week": ("count_by_week_form_deltalake.sql", {"date_cols": DATE_COLS}),
+    "count_date_by_month": ("count_by_month_form_deltalake.sql", {"date_cols": DATE_COLS}),
+}
+
+
+class TableNotFoundError(Exception):
+    """Raised when the Delta table does not exist."""
+
+    def __init__(self, path_table_deltalake: str):
+        super().__init__(f"Delta table '{path_table_deltalake}' does not exist")
+
+
+class TableVersionNotFoundError(ValueError):
+    """Raised when the requested table version has not been committed yet."""
+
+    def __init__(self, version: int, latest_version: int):
+        super().__init__(f"Table version {version} does not exist, latest version is {latest_version}")
+
+
+class TableTimestampNotFoundError(ValueError):
+    """Raised when no table version was committed at or before the requested time."""
+
+    def __init__(self, as_of_timestamp: datetime, first_committed_at: datetime):
+        super().__init__(
+            f"No table version was committed at or before {as_of_timestamp.isoformat()}, "
+            f"the first one was committed at {first_committed_at.isoformat()}"
+        )
+
+
+class TableVersionExpiredError(Exception):
+    """Raised when the requested table version was removed by the log cleanup or the vacuum."""
+
+    def __init__(self, version: int | datetime, error: Exception | None = None):
+        requested_version = f"as of {version.isoformat()}" if isinstance(version, datetime) else version
+        reason = error or "its commit was removed from the transaction log"
+        super().__init__(f"Table version {requested_version} is no longer available: {reason}")
+
+
+class DeduplicationNotAvailableError(ValueError):
+    """Raised when deduplication is requested on a table version written before duplicate groups existed."""
+
+    def __init__(self, version: int):
+        super().__init__(
+            f"Table version {version} has no duplicate_group_id column, ingest or replay the table to deduplicate it"
+        )
+
+
+class QueryResultCache:
+    """Thread-safe LRU cache of query results.
+
+    Only results computed on an immutable table version must be stored, so
+    entries never expire and are only evicted when the cache is full.
+
+    Attributes:
+        max_entries: Maximum number of results kept in memory.
+    """
+
+    def __init__(self, max_entries: int = settings.TRANSFORMATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._results: OrderedDict[Hashable, list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> list[dict] | None:
+        """Return the cached result for a key, or None on a miss."""
+        with self._lock:
+            if key not in self._results:
+                return None
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def set(self, key: Hashable, result: list[dict]) -> None:
+        """Store a result, evicting the least recently used one if full."""
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+
+RESULT_CACHE = QueryResultCache()
+
+
+class SingleFlight:
+    """Share one execution between identical calls running at the same time.
+
+    The first caller of a key runs the function, callers arriving while it is
+    in flight wait for its result (or its exception) instead of running it
+    again. Nothing is kept once the call completes.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, function: Callable[[], list[dict]]) -> list[dict]:
+        """Run a function, or wait for the in-flight call with the same key.
+
+        Args:
+            key: Identity of the call, identical calls must have equal keys.
+            function: Function computing the result.
+
+        Returns:
+            The result of the function, shared by all callers of the key.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            logger.info("🤝 Joining identical in-flight query")
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+class SlowQueryLog:
+    """Thread-safe log of the latest aggregations slower than a threshold.
+
+    Attributes:
+        threshold_seconds: Minimum total duration of a logged aggregation.
+    """
+
+    def __init__(
+        self,
+        threshold_seconds: float = settings.TRANSFORMATION_SLOW_QUERY_SECONDS,
+        max_entries: int = settings.TRANSFORMATION_SLOW_QUERY_LOG_SIZE,
+    ):
+        self.threshold_seconds = threshold_seconds
+        self._entries: deque[dict] = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, entry: dict, always: bool = False) -> None:
+        """Keep an aggregation run if it took longer than the threshold.
+
+        Args:
+            entry: Description of the run, with at least `template_name`,
+                `table_version` and `total_seconds`.
+            always: Keep the run whatever its duration, for runs profiled on request.
+                Defaults to False.
+        """
+        is_slow = entry["total_seconds"] >= self.threshold_seconds
+        if not (is_slow or always):
+            return
+
+        if is_slow:
+            logger.warning(
+                f"🐢 Slow aggregation {entry['template_name']} on version {entry['table_version']}: "
+                f"{entry['total_seconds']:.2f}s"
+            )
+        with self._lock:
+            self._entries.appendleft(entry)
+
+    def entries(self) -> list[dict]:
+        """Return the logged runs, most recent first."""
+        with self._lock:
+            return list(self._entries)
+
+
+SLOW_QUERY_LOG = SlowQueryLog()
+
+
+def resolve_table_version(
+    delta_table_path: str, as_of_version: int | None = None, as_of_timestamp: datetime | None = None
+) -> int:
+    """Resolve the table version to read for a time-travel query.
+
+    A timestamp is resolved from the commit times of the history of the
+    table, naive timestamps being read as UTC. The resolved version is then
+    loaded, which fails once its commit has been removed from the transaction
+    log after settings.DELTA_VACUUM_RETENTION_HOURS.
+
+    Args:
+        delta_table_path: URI or path to the Delta table.
+        as_of_version: Explicit table version.
+        as_of_timestamp: Read the last version committed at or before this time.
+
+    Returns:
+        The table version to read.
+
+    Raises:
+        TableNotFoundError: If the Delta table does not exist.
+        TableVersionNotFoundError: If the version is newer than the latest one.
+        TableTimestampNotFoundError: If the timestamp is older than the first commit.
+        TableVersionExpiredError: If the version is no longer in the transaction log.
+    """
+    latest_version = get_table_version(delta_table_path)
+    if latest_version is None:
+        raise TableNotFoundError(delta_table_path)
+
+    if as_of_version is None:
+        if as_of_timestamp.tzinfo is None:
+            as_of_timestamp = as_of_timestamp.replace(tzinfo=timezone.utc)
+        with DELTA_TABLES.open(delta_table_path) as dt:
+            commits = dt.history()
+
+        as_of_milliseconds = as_of_timestamp.timestamp() * 1000
+        committed_before = [commit["version"] for commit in commits if commit["timestamp"] <= as_of_milliseconds]
+        if not committed_before:
+            first_commit = min(commits, key=lambda commit: commit["version"])
+            if first_commit["version"] > 0:
+                raise TableVersionExpiredError(as_of_timestamp)
+            raise TableTimestampNotFoundError(
+                as_of_timestamp, datetime.fromtimestamp(first_commit["timestamp"] / 1000, tz=timezone.utc)
+            )
+        as_of_version = max(committed_before)
+    elif as_of_version > latest_version:
+        raise TableVersionNotFoundError(as_of_version, latest_version)
+
+    try:
+        with DELTA_TABLES.open(delta_table_path, version=as_of_version) as dt:
+            return dt.version()
+    except DeltaError as error:
+        raise TableVersionExpiredError(as_of_version, error) from error
+
+
+def summarise_profile(duckdb_profile: dict, max_operators: int = 5) -> dict:
+    """Extract the figures of a DuckDB JSON profile that explain where the time goes.
+
+    Args:
+        duckdb_profile: Profile returned by DuckDB for one query.
+        max_operators: Number of operators listed. Defaults to 5.
+
+    Returns:
+        CPU time and the slowest operators with their duration and output rows.
+    """
+    operators = []
+    pending = list(duckdb_profile.get("children", []))
+    while pending:
+        operator = pending.pop()
+        pending.extend(operator.get("children", []))
+        operators.append({
+            "operator": operator.get("operator_type"),
+            "seconds": operator.get("operator_timing", 0.0),
+            "rows": operator.get("operator_cardinality"),
+        })
+
+    return {
+        "cpu_seconds": duckdb_profile.get("cpu_time"),
+        "slowest_operators": sorted(operators, key=lambda operator: operator["seconds"], reverse=True)[:max_operators],
+    }
+
+
+def fetch_records(
+    conn: duckdb.DuckDBPyConnection, query: str, profiling: bool = settings.TRANSFORMATION_PROFILING
+) -> tuple[list[dict], dict]:
+    """Run a query and return its rows as JSON-serialisable dictionaries, with its timings.
+
+    The query runs to a materialised result before its rows are converted, so
+    the time spent in DuckDB and the serialisation time are measured apart.
+
+    The bytes read are always measured, from the DuckDB file system log, which
+    records every read of a Parquet file or Delta log whether it is local or
+    on GCS. DuckDB does not read Arrow datasets, so historical snapshots and
+    Arrow replicas report no bytes. The full profile times every operator and
+    is only captured with `profiling`.
+
+    Args:
+        conn: DuckDB connection, dedicated to the request so that its log only holds this query.
+        query: SQL query to run.
+        profiling: Capture the DuckDB profile of the query.
+            Defaults to settings.TRANSFORMATION_PROFILING.
+
+    Returns:
+        List of dictionaries, NULL values (NaN in pandas) being mapped to None,
+        and the `query_seconds`, `serialization_seconds` and `bytes_read` of the
+        run, plus the summarise_profile figures and the full `duckdb_profile`
+        with profiling.
+    """
+    conn.execute("CALL truncate_duckdb_logs()")
+    conn.execute("CALL enable_logging('FileSystem')")
+    if profiling:
+        conn.execute("SET enable_profiling = 'no_output'")
+
+    try:
+        started_at = time.perf_counter()
+        result = conn.execute(query)
+        query_stats = {"query_seconds": time.perf_counter() - started_at}
+
+        if profiling:
+            duckdb_profile = json.loads(conn.get_profiling_information(format="json"))
+            query_stats |= {**summarise_profile(duckdb_profile), "duckdb_profile": duckdb_profile}
+
+        started_at = time.perf_counter()
+        records = result.df()
+        records = records.astype(object).where(records.notna(), None).to_dict(orient="records")
+        query_stats["serialization_seconds"] = time.perf_counter() - started_at
+    finally:
+        conn.execute("CALL disable_logging()")
+        if profiling:
+            conn.disable_profiling()
+
+    query_stats["bytes_read"] = conn.execute(
+        "SELECT COALESCE(SUM(bytes), 0) FROM duckdb_logs_parsed('FileSystem') WHERE op = 'READ'"
+    ).fetchone()[0]
+    conn.execute("CALL truncate_duckdb_logs()")
+
+    return records, query_stats
+
+
+def freeze_parameters(template_params: dict) -> tuple:
+    """Turn template parameters into a hashable, order-independent cache key part.
+
+    Args:
+        template_params: Variables passed to the SQL template.
+
+    Returns:
+        Sorted tuple of (name, value) pairs, lists being converted to tuples.
+    """
+    return tuple(
+        sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in template_params.items())
+    )
+
+
+def resolve_latest_source(
+    delta_table_path: str, local_replicas: dict[str, LocalReplica] = LOCAL_REPLICAS
+) -> tuple[int, Callable[[duckdb.DuckDBPyConnection], str], bool]:
+    """Resolve the version and the source of a query on the latest table state.
+
+    Args:
+        delta_table_path: URI or path to the Delta table.
+        local_replicas: Local replicas by table path. Defaults to LOCAL_REPLICAS.
+
+    Returns:
+        The latest version, a function exposing the source in a DuckDB connection
+        and returning the SQL expression to select from, and whether the source
+        is pinned to that version (a local replica) or not (DELTA_SCAN).
+
+    Raises:
+        TableNotFoundError: If the Delta table does not exist.
+    """
+    if delta_table_path in local_replicas:
+        replica_snapshot = local_replicas[delta_table_path].ensure_fresh()
+        if replica_snapshot is None:
+            raise TableNotFoundError(delta_table_path)
+        return replica_snapshot.version, replica_snapshot.register, True
+
+    latest_version = get_table_version(delta_table_path)
+    if latest_version is None:
+        raise TableNotFoundError(delta_table_path)
+    return latest_version, lambda conn: f"DELTA_SCAN('{delta_table_path}')", False
+
+
+def run_aggregation(
+    conn: duckdb.DuckDBPyConnection,
+    template_name: str,
+    delta_table_path: str | Path,
+    as_of_version: int | None = None,
+    as_of_timestamp: datetime | None = None,
+    result_cache: QueryResultCache = RESULT_CACHE,
+    single_flight: SingleFlight = SINGLE_FLIGHT,
+    local_replicas: dict[str, LocalReplica] = LOCAL_REPLICAS,
+    slow_query_log: SlowQueryLog = SLOW_QUERY_LOG,
+    deduplicate: bool = False,
+    profile: bool = False,
+    **template_params,
+) -> list[dict]:
+    """Run an aggregation template on the latest or a historical table version.
+
+    Without `as_of_version` nor `as_of_timestamp`, the query reads the latest
+    state through DELTA_SCAN, or from the local replica of the table if there is
+    one. Otherwise the snapshot of the resolved version is registered in DuckDB
+    as an Arrow dataset. Either way the result is cached for the table version
+    it was computed on.
+
+    With `deduplicate`, the template reads a single lead per duplicate group,
+    the one with the smallest id among the leads of the group present in the
+    table version, so a group whose first lead is missing is still counted.
+    Versions written before that column existed cannot be deduplicated.
+
+    Concurrent calls with the same template, parameters and table version
+    (the latest one for DELTA_SCAN reads) share a single query execution.
+    Each execution is traced in Logfire and recorded in the slow query log if
+    it exceeds its threshold. With `profile`, the query runs even if its result
+    is cached and is recorded with its full DuckDB profile whatever its duration.
+
+    Args:
+        conn: DuckDB connection configured for GCS access.
+        template_name: File name of the SQL template in the request folder.
+        delta_table_path: Path to the Delta Lake table to query.
+        as_of_version: Table version to read.
+        as_of_timestamp: Read the last version committed at or before this time.
+        result_cache: Cache of results per table version. Defaults to RESULT_CACHE.
+        single_flight: Coalescer of identical in-flight queries. Defaults to SINGLE_FLIGHT.
+        local_replicas: Local replicas by table path. Defaults to LOCAL_REPLICAS.
+        slow_query_log: Log of the slowest executions. Defaults to SLOW_QUERY_LOG.
+        deduplicate: Count each group of duplicate leads once. Defaults to False.
+        profile: Run the query and keep it in the slow query log with its DuckDB profile. Defaults to False.
+        **template_params: Other variables passed to the SQL template (e.g. date_cols).
+
+    Returns:
+        List of dictionaries, one per row of the aggregation.
+
+    Raises:
+        TableNotFoundError: If the Delta table does not exist.
+        TableVersionNotFoundError: If the version is newer than the latest one.
+        TableTimestampNotFoundError: If the timestamp is older than the first commit.
+        TableVersionExpiredError: If the log or the data files of the version were removed.
+        DeduplicationNotAvailableError: If `deduplicate` is set and the version has no duplicate groups.
+    """
+    delta_table_path = str(delta_table_path)
+    started_at = time.perf_counter()
+
+    reads_snapshot = as_of_version is not None or as_of_timestamp is not None
+    if not reads_snapshot:
+        version, register_source, is_pinned = resolve_latest_source(delta_table_path, local_replicas)
+    else:
+        version = resolve_table_version(delta_table_path, as_of_version, as_of_timestamp)
+        is_pinned = True
+
+        def register_source(conn: duckdb.DuckDBPyConnection) -> str:
+            logger.info(f"🕰️ Reading snapshot of version {version}")
+            conn.register("delta_snapshot", get_snapshot_dataset(delta_table_path, version))
+            return "delta_snapshot"
+
+    cache_key = (template_name, delta_table_path, version, deduplicate, freeze_parameters(template_params))
+    cached_result = None if profile else result_cache.get(cache_key)
+    if cached_result is not None:
+        logger.info(f"⚡ Serving {template_name} for version {version} from cache")
+        return cached_result
+
+    if deduplicate and "duplicate_group_id" not in get_table_columns(delta_table_path, version):
+        raise DeduplicationNotAvailableError(version)
+
+    def run_query() -> list[dict]:
+        with logfire.span("aggregate {template_name}", template_name=template_name, table_version=version) as span:
+            source_started_at = time.perf_counter()
+            source = register_source(conn)
+            if deduplicate:
+                source = render_query(PATH_TO_FOLDER_REQUEST, "deduplicated_leads.sql", source=source)
+            query = render_query(PATH_TO_FOLDER_REQUEST, template_name, source=source, **template_params)
+            query_stats = {
+                "resolve_seconds": source_started_at - started_at,
+                "source_seconds": time.perf_counter() - source_started_at,
+            }
+
+            try:
+                result, execution_stats = fetch_records(
+                    conn, query, profiling=profile or settings.TRANSFORMATION_PROFILING
+                )
+            except duckdb.Error as error:
+                if reads_snapshot and get_missing_snapshot_files(delta_table_path, version):
+                    raise TableVersionExpiredError(version, error) from error
+                raise
+            query_stats |= execution_stats
+            query_stats["total_seconds"] = time.perf_counter() - started_at
+            span.set_attributes({name: value for name, value in query_stats.items() if name != "duckdb_profile"})
+
+        slow_query_log.record(
+            {
+                "recorded_at": datetime.now(timezone.utc),
+                "template_name": template_name,
+                "delta_table_path": delta_table_path,
+                "table_version": version,
+                "profile_requested": profile,
+                "sql": query,
+                **query_stats,
+            },
+            always=profile,
+        )
+        # DELTA_SCAN cannot be pinned to a version: only cache when no commit happened meanwhile
+        if is_pinned or get_table_version(delta_table_path) == version:
+            result_cache.set(cache_key, result)
+        return result
+
+    return run_query() if profile else single_flight.run(cache_key, run_query)
+
+
+def grouping_id(grouping_columns: list[str], grouping_set: tuple[str, ...]) -> int:
+    """Compute the value of DuckDB GROUPING() for the rows of a grouping set.
+
+    Args:
+        grouping_columns: Columns passed to GROUPING(), in order.
+        grouping_set: Columns of the grouping set.
+
+    Returns:
+        Bitmask with a bit set, from the most significant one, for each
+        column not grouped by.
+    """
+    return sum(
+        1 << (len(grouping_columns) - 1 - position)
+        for position, column in enumerate(grouping_columns)
+        if column not in grouping_set
+    )
+
+
+def split_batch_result(rows: list[dict], aggregations: list, grouping_columns: list[str]) -> dict[str, list[dict]]:
+    """Split the rows of a batch query into one pivoted result per aggregation.
+
+    Args:
+        rows: Rows of the batch query, one per grouping set, group and event type.
+        aggregations: Aggregation specifications of the batch.
+        grouping_columns: Columns passed to GROUPING() in the batch query.
+
+    Returns:
+        Mapping of aggregation name to its rows, with one count column per
+        date column as returned by the count endpoints.
+    """
+    results = {}
+    for aggregation in aggregations:
+        group_columns = aggregation.grouping_set[:-1]
+        expected_grouping_id = grouping_id(grouping_columns, aggregation.grouping_set)
+
+        groups: dict[tuple, dict] = {}
+        for row in rows:
+            if row["grouping_id"] != expected_grouping_id or row["type_evenement"] not in aggregation.date_cols:
+                continue
+            key = tuple(row[column] for column in group_columns)
+            group = groups.setdefault(
+                key, {**dict(zip(group_columns, key, strict=True)), **dict.fromkeys(aggregation.date_cols, 0)}
+            )
+            group[row["type_evenement"]] = row["total"]
+
+        results[aggregation.name] = list(groups.values())
+
+    return results
+
+
+def warm_up_cache(
+    delta_table_path: str, version: int, aggregations: dict = STANDARD_AGGREGATIONS
+) -> dict[str, list[dict]]:
+    """Precompute the standard aggregations of a freshly committed table version.
+
+    Results are stored in the result cache under the same keys as the
+    endpoints use, so the first dashboard viewer of the version hits the cache.
+
+    Args:
+        delta_table_path: URI or path to the Delta table just written.
+        version: Table version to warm up.
+        aggregations: Mapping of aggregation name to its template and parameters.
+            Defaults to STANDARD_AGGREGATIONS.
+
+    Returns:
+        Mapping of aggregation name to its rows.
+    """
+    conn = duckdb.connect()
+    try:
+        return {
+            name: run_aggregation(conn, template_name, delta_table_path, as_of_version=version, **template_params)
+            for name, (template_name, template_params) in aggregations.items()
+        }
+    finally:
+        conn.close()
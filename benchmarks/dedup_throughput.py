@@ -0,0 +1,73 @@
+"""Measure the duplicate lead detection time per 100 000 leads.
+
+Synthetic leads are generated with one lead in twenty duplicating an earlier
+one, through its email, phone, LinkedIn profile or name and company written
+differently. Since candidate pairs come from a hash index on the blocking keys,
+the time per 100 000 leads stays flat as the number of leads grows.
+
+Usage:
+    uv run python -m benchmarks.dedup_throughput
+    uv run python -m benchmarks.dedup_throughput --leads 100000 1000000
+
+The settings are read from the environment like the API (.env file).
+"""
+
+import argparse
+import time
+
+import polars as pl
+
+from backend.routers.ingestion_leads import model
+from backend.routers.ingestion_leads.utils import find_duplicate_groups
+
+
+def generate_leads(n_leads: int) -> pl.DataFrame:
+    """Generate synthetic leads with the columns used by the duplicate detection.
+
+    Args:
+        n_leads: Number of leads to generate.
+
+    Returns:
+        DataFrame with the `id` column and the columns of model.DEDUP_FIELDS.
+    """
+    leads = pl.DataFrame({"lead": range(n_leads)}).with_columns(
+        # Every 20th lead copies the person of the lead 7 rows earlier
+        pl.when(pl.col("lead") % 20 == 19).then(pl.col("lead") - 7).otherwise(pl.col("lead")).alias("person")
+    )
+    variant = pl.col("lead") % 4
+    person = pl.col("person").cast(pl.Utf8)
+
+    return leads.select(
+        pl.format("lead-{}", pl.col("lead").cast(pl.Utf8).str.zfill(9)).alias("id"),
+        pl.when(variant == 0).then(pl.format(" Contact.{}@Example.FR", person)).alias("email_pro"),
+        pl.when(variant == 1)
+        .then(pl.format("+33 6 {}", person.str.zfill(8)))
+        .otherwise(pl.format("06{}", person.str.zfill(8)))
+        .alias("telephone"),
+        pl.when(variant == 2).then(pl.format("https://www.linkedin.com/in/profil-{}/", person)).alias("url_linkedin"),
+        pl.format("Nom{}", person).alias("nom"),
+        pl.when(variant == 3).then(pl.lit("Élodie")).otherwise(pl.lit("elodie")).alias("prenom"),
+        pl.format("Entreprise {} SAS", person).alias("nom_entreprise"),
+    ).select("id", *model.DEDUP_FIELDS)
+
+
+def main() -> None:
+    """Detect duplicates in synthetic leads of several sizes and print the timings."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, nargs="+", default=[100_000, 500_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("leads\tduplicate_leads\tseconds\tseconds_per_100k")
+    for n_leads in args.leads:
+        leads = generate_leads(n_leads)
+
+        started_at = time.perf_counter()
+        duplicate_groups = find_duplicate_groups(leads)
+        duration = time.perf_counter() - started_at
+
+        duplicate_leads = duplicate_groups.filter(pl.col("duplicate_group_id").is_duplicated()).height
+        print(f"{n_leads}\t{duplicate_leads}\t{duration:.2f}\t{duration * 100_000 / n_leads:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare the open latency of a Delta table as commits pile up.
+
+A table receives small appends, like frequent ingestions do. After every
+batch of commits, the latest version is opened three ways: cold without
+checkpoints, which replays every commit of the log, cold with a checkpoint
+every `DELTA_CHECKPOINT_INTERVAL` commits, which replays at most that many,
+and warm through a DeltaTableCache after one more commit, which only applies
+that commit. Each log file read is a request on GCS, so the gaps widen
+there compared to a local disk.
+
+Usage:
+    uv run python -m benchmarks.delta_open_latency
+    uv run python -m benchmarks.delta_open_latency --commits 2000 --step 500
+
+The settings are read from the environment like the API (.env file).
+"""
+
+import argparse
+import tempfile
+import time
+
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+
+from backend.core.config import settings
+from backend.core.delta import DeltaTableCache
+
+
+def timed_cold_open(path_table_deltalake: str, repeat: int = 3) -> float:
+    """Return the best duration of opening a Delta table from storage."""
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        DeltaTable(path_table_deltalake)
+        durations.append(time.perf_counter() - started_at)
+    return min(durations)
+
+
+def main() -> None:
+    """Append to two tables, with and without checkpoints, and print the open latencies."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=1000)
+    parser.add_argument("--step", type=int, default=250)
+    args = parser.parse_args()
+
+    batch = pa.table({"id": pa.array(["lead-000000001"]), "budget": pa.array([1.0])})
+    table_cache = DeltaTableCache()
+
+    print("commits\tcold_no_checkpoint_s\tcold_checkpoint_s\twarm_s")
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as directory:
+        path_plain, path_checkpointed = f"{directory}/plain", f"{directory}/checkpointed"
+        # delta-rs checkpoints every 100 commits when the property is not set
+        write_deltalake(path_plain, batch, configuration={"delta.checkpointInterval": str(2**31 - 1)})
+        write_deltalake(
+            path_checkpointed,
+            batch,
+            configuration={"delta.checkpointInterval": str(settings.DELTA_CHECKPOINT_INTERVAL)},
+        )
+        with table_cache.open(path_checkpointed):
+            pass
+
+        for commits in range(args.step, args.commits + 1, args.step):
+            for path_table_deltalake in (path_plain, path_checkpointed):
+                dt = DeltaTable(path_table_deltalake)
+                for _ in range(args.step):
+                    write_deltalake(dt, batch, mode="append")
+
+            with table_cache.open(path_checkpointed) as dt:
+                write_deltalake(dt, batch, mode="append")
+
+            started_at = time.perf_counter()
+            with table_cache.open(path_checkpointed):
+                warm_seconds = time.perf_counter() - started_at
+
+            print(
+                f"{commits}\t{timed_cold_open(path_plain):.3f}\t{timed_cold_open(path_checkpointed):.3f}"
+                f"\t{warm_seconds:.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare the peak memory of list and streaming writes to Delta Lake.
+
+Each run happens in a fresh process, which creates a Delta table from
+synthetic leads, merges them again with 1% of the leads changed, and reports
+its peak resident set size. With the list mode the peak grows with the
+number of leads, while the streaming mode stays flat.
+
+Usage:
+    uv run python -m benchmarks.streaming_write_memory
+    uv run python -m benchmarks.streaming_write_memory --leads 400000 1600000 --modes stream
+
+The list mode needs several GB of memory from 200000 leads.
+
+The settings are read from the environment like the API (.env file).
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from datetime import date, timedelta
+
+import polars as pl
+import pyarrow as pa
+
+from backend.core.config import settings
+from backend.routers.ingestion_leads import model
+from backend.routers.ingestion_leads.utils import write_to_deltalake
+
+
+def generate_batches(
+    n_leads: int, revision: int = 0, batch_rows: int = settings.DELTA_WRITE_BATCH_ROWS
+) -> Iterator[pa.RecordBatch]:
+    """Generate synthetic normalised leads, one record batch at a time.
+
+    Args:
+        n_leads: Number of leads to generate.
+        revision: Revision of the data source, one lead in a hundred changes its state between revisions.
+            Defaults to 0.
+        batch_rows: Maximum number of rows per record batch.
+            Defaults to settings.DELTA_WRITE_BATCH_ROWS.
+
+    Yields:
+        Record batches with the columns of model.SCHEMA_POLARS.
+    """
+    for offset in range(0, n_leads, batch_rows):
+        ids = range(offset, min(offset + batch_rows, n_leads))
+        columns = {
+            column: [f"{column} {lead_id % 1000}" for lead_id in ids]
+            for column, dtype in model.SCHEMA_POLARS.items()
+            if dtype == pl.Utf8
+        }
+        columns["id"] = [f"lead-{lead_id:09d}" for lead_id in ids]
+        columns["duplicate_group_id"] = columns["id"]
+        columns["etat"] = [f"etat {revision if lead_id % 100 == 0 else 0}" for lead_id in ids]
+        for field in model.DATE_FIELDS:
+            columns[field] = [date(2025, 1, 1) + timedelta(days=lead_id % 365) for lead_id in ids]
+        columns["budget"] = [float(lead_id % 50_000) for lead_id in ids]
+        columns["personne_assignee"] = [[f"user-{lead_id % 12}"] for lead_id in ids]
+
+        yield pl.DataFrame(columns, schema=model.SCHEMA_POLARS).to_arrow().to_batches()[0]
+
+
+def run_write(mode: str, n_leads: int) -> None:
+    """Create then update a Delta table of synthetic leads and print the peak RSS.
+
+    Args:
+        mode: "list" to write a list of dictionaries, "stream" to write a record batch reader.
+        n_leads: Number of leads written.
+    """
+    schema = pl.DataFrame(schema=model.SCHEMA_POLARS).to_arrow().schema
+    started_at = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as path_table_deltalake:
+        for revision in (0, 1):
+            if mode == "list":
+                values_normalise = [row for batch in generate_batches(n_leads, revision) for row in batch.to_pylist()]
+            else:
+                values_normalise = pa.RecordBatchReader.from_batches(schema, generate_batches(n_leads, revision))
+            write_to_deltalake(values_normalise, path_table_deltalake=path_table_deltalake)
+            del values_normalise
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode}\t{n_leads}\t{peak_rss_mb:.0f}\t{time.perf_counter() - started_at:.1f}")
+
+
+def main() -> None:
+    """Run every mode and size in its own process and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--modes", nargs="+", choices=["list", "stream"], default=["list", "stream"])
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "LEADS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_write(args.worker[0], int(args.worker[1]))
+        return
+
+    print("mode\tleads\tpeak_rss_mb\tseconds")
+    for n_leads in args.leads:
+        for mode in args.modes:
+            subprocess.run(  # noqa: S603
+                [sys.executable, "-m", "benchmarks.streaming_write_memory", "--worker", mode, str(n_leads)],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
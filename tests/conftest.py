@@ -0,0 +1,8 @@
+"""Settings required by backend.core.config, which reads them at import time."""
+
+import os
+
+for name in ("NOTION_TOKEN", "DATABASE_ID", "GCS_URI", "GOOGLE_APPLICATION_CREDENTIALS", "HMAC_KEY", "HMAC_SECRET"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("LOGFIRE_TOKEN", "test")
+os.environ.setdefault("LOGFIRE_SEND_TO_LOGFIRE", "false")
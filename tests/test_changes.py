@@ -0,0 +1,81 @@
+import polars as pl
+import pyarrow as pa
+import pytest
+from deltalake import write_deltalake
+
+from backend.routers.changes.utils import ChangesUnavailableError, InvalidCursorError, read_changes
+from backend.routers.ingestion_leads import model
+from backend.routers.ingestion_leads.utils import write_to_deltalake
+
+
+def ingest(path_table_deltalake: str, etats: dict[str, str]) -> None:
+    leads = pl.concat(
+        [pl.DataFrame(schema=model.SCHEMA_POLARS), pl.DataFrame({"id": list(etats), "etat": list(etats.values())})],
+        how="diagonal_relaxed",
+    )
+    write_to_deltalake(leads.to_dicts(), path_table_deltalake=path_table_deltalake)
+
+
+@pytest.fixture
+def leads_table(tmp_path) -> str:
+    """Leads created at version 0, two of them updated at version 1."""
+    path_table_deltalake = str(tmp_path / "leads")
+    ingest(path_table_deltalake, {"a": "Nouveau", "b": "Nouveau", "c": "Nouveau"})
+    ingest(path_table_deltalake, {"a": "Contacté", "b": "Nouveau", "c": "Perdu"})
+    return path_table_deltalake
+
+
+def summarise(changes: pa.Table) -> list[tuple]:
+    return [(row["_commit_version"], row["id"], row["_change_type"], row["etat"]) for row in changes.to_pylist()]
+
+
+def test_changes_start_after_since_version(leads_table):
+    changes, next_cursor, until_version = read_changes(0, path_table_deltalake=leads_table)
+
+    assert summarise(changes) == [(1, "a", "update_postimage", "Contacté"), (1, "c", "update_postimage", "Perdu")]
+    assert (next_cursor, until_version) == (None, 1)
+
+
+def test_preimages_are_only_returned_on_request(leads_table):
+    changes, _, _ = read_changes(0, include_preimage=True, path_table_deltalake=leads_table)
+
+    assert summarise(changes) == [
+        (1, "a", "update_postimage", "Contacté"),
+        (1, "a", "update_preimage", "Nouveau"),
+        (1, "c", "update_postimage", "Perdu"),
+        (1, "c", "update_preimage", "Nouveau"),
+    ]
+
+
+def test_cursor_pages_cover_each_change_once_up_to_the_pinned_version(leads_table):
+    changes, next_cursor, until_version = read_changes(-1, limit=2, path_table_deltalake=leads_table)
+    pages = [summarise(changes)]
+    ingest(leads_table, {"b": "Contacté"})
+
+    while next_cursor is not None:
+        changes, next_cursor, _ = read_changes(
+            -1, until_version=until_version, cursor_token=next_cursor, limit=2, path_table_deltalake=leads_table
+        )
+        pages.append(summarise(changes))
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [change for page in pages for change in page] == [
+        (0, "a", "insert", "Nouveau"),
+        (0, "b", "insert", "Nouveau"),
+        (0, "c", "insert", "Nouveau"),
+        (1, "a", "update_postimage", "Contacté"),
+        (1, "c", "update_postimage", "Perdu"),
+    ]
+
+
+def test_changes_of_a_table_without_change_data_feed_are_unavailable(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    write_deltalake(path_table_deltalake, pa.table({"id": ["a"], "etat": ["Nouveau"]}))
+
+    with pytest.raises(ChangesUnavailableError):
+        read_changes(-1, path_table_deltalake=path_table_deltalake)
+
+
+def test_malformed_cursor_is_rejected(leads_table):
+    with pytest.raises(InvalidCursorError):
+        read_changes(-1, None, "not-a-cursor", path_table_deltalake=leads_table)
@@ -0,0 +1,24 @@
+import pyarrow as pa
+from deltalake import write_deltalake
+
+from backend.core.delta import DeltaTableCache
+
+
+def test_latency_report_separates_cold_and_warm_opens(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    write_deltalake(path_table_deltalake, pa.table({"id": ["a"]}))
+    delta_tables = DeltaTableCache(max_tables_per_path=1)
+
+    for _ in range(3):
+        with delta_tables.open(path_table_deltalake):
+            pass
+    write_deltalake(path_table_deltalake, pa.table({"id": ["b"]}), mode="append")
+    with delta_tables.open(path_table_deltalake) as dt:
+        assert dt.version() == 1
+
+    [entry] = delta_tables.latency_report()
+    assert entry["path_table_deltalake"] == path_table_deltalake
+    assert entry["cached_tables"] == 1
+    assert (entry["cold"]["count"], entry["warm"]["count"]) == (1, 3)
+    assert [sample["version"] for sample in entry["samples"]] == [0, 0, 0, 1]
+    assert entry["warm"]["max_seconds"] >= entry["warm"]["p95_seconds"] >= entry["warm"]["p50_seconds"]
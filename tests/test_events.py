@@ -0,0 +1,44 @@
+import asyncio
+
+from backend.routers.events.utils import VersionBroadcaster, format_sse, stream_events
+
+
+class FakeRequest:
+    """Request whose client stays connected until told otherwise."""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+def test_stream_sends_the_latest_event_then_keeps_alive_until_new_versions():
+    async def scenario() -> list[str]:
+        broadcaster, request = VersionBroadcaster(), FakeRequest()
+        broadcaster.publish({"table": "leads", "version": 3})
+        stream = stream_events(request, broadcaster, keepalive_seconds=0.05)
+
+        messages = [await stream.__anext__(), await stream.__anext__()]
+        broadcaster.publish({"table": "leads", "version": 4})
+        messages.append(await stream.__anext__())
+        request.disconnected = True
+        messages.extend([message async for message in stream])
+        return messages
+
+    assert asyncio.run(scenario()) == [
+        format_sse({"table": "leads", "version": 3}),
+        ": keep-alive\n\n",
+        format_sse({"table": "leads", "version": 4}),
+    ]
+
+
+def test_slow_subscriber_loses_its_oldest_events():
+    async def scenario() -> list[int]:
+        broadcaster = VersionBroadcaster(max_queued_events=2)
+        with broadcaster.subscribe() as queue:
+            for version in range(3):
+                broadcaster.publish({"table": "leads", "version": version})
+            return [queue.get_nowait()["version"] for _ in range(queue.qsize())]
+
+    assert asyncio.run(scenario()) == [1, 2]
@@ -0,0 +1,215 @@
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import polars as pl
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+
+from backend.core.config import NotionPipeline, settings
+from backend.routers.ingestion_leads import model
+from backend.routers.ingestion_leads.utils import (
+    DELTA_TABLE_CONFIGURATION,
+    RateLimiter,
+    aggregate_by_assignee,
+    replay_pipeline,
+    run_pipeline,
+    run_pipelines,
+    write_history_to_deltalake,
+    write_to_deltalake,
+)
+
+
+def notion_page(page_id: str, etat: str = "Nouveau", date_prise_contact: str = "2025-10-01") -> dict:
+    return {
+        "id": page_id,
+        "last_edited_time": "2025-10-01T00:00:00.000Z",
+        "properties": {
+            "État": {"type": "status", "status": {"name": etat}},
+            "Date de prise de contact": {"type": "date", "date": {"start": date_prise_contact}},
+            "Personne assignée": {"type": "people", "people": [{"id": "user-1"}]},
+        },
+    }
+
+
+class FakeNotionClient:
+    """Notion client serving a fixed list of pages, one query page at a time."""
+
+    def __init__(self, pages: list[dict]):
+        self.pages = pages
+        self.databases = SimpleNamespace(
+            retrieve=lambda database_id: {"data_sources": [{"id": f"source-{database_id}", "name": "Leads"}]}
+        )
+        self.data_sources = SimpleNamespace(query=self.query)
+
+    def query(self, data_source_id: str, page_size: int, start_cursor: str | None = None) -> dict:
+        start = int(start_cursor or 0)
+        has_more = start + page_size < len(self.pages)
+        return {
+            "results": self.pages[start : start + page_size],
+            "has_more": has_more,
+            "next_cursor": str(start + page_size) if has_more else None,
+        }
+
+
+def read_history(path_history_deltalake: str) -> pl.DataFrame:
+    return pl.from_arrow(DeltaTable(path_history_deltalake).to_pyarrow_table()).sort("id", "valid_from")
+
+
+def test_write_history_keeps_one_current_row_per_lead(tmp_path):
+    path_history_deltalake = str(tmp_path / "history")
+    ingestions = [
+        [{"id": "a", "etat": "Nouveau"}],
+        [{"id": "a", "etat": "Contacté"}, {"id": "b", "etat": "Nouveau"}, {"id": "c", "etat": "Nouveau"}],
+        [{"id": "a", "etat": "Contacté"}, {"id": "b", "etat": "Nouveau"}, {"id": "c", "etat": "Appel booké"}],
+    ]
+
+    appended = [
+        write_history_to_deltalake(
+            leads,
+            path_history_deltalake=path_history_deltalake,
+            tracked_fields=["etat"],
+            ingested_at=datetime(2025, 1, day, tzinfo=timezone.utc),
+        )
+        for day, leads in enumerate(ingestions, start=1)
+    ]
+
+    history = read_history(path_history_deltalake)
+    assert appended == [1, 3, 1]
+    assert history.height == sum(appended)
+    assert history.filter("is_current").group_by("id").len().sort("id")["len"].to_list() == [1, 1, 1]
+    assert history.filter("is_current").sort("id")["etat"].to_list() == ["Contacté", "Nouveau", "Appel booké"]
+    assert history.filter(pl.col("id") == "c")["valid_to"].to_list() == [
+        datetime(2025, 1, 3, tzinfo=timezone.utc),
+        None,
+    ]
+
+
+def test_write_replace_adds_columns_missing_from_the_table(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [
+            pl.DataFrame(schema=model.SCHEMA_POLARS),
+            pl.DataFrame({"id": ["a", "b"], "etat": ["Nouveau", "Contacté"], "duplicate_group_id": ["a", "a"]}),
+        ],
+        how="diagonal_relaxed",
+    ).to_arrow()
+    write_deltalake(
+        path_table_deltalake, leads.drop_columns(["duplicate_group_id"]), configuration=DELTA_TABLE_CONFIGURATION
+    )
+
+    write_to_deltalake(
+        pa.RecordBatchReader.from_batches(leads.schema, leads.to_batches()),
+        path_table_deltalake=path_table_deltalake,
+        replace=True,
+    )
+
+    table = DeltaTable(path_table_deltalake).to_pyarrow_table()
+    assert "duplicate_group_id" in table.schema.names
+    assert sorted(table["duplicate_group_id"].to_pylist()) == ["a", "a"]
+
+
+def test_first_ingestion_without_pages_writes_nothing(tmp_path):
+    pipeline = NotionPipeline(database_id="leads", path_table_deltalake=str(tmp_path / "leads"))
+
+    summary = run_pipeline(pipeline, FakeNotionClient([]))
+
+    assert summary["status"] == "success", summary.get("error")
+    assert summary["records_processed"] == 0
+    assert summary["raw_pages_appended"] == 0
+    assert not DeltaTable.is_deltatable(pipeline.path_raw_deltalake)
+    assert not DeltaTable.is_deltatable(pipeline.path_table_deltalake)
+
+
+def test_assignee_stats_match_the_leads_table(tmp_path):
+    pipeline = NotionPipeline(database_id="leads", path_table_deltalake=str(tmp_path / "leads"))
+    run_pipeline(pipeline, FakeNotionClient([notion_page("a")]))
+
+    summary = run_pipeline(pipeline, FakeNotionClient([notion_page("a", "Contacté"), notion_page("b")]))
+
+    leads = pl.from_arrow(DeltaTable(pipeline.path_table_deltalake).to_pyarrow_table())
+    assignee_stats = pl.from_arrow(DeltaTable(pipeline.path_assignee_stats_deltalake).to_pyarrow_table())
+    assert summary["status"] == "success", summary.get("error")
+    assert assignee_stats.sort(assignee_stats.columns).equals(
+        aggregate_by_assignee(leads.lazy()).sort(assignee_stats.columns)
+    )
+    assert assignee_stats.filter(granularite="month")["date_prise_contact"].to_list() == [leads.height]
+
+
+def test_pipelines_run_concurrently_and_fail_independently(tmp_path):
+    pipelines = [
+        NotionPipeline(database_id="leads", path_table_deltalake=str(tmp_path / "leads")),
+        NotionPipeline(database_id="other", data_source_name="Missing", path_table_deltalake=str(tmp_path / "other")),
+    ]
+    notion_client = FakeNotionClient([notion_page("a"), notion_page("b")])
+    # Both pipelines must reach Notion before either can go on, which only happens if they run at the same time
+    both_started = threading.Barrier(len(pipelines), timeout=10)
+    retrieve = notion_client.databases.retrieve
+
+    def retrieve_once_both_started(database_id: str) -> dict:
+        both_started.wait()
+        return retrieve(database_id)
+
+    notion_client.databases.retrieve = retrieve_once_both_started
+
+    summaries = run_pipelines(pipelines, max_workers=2, notion_client=notion_client)
+
+    assert [summary["path_table_deltalake"] for summary in summaries] == [
+        pipeline.path_table_deltalake for pipeline in pipelines
+    ]
+    assert (summaries[0]["status"], summaries[0]["records_processed"]) == ("success", 2)
+    assert summaries[1]["status"] == "error"
+    assert "Missing" in summaries[1]["error"]
+
+
+def test_rate_limiter_spaces_calls_out():
+    rate_limiter = RateLimiter(requests_per_second=20)
+
+    started_at = time.monotonic()
+    for _ in range(4):
+        rate_limiter.wait()
+
+    assert time.monotonic() - started_at >= 3 / 20
+
+
+def test_replay_rebuilds_the_leads_table_from_the_latest_raw_pages(tmp_path):
+    pipeline = NotionPipeline(database_id="leads", path_table_deltalake=str(tmp_path / "leads"))
+    run_pipeline(pipeline, FakeNotionClient([notion_page("a"), notion_page("b")]))
+    run_pipeline(pipeline, FakeNotionClient([notion_page("a", "Contacté"), notion_page("b"), notion_page("c")]))
+    history_version = DeltaTable(pipeline.path_history_deltalake).version()
+    # A faulty transform left a single lead with a wrong state in the table
+    leads = pl.from_arrow(DeltaTable(pipeline.path_table_deltalake).to_pyarrow_table())
+    write_deltalake(
+        pipeline.path_table_deltalake,
+        leads.filter(id="b").with_columns(etat=pl.lit("Perdu")).to_arrow(),
+        mode="overwrite",
+    )
+
+    summary = replay_pipeline(pipeline)
+
+    leads = pl.from_arrow(DeltaTable(pipeline.path_table_deltalake).to_pyarrow_table()).sort("id")
+    assert summary["status"] == "success", summary.get("error")
+    assert summary["records_processed"] == 3
+    assert leads.select("id", "etat").rows() == [("a", "Contacté"), ("b", "Nouveau"), ("c", "Nouveau")]
+    assert DeltaTable(pipeline.path_history_deltalake).version() == history_version
+
+
+def test_existing_tables_get_a_checkpoint_every_interval(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [pl.DataFrame(schema=model.SCHEMA_POLARS), pl.DataFrame({"id": ["a"], "etat": ["Nouveau"]})],
+        how="diagonal_relaxed",
+    )
+    # Created before the checkpoint interval was part of the table configuration
+    write_deltalake(path_table_deltalake, leads.to_arrow())
+
+    for ingestion in range(settings.DELTA_CHECKPOINT_INTERVAL):
+        write_to_deltalake(
+            leads.with_columns(etat=pl.lit(f"État {ingestion}")).to_dicts(), path_table_deltalake=path_table_deltalake
+        )
+
+    dt = DeltaTable(path_table_deltalake)
+    assert dt.metadata().configuration["delta.checkpointInterval"] == str(settings.DELTA_CHECKPOINT_INTERVAL)
+    assert dt.version() >= settings.DELTA_CHECKPOINT_INTERVAL
+    assert list((tmp_path / "leads" / "_delta_log").glob("*.checkpoint.parquet"))
@@ -0,0 +1,83 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from backend.routers.ingestion_leads import model as ingestion_model
+from backend.routers.ingestion_leads.utils import write_to_deltalake
+from backend.routers.leads.utils import CursorSortMismatchError, LeadsIndex, list_leads
+
+
+@pytest.fixture
+def leads_index(tmp_path) -> LeadsIndex:
+    """Index over leads whose contact dates have ties and NULLs."""
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [
+            pl.DataFrame(schema=ingestion_model.SCHEMA_POLARS),
+            pl.DataFrame({
+                "id": ["a", "b", "c", "d", "e", "f", "g"],
+                "nom": ["Durand", "Émilie Martin", "Petit", "Moreau", "Emond", "Leroy", "Simon"],
+                "nom_entreprise": ["Acme", "Acme Industries", "Globex", None, "Initech", "Acmé", "Umbrella"],
+                "date_prise_contact": [
+                    date(2025, 1, 6),
+                    None,
+                    date(2025, 1, 6),
+                    date(2025, 1, 2),
+                    None,
+                    date(2025, 1, 9),
+                    date(2025, 1, 6),
+                ],
+            }),
+        ],
+        how="diagonal_relaxed",
+    )
+    write_to_deltalake(leads.to_dicts(), path_table_deltalake=path_table_deltalake)
+    return LeadsIndex(path_table_deltalake, path_index=str(tmp_path / "index" / "leads.duckdb"), refresh_seconds=0)
+
+
+def paginate(leads_index: LeadsIndex, order: str, limit: int) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        page = list_leads({}, None, None, "date_prise_contact", order, limit, cursor, leads_index=leads_index)
+        pages.append([lead["id"] for lead in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize(
+    ("order", "expected_ids"),
+    [
+        ("asc", ["d", "a", "c", "g", "f", "b", "e"]),
+        ("desc", ["e", "b", "f", "g", "c", "a", "d"]),
+    ],
+)
+def test_keyset_pages_cover_every_lead_once_across_ties_and_nulls(leads_index, order, expected_ids):
+    for limit in (1, 2, 3):
+        pages = paginate(leads_index, order, limit)
+
+        assert [lead_id for page in pages for lead_id in page] == expected_ids
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_cursor_is_rejected_for_another_sort(leads_index):
+    page = list_leads({}, None, None, "date_prise_contact", "asc", 2, None, leads_index=leads_index)
+
+    with pytest.raises(CursorSortMismatchError):
+        list_leads({}, None, None, "date_prise_contact", "desc", 2, page["next_cursor"], leads_index=leads_index)
+
+
+@pytest.mark.parametrize(
+    ("search", "expected_ids"),
+    [
+        ("acme", ["a", "b", "f"]),
+        ("EMI", ["b"]),
+        ("em acm", ["b"]),
+        ("milie", []),
+    ],
+)
+def test_search_matches_term_prefixes_ignoring_case_and_accents(leads_index, search, expected_ids):
+    page = list_leads({}, None, search, "id", "asc", 10, None, leads_index=leads_index)
+
+    assert [lead["id"] for lead in page["items"]] == expected_ids
@@ -0,0 +1,56 @@
+import os
+import time
+
+import duckdb
+import pyarrow as pa
+import pytest
+from deltalake import write_deltalake
+
+from backend.core.replica import LocalReplica
+
+
+def write_version(path_table_deltalake: str, leads: int) -> None:
+    write_deltalake(
+        path_table_deltalake, pa.table({"id": [f"lead-{index}" for index in range(leads)]}), mode="overwrite"
+    )
+
+
+def count_leads(replica: LocalReplica) -> tuple[int, int]:
+    snapshot = replica.ensure_fresh()
+    conn = duckdb.connect()
+    source = snapshot.register(conn)
+    return snapshot.version, conn.table(source).aggregate("count(*)").fetchone()[0]
+
+
+@pytest.mark.parametrize("replica_format", ["arrow", "duckdb"])
+def test_replica_swaps_to_each_new_version_without_partial_files(tmp_path, replica_format):
+    path_table_deltalake = str(tmp_path / "leads")
+    replica = LocalReplica(path_table_deltalake, str(tmp_path / "replicas"), replica_format, refresh_seconds=0)
+
+    write_version(path_table_deltalake, leads=1)
+    assert count_leads(replica) == (0, 1)
+    write_version(path_table_deltalake, leads=2)
+    assert count_leads(replica) == (1, 2)
+
+    assert not list(replica.directory.glob("*.tmp"))
+
+
+def test_replaced_files_are_removed_once_no_worker_can_serve_them(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+
+    def refresh_on_a_new_worker() -> list[str]:
+        LocalReplica(path_table_deltalake, str(tmp_path / "replicas"), refresh_seconds=3600).ensure_fresh()
+        return sorted(path.name for path in (tmp_path / "replicas").glob("*/v*.arrow"))
+
+    write_version(path_table_deltalake, leads=1)
+    refresh_on_a_new_worker()
+    write_version(path_table_deltalake, leads=2)
+    files = refresh_on_a_new_worker()
+    assert files == [f"v{0:020d}.arrow", f"v{1:020d}.arrow"]
+
+    # Version 1 replaced version 0 long enough ago for every worker to have moved on
+    replaced_at = time.time() - 3 * 3600
+    os.utime(next((tmp_path / "replicas").glob(f"*/{files[1]}")), (replaced_at, replaced_at))
+    write_version(path_table_deltalake, leads=3)
+
+    assert refresh_on_a_new_worker() == [f"v{1:020d}.arrow", f"v{2:020d}.arrow"]
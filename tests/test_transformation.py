@@ -0,0 +1,397 @@
+import asyncio
+import threading
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import duckdb
+import polars as pl
+import pytest
+from deltalake import DeltaTable, write_deltalake
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from backend.routers.ingestion_leads import model
+from backend.routers.ingestion_leads.utils import (
+    DELTA_TABLE_CONFIGURATION,
+    write_history_to_deltalake,
+    write_to_deltalake,
+)
+from backend.routers.transformation.main import aggregate_or_raise, batch_aggregations
+from backend.routers.transformation.model import BatchAggregationRequest
+from backend.routers.transformation.utils import (
+    DeduplicationNotAvailableError,
+    QueryResultCache,
+    SingleFlight,
+    SlowQueryLog,
+    TableTimestampNotFoundError,
+    TableVersionExpiredError,
+    fetch_records,
+    resolve_table_version,
+    run_aggregation,
+)
+
+
+@pytest.fixture
+def leads_table(tmp_path) -> str:
+    """Leads table written before `duplicate_group_id` existed (version 0), then ingested again (version 1)."""
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [
+            pl.DataFrame(schema=model.SCHEMA_POLARS),
+            pl.DataFrame({
+                "id": ["a", "b"],
+                "date_prise_contact": [date(2025, 1, 6), date(2025, 1, 7)],
+                "duplicate_group_id": ["a", "a"],
+            }),
+        ],
+        how="diagonal_relaxed",
+    )
+    write_deltalake(
+        path_table_deltalake, leads.drop("duplicate_group_id").to_arrow(), configuration=DELTA_TABLE_CONFIGURATION
+    )
+    write_to_deltalake(leads.to_dicts(), path_table_deltalake=path_table_deltalake)
+    return path_table_deltalake
+
+
+def test_deduplicate_on_a_version_without_duplicate_groups_is_rejected(leads_table):
+    with pytest.raises(DeduplicationNotAvailableError):
+        run_aggregation(
+            duckdb.connect(),
+            "count_by_month_form_deltalake.sql",
+            leads_table,
+            as_of_version=0,
+            result_cache=QueryResultCache(),
+            deduplicate=True,
+            date_cols=["date_prise_contact"],
+        )
+
+
+def test_deduplicate_counts_each_duplicate_group_once(leads_table):
+    rows = run_aggregation(
+        duckdb.connect(),
+        "count_by_month_form_deltalake.sql",
+        leads_table,
+        as_of_version=1,
+        result_cache=QueryResultCache(),
+        deduplicate=True,
+        date_cols=["date_prise_contact"],
+    )
+
+    assert [row["date_prise_contact"] for row in rows] == [1]
+
+
+def test_deduplicate_keeps_a_group_whose_smallest_id_is_missing_from_the_table(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    write_to_deltalake(
+        [{"id": "b", "date_prise_contact": date(2025, 1, 7), "duplicate_group_id": "a"}],
+        path_table_deltalake=path_table_deltalake,
+    )
+
+    rows = run_aggregation(
+        duckdb.connect(),
+        "count_by_month_form_deltalake.sql",
+        path_table_deltalake,
+        as_of_version=0,
+        result_cache=QueryResultCache(),
+        deduplicate=True,
+        date_cols=["date_prise_contact"],
+    )
+
+    assert [row["date_prise_contact"] for row in rows] == [1]
+
+
+def test_fetch_records_measures_bytes_read_without_profiling(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pl.DataFrame({"id": [f"lead-{index}" for index in range(10_000)]}).write_parquet("leads.parquet")
+
+    records, query_stats = fetch_records(
+        duckdb.connect(), "SELECT count(*) AS leads FROM 'leads.parquet'", profiling=False
+    )
+
+    assert records == [{"leads": 10_000}]
+    assert 0 < query_stats["bytes_read"] <= (tmp_path / "leads.parquet").stat().st_size
+    assert "duckdb_profile" not in query_stats
+
+
+def test_profile_runs_cached_queries_and_logs_them_whatever_their_duration(leads_table):
+    result_cache, slow_query_log = QueryResultCache(), SlowQueryLog(threshold_seconds=3600)
+    for profile in (False, True):
+        run_aggregation(
+            duckdb.connect(),
+            "count_by_month_form_deltalake.sql",
+            leads_table,
+            as_of_version=1,
+            result_cache=result_cache,
+            slow_query_log=slow_query_log,
+            profile=profile,
+            date_cols=["date_prise_contact"],
+        )
+
+    [entry] = slow_query_log.entries()
+    assert entry["profile_requested"]
+    assert entry["table_version"] == 1
+    assert "duckdb_profile" in entry
+
+
+def test_timestamp_before_the_first_commit_is_not_found(leads_table):
+    first_committed_at = DeltaTable(leads_table).history()[-1]["timestamp"]
+
+    with pytest.raises(TableTimestampNotFoundError):
+        resolve_table_version(leads_table, as_of_timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc))
+    assert (
+        resolve_table_version(
+            leads_table, as_of_timestamp=datetime.fromtimestamp(first_committed_at / 1000, tz=timezone.utc)
+        )
+        == 0
+    )
+    assert resolve_table_version(leads_table, as_of_timestamp=datetime.now(timezone.utc)) == 1
+
+
+def test_version_removed_from_the_transaction_log_is_expired(leads_table):
+    DeltaTable(leads_table).create_checkpoint()
+    (Path(leads_table) / "_delta_log" / f"{0:020d}.json").unlink()
+
+    with pytest.raises(TableVersionExpiredError):
+        resolve_table_version(leads_table, as_of_version=0)
+    with pytest.raises(TableVersionExpiredError):
+        resolve_table_version(leads_table, as_of_timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc))
+    assert resolve_table_version(leads_table, as_of_version=1) == 1
+
+
+def test_version_whose_files_were_vacuumed_is_gone(leads_table):
+    DeltaTable(leads_table).vacuum(retention_hours=0, enforce_retention_duration=False, dry_run=False)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(
+            aggregate_or_raise(
+                duckdb.connect(),
+                "count_by_month_form_deltalake.sql",
+                delta_table_path=leads_table,
+                as_of_version=0,
+                result_cache=QueryResultCache(),
+                date_cols=["date_prise_contact"],
+            )
+        )
+    assert error.value.status_code == 410
+
+
+def test_funnel_ignores_milestones_dated_before_the_previous_one(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [
+            pl.DataFrame(schema=model.SCHEMA_POLARS),
+            pl.DataFrame({
+                "id": ["a", "b", "c"],
+                "date_prise_contact": [date(2025, 1, 6)] * 3,
+                "date_reponse_prospect": [date(2025, 1, 8), date(2025, 1, 1), None],
+            }),
+        ],
+        how="diagonal_relaxed",
+    )
+    write_to_deltalake(leads.to_dicts(), path_table_deltalake=path_table_deltalake)
+
+    [step] = run_aggregation(
+        duckdb.connect(),
+        "funnel_latency_from_deltalake.sql",
+        path_table_deltalake,
+        as_of_version=0,
+        result_cache=QueryResultCache(),
+        milestones=["date_prise_contact", "date_reponse_prospect"],
+        steps=[("date_prise_contact", "date_reponse_prospect")],
+        group_by=[],
+    )
+
+    assert (step["leads"], step["converted"], step["p50_days"], step["p90_days"]) == (3, 1, 2, 2)
+
+
+def test_stage_durations_pair_each_stay_with_the_next_one(tmp_path):
+    path_history_deltalake = str(tmp_path / "history")
+    ingestions = [
+        [{"id": "a", "etat": "Nouveau"}],
+        [{"id": "a", "etat": "Contacté"}, {"id": "b", "etat": "Nouveau"}, {"id": "c", "etat": "Nouveau"}],
+        [{"id": "a", "etat": "Contacté"}, {"id": "b", "etat": "Nouveau"}, {"id": "c", "etat": "Appel booké"}],
+    ]
+    for day, leads in enumerate(ingestions, start=1):
+        write_history_to_deltalake(
+            leads,
+            path_history_deltalake=path_history_deltalake,
+            tracked_fields=["etat"],
+            ingested_at=datetime(2025, 1, day, tzinfo=timezone.utc),
+        )
+
+    rows = run_aggregation(
+        duckdb.connect(),
+        "stage_durations_from_history.sql",
+        path_history_deltalake,
+        as_of_version=2,
+        result_cache=QueryResultCache(),
+        field="etat",
+    )
+
+    stage_totals = {
+        row["from_stage"]: (row["transitions"], row["in_stage"], row["avg_days"])
+        for row in rows
+        if row["is_stage_total"]
+    }
+    transitions = {
+        (row["from_stage"], row["to_stage"]): (row["transitions"], row["median_days"])
+        for row in rows
+        if not row["is_stage_total"] and row["transitions"]
+    }
+    assert stage_totals == {"Nouveau": (2, 1, 1.0), "Contacté": (0, 1, None), "Appel booké": (0, 1, None)}
+    assert transitions == {("Nouveau", "Contacté"): (1, 1.0), ("Nouveau", "Appel booké"): (1, 1.0)}
+
+
+def test_funnel_reports_each_step_and_the_end_to_end_one_per_group(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [
+            pl.DataFrame(schema=model.SCHEMA_POLARS),
+            pl.DataFrame({
+                "id": ["a", "b", "c", "d"],
+                "priorite": ["Haute", "Haute", "Basse", "Basse"],
+                "date_prise_contact": [date(2025, 1, 1), date(2025, 1, 1), date(2025, 1, 1), None],
+                "date_reponse_prospect": [date(2025, 1, 3), date(2025, 1, 2), None, date(2025, 1, 2)],
+                "date_appel_propose": [date(2025, 1, 6), None, None, date(2025, 1, 4)],
+            }),
+        ],
+        how="diagonal_relaxed",
+    )
+    write_to_deltalake(leads.to_dicts(), path_table_deltalake=path_table_deltalake)
+
+    rows = run_aggregation(
+        duckdb.connect(),
+        "funnel_latency_from_deltalake.sql",
+        path_table_deltalake,
+        as_of_version=0,
+        result_cache=QueryResultCache(),
+        milestones=["date_prise_contact", "date_reponse_prospect", "date_appel_propose"],
+        steps=[
+            ("date_prise_contact", "date_reponse_prospect"),
+            ("date_reponse_prospect", "date_appel_propose"),
+            ("date_prise_contact", "date_appel_propose"),
+        ],
+        group_by=["priorite"],
+    )
+
+    assert [(row["step"], row["priorite"], row["leads"], row["converted"], row["conversion_rate"]) for row in rows] == [
+        (1, "Basse", 1, 0, 0.0),
+        (1, "Haute", 2, 2, 1.0),
+        (2, "Basse", 0, 0, None),
+        (2, "Haute", 2, 1, 0.5),
+        (3, "Basse", 1, 0, 0.0),
+        (3, "Haute", 2, 1, 0.5),
+    ]
+    assert [row["p50_days"] for row in rows if row["priorite"] == "Haute"][1:] == [3, 5]
+
+
+def test_single_flight_shares_one_execution_between_identical_calls():
+    single_flight, release = SingleFlight(), threading.Event()
+    calls = []
+
+    def slow_query() -> list[dict]:
+        calls.append(threading.get_ident())
+        release.wait(timeout=10)
+        return [{"leads": len(calls)}]
+
+    results = []
+    callers = [
+        threading.Thread(target=lambda: results.append(single_flight.run(("count", 1), slow_query))) for _ in range(4)
+    ]
+    for caller in callers:
+        caller.start()
+    # Leave the followers time to join the call still waiting for its release
+    time.sleep(0.2)
+    release.set()
+    for caller in callers:
+        caller.join()
+
+    assert len(calls) == 1
+    assert results == [[{"leads": 1}]] * 4
+    assert single_flight.run(("count", 1), slow_query) == [{"leads": 2}]
+
+
+def test_results_are_cached_per_table_version(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    for contact_dates in ([date(2025, 1, 6)], [date(2025, 1, 6), date(2025, 1, 7)]):
+        leads = pl.concat(
+            [
+                pl.DataFrame(schema=model.SCHEMA_POLARS),
+                pl.DataFrame({
+                    "id": [f"lead-{index}" for index in range(len(contact_dates))],
+                    "date_prise_contact": contact_dates,
+                }),
+            ],
+            how="diagonal_relaxed",
+        )
+        write_deltalake(path_table_deltalake, leads.to_arrow(), mode="overwrite")
+    result_cache, slow_query_log = QueryResultCache(), SlowQueryLog(threshold_seconds=0)
+
+    counts = [
+        run_aggregation(
+            duckdb.connect(),
+            "count_by_month_form_deltalake.sql",
+            path_table_deltalake,
+            as_of_version=version,
+            result_cache=result_cache,
+            slow_query_log=slow_query_log,
+            date_cols=["date_prise_contact"],
+        )[0]["date_prise_contact"]
+        for version in (0, 1, 0, 1)
+    ]
+
+    assert counts == [1, 2, 1, 2]
+    assert [entry["table_version"] for entry in reversed(slow_query_log.entries())] == [0, 1]
+
+
+def test_batch_results_match_the_count_endpoints(tmp_path):
+    path_table_deltalake = str(tmp_path / "leads")
+    leads = pl.concat(
+        [
+            pl.DataFrame(schema=model.SCHEMA_POLARS),
+            pl.DataFrame({
+                "id": ["a", "b", "c"],
+                "priorite": ["Haute", "Basse", "Haute"],
+                "date_prise_contact": [date(2025, 1, 6), date(2025, 1, 7), date(2025, 2, 3)],
+                "date_appel_booke": [date(2025, 1, 8), None, date(2025, 2, 12)],
+            }),
+        ],
+        how="diagonal_relaxed",
+    )
+    write_to_deltalake(leads.to_dicts(), path_table_deltalake=path_table_deltalake)
+    batch = BatchAggregationRequest(
+        aggregations=[
+            {"name": "weekly", "granularity": "week", "date_cols": ["date_prise_contact", "date_appel_booke"]},
+            {
+                "name": "monthly_by_priorite",
+                "granularity": "month",
+                "date_cols": ["date_prise_contact"],
+                "group_by": ["priorite"],
+            },
+        ]
+    )
+
+    response = asyncio.run(
+        batch_aggregations(batch, delta_table_path=path_table_deltalake, as_of_version=0, conn=duckdb.connect())
+    )
+
+    weekly_counts = run_aggregation(
+        duckdb.connect(),
+        "count_by_week_form_deltalake.sql",
+        path_table_deltalake,
+        as_of_version=0,
+        result_cache=QueryResultCache(),
+        date_cols=["date_prise_contact", "date_appel_booke"],
+    )
+    results = response["aggregations"]
+    assert [(row["date_prise_contact"], row["date_appel_booke"]) for row in weekly_counts] == [(2, 1), (1, 0), (0, 1)]
+    assert results["weekly"] == weekly_counts
+    assert sorted(
+        (row["mois"].month, row["priorite"], row["date_prise_contact"]) for row in results["monthly_by_priorite"]
+    ) == [(1, "Basse", 1), (1, "Haute", 1), (2, "Haute", 1)]
+
+
+def test_batch_rejects_aggregations_sharing_a_name():
+    with pytest.raises(ValidationError):
+        BatchAggregationRequest(aggregations=[{"name": "weekly"}, {"name": "weekly", "granularity": "month"}])